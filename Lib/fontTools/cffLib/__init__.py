@@ -12,6 +12,7 @@ from fontTools.ttLib.tables import otTables as ot
 import struct
 import logging
 import re
+import timeit
 
 # mute cffLib debug messages when running ttx in verbose mode
 DEBUG = logging.DEBUG - 1
@@ -88,7 +89,10 @@ class CFFFontSet(object):
 			raise TypeError(nameOrIndex)
 		return self.topDictIndex[index]
 
-	def compile(self, file, otFont, isCFF2=None):
+	def compile(self, file, otFont, isCFF2=None, subroutinize=False):
+		"""Compile the font set to 'file'.  If 'subroutinize' is true, the
+		charstrings are first subroutinized in place; see
+		fontTools.cffLib.subroutinizer."""
 		self.otFont = otFont
 		if isCFF2 is not None:
 			# called from ttLib: assert 'major' value matches expected version
@@ -101,6 +105,9 @@ class CFFFontSet(object):
 			# use current 'major' value to determine output format
 			assert self.major in (1, 2), "Unknown CFF format"
 			isCFF2 = self.major == 2
+		if subroutinize:
+			from fontTools.cffLib import subroutinizer
+			subroutinizer.subroutinize(self)
 		if not isCFF2:
 			strings = IndexedStrings()
 		else:
@@ -287,6 +294,12 @@ class CFFFontSet(object):
 
 class CFFWriter(object):
 
+	# The positions are found again until they don't change. The items only
+	# grow as the offsets they encode grow, and so do the positions, so
+	# this takes a few passes, as each offset's encoding can only grow
+	# from 1 to 5 bytes.
+	maxPasses = 16
+
 	def __init__(self, isCFF2):
 		self.data = []
 		self.isCFF2 = isCFF2
@@ -295,11 +308,15 @@ class CFFWriter(object):
 		self.data.append(table)
 
 	def toFile(self, file):
+		start = timeit.default_timer()
 		lastPosList = None
-		count = 1
+		passes = 0
 		while True:
-			log.log(DEBUG, "CFFWriter.toFile() iteration: %d", count)
-			count = count + 1
+			passes += 1
+			if passes > self.maxPasses:
+				raise ValueError(
+					"CFF item positions don't converge in %d passes" % self.maxPasses)
+			log.log(DEBUG, "CFFWriter.toFile() iteration: %d", passes)
 			pos = 0
 			posList = [pos]
 			for item in self.data:
@@ -316,7 +333,8 @@ class CFFWriter(object):
 			if posList == lastPosList:
 				break
 			lastPosList = posList
-		log.log(DEBUG, "CFFWriter.toFile() writing to file.")
+		log.log(DEBUG, "CFFWriter.toFile() found the positions in %d passes "
+				"(%.3fs); writing to file.", passes, timeit.default_timer() - start)
 		begin = file.tell()
 		if self.isCFF2:
 			self.data[1] = struct.pack(">H", self.topDictSize)
@@ -354,6 +372,8 @@ class IndexCompiler(object):
 		self.isCFF2 = isCFF2
 		self.items = self.getItems(items, strings)
 		self.parent = parent
+		# the offsets, when the items' lengths don't depend on the positions
+		self._offsets = None
 
 	def getItems(self, items, strings):
 		return items
@@ -361,14 +381,22 @@ class IndexCompiler(object):
 	def getOffsets(self):
 		# An empty INDEX contains only the count field.
 		if self.items:
+			offsets = self._offsets
+			# items may only be added, to the strings
+			if offsets is not None and len(offsets) == len(self.items) + 1:
+				return offsets
 			pos = 1
 			offsets = [pos]
+			static = True
 			for item in self.items:
 				if hasattr(item, "getDataLength"):
 					pos = pos + item.getDataLength()
+					static = False
 				else:
 					pos = pos + len(item)
 				offsets.append(pos)
+			if static:
+				self._offsets = offsets
 		else:
 			offsets = []
 		return offsets
@@ -500,10 +528,16 @@ class FDArrayIndexCompiler(IndexCompiler):
 class GlobalSubrsCompiler(IndexCompiler):
 
 	def getItems(self, items, strings):
+		if isinstance(items, Index):
+			items = [items.getRawItem(i) for i in range(len(items))]
 		out = []
 		for cs in items:
-			cs.compile(self.isCFF2)
-			out.append(cs.bytecode)
+			if not isinstance(cs, bytes):
+				cs.compile(self.isCFF2)
+				cs = cs.bytecode
+			# else the data of a charstring that was never loaded, and
+			# is written again verbatim
+			out.append(cs)
 		return out
 
 
@@ -516,13 +550,6 @@ class SubrsCompiler(GlobalSubrsCompiler):
 
 class CharStringsCompiler(GlobalSubrsCompiler):
 
-	def getItems(self, items, strings):
-		out = []
-		for cs in items:
-			cs.compile(self.isCFF2)
-			out.append(cs.bytecode)
-		return out
-
 	def setPos(self, pos, endPos):
 		self.parent.rawDict["CharStrings"] = pos
 
@@ -570,15 +597,27 @@ class Index(object):
 		item = self.items[index]
 		if item is not None:
 			return item
+		data, offset = self._readItem(index)
+		item = self.produceItem(index, data, self.file, offset)
+		self.items[index] = item
+		return item
+
+	def getRawItem(self, index):
+		"""Return item 'index' if it was loaded, or else its data as read
+		from the file, without producing the item."""
+		item = self.items[index]
+		if item is not None:
+			return item
+		return self._readItem(index)[0]
+
+	def _readItem(self, index):
 		offset = self.offsets[index] + self.offsetBase
 		size = self.offsets[index + 1] - self.offsets[index]
 		file = self.file
 		file.seek(offset)
 		data = file.read(size)
 		assert len(data) == size
-		item = self.produceItem(index, data, file, offset)
-		self.items[index] = item
-		return item
+		return data, offset
 
 	def __setitem__(self, index, item):
 		self.items[index] = item
@@ -829,6 +868,9 @@ class FDSelect(object):
 
 class CharStrings(object):
 
+	# a psCharStrings.CharStringPathCache, see enableDrawCache()
+	drawCache = None
+
 	def __init__(self, file, charset, globalSubrs, private, fdSelect, fdArray,
 			isCFF2=None):
 		self.globalSubrs = globalSubrs
@@ -845,6 +887,7 @@ class CharStrings(object):
 			self.charStrings = {}
 			# read from ttx file: charStrings.values() are actual charstrings
 			self.charStringsAreIndexed = 0
+			self.isCFF2 = isCFF2
 			self.private = private
 			if fdSelect is not None:
 				self.fdSelect = fdSelect
@@ -881,6 +924,30 @@ class CharStrings(object):
 		else:
 			self.charStrings[name] = charString
 
+	def getRawItem(self, name):
+		"""Return the charstring of glyph 'name', or its data if it was
+		never loaded from the CharStrings INDEX."""
+		if self.charStringsAreIndexed:
+			return self.charStringsIndex.getRawItem(self.charStrings[name])
+		return self.charStrings[name]
+
+	def enableDrawCache(self, maxSize=8*1024*1024):
+		"""Cache the paths of the charstrings when they are drawn with
+		drawGlyph() (or through TTFont.getGlyphSet()), to replay them when
+		they are drawn again, up to about 'maxSize' bytes of paths. Return
+		the psCharStrings.CharStringPathCache."""
+		self.drawCache = psCharStrings.CharStringPathCache(maxSize)
+		return self.drawCache
+
+	def drawGlyph(self, name, pen):
+		"""Draw the charstring of glyph 'name' to 'pen', through the draw
+		cache if it is enabled."""
+		charString = self[name]
+		if self.drawCache is not None:
+			self.drawCache.draw(charString, pen)
+		else:
+			charString.draw(pen)
+
 	def getItemAndSelector(self, name):
 		if self.charStringsAreIndexed:
 			index = self.charStrings[name]
@@ -946,6 +1013,12 @@ class CharStrings(object):
 			charString.fromXML(name, attrs, content)
 			if fdID >= 0:
 				charString.fdSelectIndex = fdID
+			if not self.isCFF2:
+				# Keep the bytecode, which is much smaller; the program is
+				# decompiled again when it is used. CFF2 charstrings keep
+				# their programs, as the blends need the VarStore, which
+				# isn't known until the whole table is read.
+				charString.compile()
 			self[glyphName] = charString
 
 
@@ -1249,7 +1322,8 @@ class CharStringsConverter(TableConverter):
 			# there is no fdArray.
 			private, fdSelect, fdArray = parent.Private, None, None
 		charStrings = CharStrings(
-			None, None, parent.GlobalSubrs, private, fdSelect, fdArray)
+			None, None, parent.GlobalSubrs, private, fdSelect, fdArray,
+			isCFF2=parent.cff2GetGlyphOrder is not None)
 		charStrings.fromXML(name, attrs, content)
 		return charStrings
 
@@ -1929,6 +2003,9 @@ class DictCompiler(object):
 				continue
 			rawDict[name] = value
 		self.rawDict = rawDict
+		# the last encoding of each entry, with its operands: only those
+		# holding offsets change between CFFWriter.toFile()'s passes
+		self._encoded = {}
 
 	def setPos(self, pos, endPos):
 		pass
@@ -1939,12 +2016,18 @@ class DictCompiler(object):
 	def compile(self, reason):
 		log.log(DEBUG, "-- compiling %s for %s", self.__class__.__name__, reason)
 		rawDict = self.rawDict
+		encoded = self._encoded
 		data = []
 		for name in self.dictObj.order:
 			value = rawDict.get(name)
 			if value is None:
 				continue
+			cached = encoded.get(name)
+			if cached is not None and cached[0] == value:
+				data.append(cached[1])
+				continue
 			op, argType = self.opcodes[name]
+			entry = []
 			if isinstance(argType, tuple):
 				l = len(argType)
 				assert len(value) == l, "value doesn't match arg type"
@@ -1952,11 +2035,14 @@ class DictCompiler(object):
 					arg = argType[i]
 					v = value[i]
 					arghandler = getattr(self, "arg_" + arg)
-					data.append(arghandler(v))
+					entry.append(arghandler(v))
 			else:
 				arghandler = getattr(self, "arg_" + argType)
-				data.append(arghandler(value))
-			data.append(op)
+				entry.append(arghandler(value))
+			entry.append(op)
+			entry = bytesjoin(entry)
+			encoded[name] = (value, entry)
+			data.append(entry)
 		data = bytesjoin(data)
 		return data
 
@@ -2105,7 +2191,7 @@ class TopDictCompiler(DictCompiler):
 			items = []
 			charStrings = self.dictObj.CharStrings
 			for name in self.dictObj.charset:
-				items.append(charStrings[name])
+				items.append(charStrings.getRawItem(name))
 			charStringsComp = CharStringsCompiler(
 				items, strings, self, isCFF2=isCFF2)
 			children.append(charStringsComp)
@@ -2191,9 +2277,9 @@ class BaseDict(object):
 		self.rawDict = {}
 		self.skipNames = []
 		self.strings = strings
+		self._isCFF2 = isCFF2
 		if file is None:
 			return
-		self._isCFF2 = isCFF2
 		self.file = file
 		if offset is not None:
 			log.log(DEBUG, "loading %s at %s", self.__class__.__name__, offset)
@@ -2213,6 +2299,8 @@ class BaseDict(object):
 		return self.compilerClass(self, strings, parent, isCFF2=isCFF2)
 
 	def __getattr__(self, name):
+		if name[:2] == '__': # don't handle requests for member functions like '__setstate__'
+			raise AttributeError(name)
 		value = self.rawDict.get(name, None)
 		if value is None:
 			value = self.defaults.get(name)
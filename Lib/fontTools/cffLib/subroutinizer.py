@@ -0,0 +1,624 @@
+# -*- coding: utf-8 -*-
+
+"""Subroutinizer for CFF and CFF2 charstrings.
+
+The subroutinizer first inlines all existing subroutines, then looks for
+command sequences that repeat across the charstrings of a font set, and
+moves the profitable ones into global and local subroutines.
+
+Charstrings are split into commands (the operands and the operator that
+consumes them) and each distinct command is replaced by an integer symbol.
+Repeated symbol sequences are found with a suffix array of all the glyphs'
+sequences and its LCP array.  Which repeats to use, and where, is decided by
+an exact dynamic-programming cover of each charstring, iterated until every
+subroutine pays for itself.  Subroutines only call strictly shorter ones, so
+the call graph is acyclic, and its depth is kept within the limit of the
+Type 2 charstring format.
+
+The result only depends on the charstring programs, so it is deterministic.
+"""
+
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.misc import psCharStrings
+from fontTools.misc.psCharStrings import calcSubrBias, encodeIntT2, encodeFixed
+from fontTools.cffLib import SubrsIndex
+import logging
+
+
+log = logging.getLogger(__name__)
+
+__all__ = ["subroutinize"]
+
+
+# Type 2 charstrings allow at most ten levels of nested subroutine calls.
+maxCallDepth = 10
+
+# A biased subroutine index must fit in -32768..32767; stay one short of
+# the full range.
+maxSubrs = 65535
+
+# Bound on the number of selection rounds.
+maxIterations = 10
+
+# Operators after which the argument stack is empty.  Commands end with one of
+# these; any other operator (blend, the arithmetic operators, ...) is part of
+# the command that follows.
+_commandOperators = frozenset([
+	'hstem', 'vstem', 'hstemhm', 'vstemhm', 'hintmask', 'cntrmask',
+	'rmoveto', 'hmoveto', 'vmoveto', 'rlineto', 'hlineto', 'vlineto',
+	'rrcurveto', 'hhcurveto', 'vvcurveto', 'hvcurveto', 'vhcurveto',
+	'rcurveline', 'rlinecurve', 'flex', 'hflex', 'hflex1', 'flex1',
+	'endchar', 'vsindex',
+])
+
+
+class SubroutinizerError(Exception):
+	pass
+
+
+def _inline(program, localSubrs, globalSubrs, result):
+	"""Append the tokens of 'program' to 'result', inlining subroutine
+	calls.  Returns True if the charstring ended with an endchar."""
+	i = 0
+	end = len(program)
+	while i < end:
+		token = program[i]
+		i += 1
+		if not isinstance(token, basestring):
+			result.append(token)
+		elif token in ('callsubr', 'callgsubr'):
+			subrs = localSubrs if token == 'callsubr' else globalSubrs
+			index = result.pop() if result else None
+			if type(index) is not int:
+				raise SubroutinizerError(
+					"subroutine called with a computed index")
+			index += calcSubrBias(subrs)
+			if not 0 <= index < len(subrs):
+				raise SubroutinizerError("invalid subroutine index")
+			subr = subrs[index]
+			if subr.needsDecompilation():
+				# Only the charstrings' execution knows the length of
+				# the hint masks in a subroutine.
+				raise SubroutinizerError("subroutine was not decompiled")
+			if _inline(subr.program, localSubrs, globalSubrs, result):
+				return True
+		elif token == 'return':
+			return False
+		else:
+			result.append(token)
+			if token == 'endchar':
+				return True
+			if token in ('hintmask', 'cntrmask'):
+				result.append(program[i])
+				i += 1
+	return False
+
+
+def _splitCommands(program):
+	"""Split a flat charstring program into a list of commands, each a
+	tuple of tokens."""
+	commands = []
+	command = []
+	i = 0
+	end = len(program)
+	while i < end:
+		token = program[i]
+		i += 1
+		command.append(token)
+		if isinstance(token, basestring) and token in _commandOperators:
+			if token in ('hintmask', 'cntrmask'):
+				command.append(program[i])
+				i += 1
+			commands.append(tuple(command))
+			command = []
+	if command:
+		commands.append(tuple(command))
+	return commands
+
+
+def _compileCommand(command, cache, opcodes=psCharStrings.T2CharString.opcodes):
+	"""Return the bytecode of a command; 'cache' is a dict of the encoded
+	operands and operators."""
+	data = b""
+	i = 0
+	end = len(command)
+	while i < end:
+		token = command[i]
+		i += 1
+		code = cache.get((type(token), token))
+		if code is None:
+			if isinstance(token, basestring):
+				code = bytesjoin(bytechr(b) for b in opcodes[token])
+			elif isinstance(token, int):
+				code = encodeIntT2(token)
+			else:
+				code = encodeFixed(token)
+			cache[(type(token), token)] = code
+		data += code
+		if token in ('hintmask', 'cntrmask'):
+			data += command[i]
+			i += 1
+	return data
+
+
+def _suffixArray(text):
+	"""Return the suffix array of 'text', a list of non-negative ints,
+	together with the inverse permutation (the rank of each suffix).
+
+	Uses prefix doubling, sorting with integer keys at each step.
+	"""
+	n = len(text)
+	if not n:
+		return [], []
+	sa = sorted(range(n), key=text.__getitem__)
+	rank = [0] * n
+	r = 0
+	prev = text[sa[0]]
+	for i in sa:
+		key = text[i]
+		if key != prev:
+			r += 1
+			prev = key
+		rank[i] = r
+	k = 1
+	while r < n - 1:
+		m = r + 2
+		keys = [a * m + b + 1 for a, b in zip(rank, rank[k:])]
+		keys.extend(a * m for a in rank[n - k:])
+		sa.sort(key=keys.__getitem__)
+		r = 0
+		prev = keys[sa[0]]
+		for i in sa:
+			key = keys[i]
+			if key != prev:
+				r += 1
+				prev = key
+			rank[i] = r
+		k *= 2
+	return sa, rank
+
+
+def _lcpArray(text, sa, rank):
+	"""Return the LCP array of 'text': lcp[i] is the length of the common
+	prefix of the suffixes sa[i - 1] and sa[i] (Kasai's algorithm)."""
+	n = len(text)
+	lcp = [0] * n
+	h = 0
+	for i in range(n):
+		r = rank[i]
+		if r:
+			j = sa[r - 1]
+			while i + h < n and j + h < n and text[i + h] == text[j + h]:
+				h += 1
+			lcp[r] = h
+			if h:
+				h -= 1
+		else:
+			h = 0
+	return lcp
+
+
+def _repeats(lcp):
+	"""Yield (length, lb, rb) for every LCP interval: the prefix of
+	that length is shared by the suffixes sa[lb] to sa[rb]."""
+	stack = [(0, 0)]
+	n = len(lcp)
+	for i in range(1, n + 1):
+		l = lcp[i] if i < n else 0
+		lb = i - 1
+		while l < stack[-1][0]:
+			length, lb = stack.pop()
+			yield length, lb, i - 1
+		if l > stack[-1][0]:
+			stack.append((l, lb))
+
+
+def _slotOrder(count):
+	"""Return the indices of an INDEX of 'count' subroutines, from the
+	cheapest to call to the most expensive."""
+	bias = calcSubrBias(range(count))
+	slots = list(range(count))
+	slots.sort(key=lambda i: len(encodeIntT2(i - bias)))
+	return slots, bias
+
+
+class _Subroutinizer(object):
+
+	"""Selects subroutines for a list of symbol sequences, and encodes
+	the sequences with them.
+
+	Symbols are indices into 'symbolCosts', the byte length of each
+	command.  A subroutine is a repeated run of symbols, identified by its
+	index in self.subrs; in encoded sequences, a call to subroutine 's' is
+	written as the negative number ~s.
+	"""
+
+	def __init__(self, sequences, contexts, symbolCosts, endSymbols,
+			maskSymbols, isCFF2):
+		# contexts: the local subroutine context of each sequence
+		# endSymbols: flags symbols that end a charstring (endchar)
+		# maskSymbols: flags symbols that end with a hint mask
+		self.contexts = contexts
+		self.numContexts = len(set(contexts))
+		self.symbolCosts = symbolCosts
+		self.endSymbols = endSymbols
+		self.maskSymbols = maskSymbols
+		self.isCFF2 = isCFF2
+		# Concatenate all sequences, each followed by a unique separator
+		# so that no repeat spans two of them.
+		text = []
+		starts = []
+		separator = len(symbolCosts)
+		for sequence in sequences:
+			starts.append(len(text))
+			text.extend(sequence)
+			text.append(separator)
+			separator += 1
+		starts.append(len(text))
+		self.text = text
+		self.starts = starts
+		offsets = [0]
+		total = 0
+		numSymbols = len(symbolCosts)
+		for symbol in text:
+			if symbol < numSymbols:
+				total += symbolCosts[symbol]
+			offsets.append(total)
+		self.offsets = offsets
+
+	def findCandidates(self):
+		"""Collect the repeated runs worth trying as subroutines.
+
+		Sets self.subrs to a list of (start, length) pairs, locating the
+		first occurrence of each candidate in the text, and self.matches
+		to a dict mapping text positions to the (subr, length) pairs of
+		the candidates occurring there."""
+		text = self.text
+		offsets = self.offsets
+		sa, rank = _suffixArray(text)
+		lcp = _lcpArray(text, sa, rank)
+		del rank
+		candidates = []
+		for length, lb, rb in _repeats(lcp):
+			count = rb - lb + 1
+			size = offsets[sa[lb] + length] - offsets[sa[lb]]
+			# A call takes at least two bytes; the subroutine itself
+			# costs at least a return and an INDEX offset.
+			savings = count * (size - 2) - (size + 3)
+			if savings <= 0:
+				continue
+			positions = sa[lb:rb + 1]
+			start = min(positions)
+			if start:
+				# Skip runs that are always preceded by the same symbol;
+				# the longer run saves more.
+				previous = text[start - 1]
+				for pos in positions:
+					if text[pos - 1] != previous:
+						break
+				else:
+					continue
+			if self.isCFF2 and self.maskSymbols[text[start + length - 1]]:
+				# Compiling a CFF2 subroutine strips a trailing byte
+				# that looks like return or endchar, which a hint mask
+				# can end with.
+				continue
+			candidates.append((-savings, start, length, lb, rb))
+		candidates.sort()
+		del candidates[maxSubrs:]
+		subrs = []
+		matches = {}
+		for _, start, length, lb, rb in candidates:
+			subr = len(subrs)
+			subrs.append((start, length))
+			for pos in sa[lb:rb + 1]:
+				matches.setdefault(pos, []).append((subr, length))
+		self.subrs = subrs
+		self.matches = matches
+		self.numMatched = len(subrs)
+
+	def encode(self, start, end, callCosts, depths, maxDepth, exclude=None):
+		"""Return the cheapest encoding of text[start:end], using only
+		subroutines with at most 'maxDepth' levels of calls, and its byte
+		cost."""
+		text = self.text
+		symbolCosts = self.symbolCosts
+		matches = self.matches
+		n = end - start
+		best = [0] * (n + 1)
+		choice = [None] * n
+		for i in range(n - 1, -1, -1):
+			pos = start + i
+			cost = symbolCosts[text[pos]] + best[i + 1]
+			chosen = None
+			for subr, length in matches.get(pos, ()):
+				if (i + length > n or subr == exclude
+						or depths[subr] > maxDepth):
+					continue
+				c = callCosts[subr] + best[i + length]
+				if c < cost:
+					cost = c
+					chosen = subr
+			best[i] = cost
+			choice[i] = chosen
+		result = []
+		subrs = self.subrs
+		i = 0
+		while i < n:
+			subr = choice[i]
+			if subr is None:
+				result.append(text[start + i])
+				i += 1
+			else:
+				result.append(~subr)
+				i += subrs[subr][1]
+		return result, best[0]
+
+	def encodeAll(self, alive, callCosts):
+		"""Encode the bodies of all live subroutines, shortest first, then
+		all sequences.  Returns (sequences, bodies, bodyCosts), the latter
+		two being dicts keyed by subroutine."""
+		subrs = self.subrs
+		starts = self.starts
+		matches = self.matches
+		numAlive = sum(alive)
+		if numAlive != self.numMatched:
+			# Forget the matches of dropped subroutines.
+			for pos, entries in list(matches.items()):
+				entries = [entry for entry in entries if alive[entry[0]]]
+				if entries:
+					matches[pos] = entries
+				else:
+					del matches[pos]
+			self.numMatched = numAlive
+		bodies = {}
+		bodyCosts = {}
+		depths = [0] * len(subrs)
+		order = [subr for subr in range(len(subrs)) if alive[subr]]
+		order.sort(key=lambda subr: (subrs[subr][1], subr))
+		for subr in order:
+			start, length = subrs[subr]
+			# Only the subroutine itself matches its whole body, so
+			# excluding it leaves calls to shorter ones.
+			body, cost = self.encode(start, start + length, callCosts,
+				depths, maxCallDepth - 1, exclude=subr)
+			bodies[subr] = body
+			bodyCosts[subr] = cost
+			depths[subr] = 1 + max([depths[~t] for t in body if t < 0] or [0])
+		sequences = []
+		for i in range(len(starts) - 1):
+			body, _ = self.encode(starts[i], starts[i + 1] - 1, callCosts,
+				depths, maxCallDepth)
+			sequences.append(body)
+		return sequences, bodies, bodyCosts
+
+	def countUsage(self, sequences, bodies):
+		"""Return the number of calls to each subroutine, and the set of
+		contexts each is called from."""
+		subrs = self.subrs
+		contexts = self.contexts
+		usage = [0] * len(subrs)
+		users = {}
+		for i, sequence in enumerate(sequences):
+			for t in sequence:
+				if t < 0:
+					usage[~t] += 1
+					users.setdefault(~t, set()).add(contexts[i])
+		# Callers are longer than their callees; visiting subroutines
+		# longest first propagates the contexts down the call graph.
+		order = sorted(bodies, key=lambda subr: (-subrs[subr][1], subr))
+		for subr in order:
+			if not usage[subr]:
+				continue
+			callers = users[subr]
+			for t in bodies[subr]:
+				if t < 0:
+					usage[~t] += 1
+					users.setdefault(~t, set()).update(callers)
+		return usage, users
+
+	def needsReturn(self, subr):
+		"""CFF subroutines end with a return, unless they end the charstring;
+		CFF2 has no return operator."""
+		start, length = self.subrs[subr]
+		return not (self.isCFF2 or self.endSymbols[self.text[start + length - 1]])
+
+	def overhead(self, subr):
+		"""Bytes a subroutine costs besides its body: an INDEX offset
+		(two bytes, typically), and the return operator."""
+		return 3 if self.needsReturn(subr) else 2
+
+	def assign(self, bodies, usage, users):
+		"""Distribute the used subroutines among the global and the local
+		INDEXes, and return a dict mapping each to (context, index, bias),
+		with context None for global subroutines; plus a list of the
+		subroutines that don't fit in their INDEX."""
+		subrs = self.subrs
+		used = sorted(subr for subr in bodies if usage[subr])
+		byUsage = sorted(used, key=lambda subr: (-usage[subr], subr))
+		isGlobal = {}
+		if self.numContexts == 1:
+			# Share the cheap indices of both INDEXes.
+			for rank, subr in enumerate(byUsage):
+				isGlobal[subr] = rank % 2 == 1
+		else:
+			for subr in used:
+				isGlobal[subr] = len(users[subr]) > 1
+		# Global subroutines can only call global subroutines.
+		for subr in sorted(used, key=lambda subr: (-subrs[subr][1], subr)):
+			if isGlobal[subr]:
+				for t in bodies[subr]:
+					if t < 0:
+						isGlobal[~t] = True
+		groups = {}
+		for subr in byUsage:
+			if isGlobal[subr]:
+				context = None
+			else:
+				context, = users[subr]
+			groups.setdefault(context, []).append(subr)
+		assignment = {}
+		overflow = []
+		for context, group in groups.items():
+			overflow.extend(group[maxSubrs:])
+			del group[maxSubrs:]
+			slots, bias = _slotOrder(len(group))
+			for subr, index in zip(group, slots):
+				assignment[subr] = (context, index, bias)
+		return assignment, sorted(overflow)
+
+	def run(self):
+		"""Select the subroutines and encode the sequences.  Returns
+		(sequences, bodies, assignment)."""
+		self.findCandidates()
+		numSubrs = len(self.subrs)
+		alive = [True] * numSubrs
+		# Until the first assignment, guess the call costs from the
+		# expected savings: the best candidates get one-byte operands.
+		callCosts = [2 if subr < 2 * 215 else 3 for subr in range(numSubrs)]
+		iteration = 0
+		while True:
+			iteration += 1
+			final = iteration >= maxIterations
+			sequences, bodies, bodyCosts = self.encodeAll(alive, callCosts)
+			usage, users = self.countUsage(sequences, bodies)
+			dropped = False
+			if not final:
+				for subr in sorted(bodies):
+					cost = bodyCosts[subr]
+					if (usage[subr] * (cost - callCosts[subr]) <=
+							cost + self.overhead(subr)):
+						alive[subr] = False
+						dropped = True
+				if dropped:
+					continue
+			assignment, overflow = self.assign(bodies, usage, users)
+			if overflow:
+				for subr in overflow:
+					alive[subr] = False
+				continue
+			changed = False
+			for subr, (context, index, bias) in assignment.items():
+				cost = len(encodeIntT2(index - bias)) + 1
+				if cost != callCosts[subr]:
+					callCosts[subr] = cost
+					changed = True
+			if final or not changed:
+				log.debug("selected %d subroutines in %d iterations",
+					len(assignment), iteration)
+				return sequences, bodies, assignment
+
+
+def subroutinize(fontSet):
+	"""Subroutinize the charstrings of all the fonts in 'fontSet', a
+	CFFFontSet, in place.
+
+	Existing subroutines are inlined, then replaced by new global and
+	local subroutines.  Returns True on success; if the charstrings can't
+	be flattened (e.g. because they compute subroutine indices), logs a
+	warning and returns False, leaving the font set unchanged.
+	"""
+	isCFF2 = fontSet.major == 2
+	globalSubrs = fontSet.GlobalSubrs
+	charStrings = []
+	programs = []
+	privates = []
+	contexts = []
+	privateIndices = {}
+	try:
+		for topDict in fontSet.topDictIndex:
+			fontCharStrings = topDict.CharStrings
+			for glyphName in sorted(fontCharStrings.keys()):
+				charString, _ = fontCharStrings.getItemAndSelector(glyphName)
+				charString.decompile()
+				private = charString.private
+				context = privateIndices.get(id(private))
+				if context is None:
+					context = privateIndices[id(private)] = len(privates)
+					privates.append(private)
+				program = []
+				_inline(charString.program, getattr(private, "Subrs", []),
+					globalSubrs, program)
+				charStrings.append(charString)
+				programs.append(program)
+				contexts.append(context)
+	except SubroutinizerError as e:
+		log.warning("can't subroutinize charstrings: %s", e)
+		return False
+
+	symbols = {}
+	commands = []
+	sequences = []
+	for program in programs:
+		sequence = []
+		for command in _splitCommands(program):
+			symbol = symbols.get(command)
+			if symbol is None:
+				symbol = symbols[command] = len(commands)
+				commands.append(command)
+			sequence.append(symbol)
+		sequences.append(sequence)
+	del programs
+	cache = {}
+	compiled = [_compileCommand(command, cache) for command in commands]
+	symbolCosts = [len(data) for data in compiled]
+	endSymbols = [command[-1] == 'endchar' for command in commands]
+	maskSymbols = [len(command) > 1 and command[-2] in ('hintmask', 'cntrmask')
+			and byteord(data[-1]) in (11, 14)
+			for command, data in zip(commands, compiled)]
+	del compiled
+
+	subroutinizer = _Subroutinizer(sequences, contexts, symbolCosts,
+		endSymbols, maskSymbols, isCFF2)
+	sequences, bodies, assignment = subroutinizer.run()
+
+	def toProgram(encoded):
+		program = []
+		for t in encoded:
+			if t >= 0:
+				program.extend(commands[t])
+				continue
+			subrContext, index, bias = assignment[~t]
+			program.append(index - bias)
+			program.append('callgsubr' if subrContext is None else 'callsubr')
+		return program
+
+	newGlobalSubrs = {}
+	newLocalSubrs = {}
+	subrClass = globalSubrs.subrClass
+	for subr in sorted(assignment):
+		context, index, bias = assignment[subr]
+		program = toProgram(bodies[subr])
+		if subroutinizer.needsReturn(subr):
+			program.append('return')
+		if context is None:
+			subrs = newGlobalSubrs
+			private = None
+		else:
+			subrs = newLocalSubrs.setdefault(context, {})
+			private = privates[context]
+		subrs[index] = subrClass(program=program, private=private,
+			globalSubrs=globalSubrs)
+
+	for charString, sequence in zip(charStrings, sequences):
+		charString.setProgram(toProgram(sequence))
+	globalSubrs.items = [newGlobalSubrs[i] for i in range(len(newGlobalSubrs))]
+	for context, private in enumerate(privates):
+		if private is None:
+			continue
+		subrs = newLocalSubrs.get(context)
+		if subrs:
+			localSubrs = SubrsIndex(private=private, globalSubrs=globalSubrs)
+			localSubrs.items = [subrs[i] for i in range(len(subrs))]
+			private.Subrs = localSubrs
+		else:
+			# Without the attribute, Private dicts load Subrs lazily from
+			# rawDict; remove both.
+			if "Subrs" in private.__dict__:
+				del private.Subrs
+			private.rawDict.pop("Subrs", None)
+	log.debug("subroutinized %d charstrings with %d global subroutines "
+		"and %d local subroutines", len(charStrings), len(newGlobalSubrs),
+		sum(len(subrs) for subrs in newLocalSubrs.values()))
+	return True
@@ -9,6 +9,8 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.timeTools import timestampNow
 from fontTools import ttLib, cffLib
+from fontTools.ttLib import (
+	_checkJobs, _forkContext, _numProcesses, _reopenFile)
 from fontTools.ttLib.tables import otTables, _h_e_a_d
 from fontTools.ttLib.tables.DefaultTable import DefaultTable
 from fontTools.misc.loggingTools import Timer
@@ -17,6 +19,10 @@ import sys
 import time
 import operator
 import logging
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
 
 
 log = logging.getLogger("fontTools.merge")
@@ -161,6 +167,40 @@ def merge(self, m, tables):
 		return logic(tables)
 
 
+@_add_method(DefaultTable, allowDefaultTable=True)
+def renameGlyphs(self, renames):
+	"""Rename the glyphs the table refers to, given a dict mapping the old
+	names to the new ones, or return NotImplemented if it can't."""
+	return NotImplemented
+
+@_add_method(ttLib.getTableClass('maxp'),
+		ttLib.getTableClass('post'))
+def renameGlyphs(self, renames):
+	# 'post' keeps the names it gives the glyphs, the same it gives them
+	# when it is parsed after the renaming.
+	pass
+
+@_add_method(ttLib.getTableClass('cmap'))
+def renameGlyphs(self, renames):
+	for subtable in self.tables:
+		if subtable.format == 14:
+			subtable.uvsDict = {
+				varSelector: [(uv, None if glyphName is None else renames[glyphName])
+					      for uv, glyphName in mappings]
+				for varSelector, mappings in subtable.uvsDict.items()}
+		elif hasattr(subtable, 'cmap'):
+			subtable.cmap = {uv: renames[glyphName]
+					 for uv, glyphName in subtable.cmap.items()}
+
+@_add_method(ttLib.getTableClass('CFF '))
+def renameGlyphs(self, renames):
+	for topDict in self.cff.topDictIndex:
+		charStrings = topDict.CharStrings
+		charStrings.charStrings = {renames[glyphName]: charString
+			for glyphName, charString in charStrings.charStrings.items()}
+		topDict.charset = [renames[glyphName] for glyphName in topDict.charset]
+
+
 ttLib.getTableClass('maxp').mergeMap = {
 	'*': max,
 	'tableTag': equal,
@@ -689,6 +729,7 @@ class Options(object):
 
 		self.verbose = False
 		self.timing = False
+		self.jobs = 1
 
 		self.set(**kwargs)
 
@@ -770,20 +811,19 @@ class Merger(object):
 
 	def merge(self, fontfiles):
 
+		_checkJobs(self.options.jobs)
 		mega = ttLib.TTFont()
 
 		#
 		# Settle on a mega glyph order.
 		#
 		fonts = [ttLib.TTFont(fontfile) for fontfile in fontfiles]
-		glyphOrders = [font.getGlyphOrder() for font in fonts]
+		glyphOrders = [list(font.getGlyphOrder()) for font in fonts]
 		megaGlyphOrder = self._mergeGlyphOrders(glyphOrders)
-		# Reload fonts and set new glyph names on them.
-		# TODO Is it necessary to reload font?  I think it is.  At least
-		# it's safer, in case tables were loaded to provide glyph names.
-		fonts = [ttLib.TTFont(fontfile) for fontfile in fontfiles]
+		# Set the new glyph names on the fonts.  Only the tables that provided
+		# the old names are loaded yet; the others will use the new names.
 		for font,glyphOrder in zip(fonts, glyphOrders):
-			font.setGlyphOrder(glyphOrder)
+			self._renameGlyphs(font, glyphOrder)
 		mega.setGlyphOrder(megaGlyphOrder)
 
 		for font in fonts:
@@ -802,20 +842,22 @@ class Merger(object):
 			allTags.remove('cmap')
 			allTags = ['cmap'] + list(allTags)
 
-		for tag in allTags:
-			with timer("merge '%s'" % tag):
-				tables = [font.get(tag, NotImplemented) for font in fonts]
-
-				log.info("Merging '%s'.", tag)
-				clazz = ttLib.getTableClass(tag)
-				table = clazz(tag).merge(self, tables)
-				# XXX Clean this up and use:  table = mergeObjects(tables)
-
-				if table is not NotImplemented and table is not False:
-					mega[tag] = table
-					log.info("Merged '%s'.", tag)
-				else:
-					log.info("Dropped '%s'.", tag)
+		pool, results = self._mergeTablesInPool(fonts, allTags)
+		try:
+			for tag in allTags:
+				if tag not in results:
+					with timer("merge '%s'" % tag):
+						table = self._mergeTable(fonts, tag)
+					self._addTable(mega, tag, table)
+			for tag in allTags:
+				if tag in results:
+					table, elapsed = pickle.loads(results[tag].get())
+					_logTime("merge '%s'" % tag, elapsed)
+					self._addTable(mega, tag, table)
+		finally:
+			if pool is not None:
+				pool.terminate()
+				pool.join()
 
 		del self.duplicateGlyphsPerFont
 
@@ -823,6 +865,55 @@ class Merger(object):
 
 		return mega
 
+	def _renameGlyphs(self, font, glyphOrder):
+		"""Set the glyph order of the font, renaming the glyphs in the tables
+		loaded so far.  Those that can't be renamed are parsed again."""
+		renames = dict(zip(font.getGlyphOrder(), glyphOrder))
+		for tag, table in list(font.tables.items()):
+			if table.renameGlyphs(renames) is NotImplemented:
+				if font.reader is None or tag not in font.reader:
+					raise ValueError("Don't know how to rename the glyphs of '%s'" % tag)
+				del font.tables[tag]
+		font.setGlyphOrder(glyphOrder)
+
+	def _mergeTable(self, fonts, tag):
+		tables = [font.get(tag, NotImplemented) for font in fonts]
+
+		log.info("Merging '%s'.", tag)
+		clazz = ttLib.getTableClass(tag)
+		return clazz(tag).merge(self, tables)
+		# XXX Clean this up and use:  table = mergeObjects(tables)
+
+	def _addTable(self, mega, tag, table):
+		if table is not NotImplemented and table is not False and table is not None:
+			mega[tag] = table
+			log.info("Merged '%s'.", tag)
+		else:
+			log.info("Dropped '%s'.", tag)
+
+	def _mergeTablesInPool(self, fonts, tags):
+		"""If the 'jobs' option is more than 1 (or 0, for the number of
+		CPUs), start merging the tables that don't depend on the merger's
+		state in a pool of forked worker processes, which send them back
+		pickled.  Return the pool and a dict mapping the tags to the pending
+		results, which is empty if the tables are merged one by one."""
+		jobs = self.options.jobs
+		parallel = [tag for tag in tags if tag not in _mergedInParent]
+		if jobs == 1 or len(parallel) < 2:
+			return None, {}
+		context = _forkContext()
+		if context is None:
+			log.debug("can't fork processes; merging tables one by one")
+			return None, {}
+		numProcesses = min(_numProcesses(jobs), len(parallel))
+		# forked workers inherit the initializer's arguments, unpickled
+		pool = context.Pool(numProcesses, _initMergeWorker, (self, fonts))
+		log.debug("merging %s in %d processes",
+				", ".join(repr(tag) for tag in parallel), numProcesses)
+		results = {tag: pool.apply_async(_mergeTableInWorker, (tag,))
+				for tag in parallel}
+		return pool, results
+
 	def _mergeGlyphOrders(self, glyphOrders):
 		"""Modifies passed-in glyphOrders to reflect new glyph names.
 		Returns glyphOrder for the merged font."""
@@ -911,6 +1002,35 @@ class Merger(object):
 		# TODO FeatureParams nameIDs
 
 
+# The tables that are merged in the main process when merging in parallel:
+# 'cmap' records the duplicate glyphs that 'GSUB' resolves, and the lookups
+# and features of 'GSUB' and 'GPOS' are referred to by id() until _postMerge.
+_mergedInParent = frozenset(['cmap', 'GSUB', 'GPOS'])
+
+def _initMergeWorker(merger, fonts):
+	"""Set up a worker process forked by Merger.merge, keeping the merger
+	and the fonts whose tables it merges."""
+	global _workerMerge
+	_workerMerge = (merger, fonts)
+	for font in fonts:
+		_reopenFile(font)
+
+
+def _mergeTableInWorker(tag):
+	merger, fonts = _workerMerge
+	with Timer() as t:
+		table = merger._mergeTable(fonts, tag)
+	if table is NotImplemented or table is False:
+		table = None
+	return pickle.dumps((table, t.elapsed), pickle.HIGHEST_PROTOCOL)
+
+
+def _logTime(msg, elapsed):
+	"""Log the time a worker process took, like 'timer' does."""
+	timer.logger.log(timer.level, timer.formatTime(msg, elapsed),
+			{'msg': msg, 'time': elapsed})
+
+
 __all__ = [
 	'Options',
 	'Merger',
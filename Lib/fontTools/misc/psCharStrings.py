@@ -5,6 +5,8 @@ CFF dictionary data and Type1/Type2 CharStrings.
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.fixedTools import fixedToFloat
+from collections import OrderedDict
+import array
 import struct
 import logging
 
@@ -278,6 +280,19 @@ class SimpleT2Decompiler(object):
 			assert program[-1] in ("endchar", "return", "callsubr", "callgsubr",
 					"seac"), "illegal CharString"
 
+	@classmethod
+	def getOperatorHandlers(cls):
+		"""Return a dict mapping the operator names to the 'op_' methods
+		of the class that handle them, built on first use."""
+		handlers = cls.__dict__.get("_operatorHandlers")
+		if handlers is None:
+			handlers = {}
+			for name in dir(cls):
+				if name.startswith("op_"):
+					handlers[name[3:]] = getattr(cls, name)
+			cls._operatorHandlers = handlers
+		return handlers
+
 	def execute(self, charString):
 		self.callingStack.append(charString)
 		needsDecompilation = charString.needsDecompilation()
@@ -287,6 +302,7 @@ class SimpleT2Decompiler(object):
 		else:
 			pushToProgram = lambda x: None
 		pushToStack = self.operandStack.append
+		handlers = self.getOperatorHandlers()
 		index = 0
 		while True:
 			token, isOperator, index = charString.getToken(index)
@@ -294,10 +310,9 @@ class SimpleT2Decompiler(object):
 				break  # we're done!
 			pushToProgram(token)
 			if isOperator:
-				handlerName = "op_" + token
-				handler = getattr(self, handlerName, None)
+				handler = handlers.get(token)
 				if handler is not None:
-					rv = handler(index)
+					rv = handler(self, index)
 					if rv:
 						hintMaskBytes, index = rv
 						pushToProgram(hintMaskBytes)
@@ -944,13 +959,30 @@ class T2CharString(object):
 	outlineExtractor = T2OutlineExtractor
 
 	def __init__(self, bytecode=None, program=None, private=None, globalSubrs=None):
-		if program is None:
+		if program is None and bytecode is None:
 			program = []
 		self.bytecode = bytecode
-		self.program = program
+		self._program = program
 		self.private = private
 		self.globalSubrs = globalSubrs if globalSubrs is not None else []
 
+	@property
+	def program(self):
+		"""The decompiled program, materialized from the bytecode when it is
+		first used.  The program of a subroutine is best obtained through
+		the charstrings calling it, which know the length of its hint masks.
+		Setting a program drops the bytecode, until compile() encodes the
+		program again and drops it in turn."""
+		if self._program is None and self.bytecode is not None:
+			self.decompile()
+		return self._program
+
+	@program.setter
+	def program(self, program):
+		self._program = program
+		if program is not None:
+			self.bytecode = None
+
 	def __repr__(self):
 		if self.bytecode is None:
 			return "<%s (source) at %x>" % (self.__class__.__name__, id(self))
@@ -1030,12 +1062,12 @@ class T2CharString(object):
 		return self.bytecode is not None
 
 	def setProgram(self, program):
-		self.program = program
+		self._program = program
 		self.bytecode = None
 
 	def setBytecode(self, bytecode):
 		self.bytecode = bytecode
-		self.program = None
+		self._program = None
 
 	def getToken(self, index,
 			len=len, byteord=byteord, basestring=basestring,
@@ -1048,9 +1080,9 @@ class T2CharString(object):
 			handler = self.operandEncoding[b0]
 			token, index = handler(self, b0, self.bytecode, index)
 		else:
-			if index >= len(self.program):
+			if index >= len(self._program):
 				return None, 0, 0
-			token = self.program[index]
+			token = self._program[index]
 			index = index + 1
 		isOperator = isinstance(token, basestring)
 		return token, isOperator, index
@@ -1061,7 +1093,7 @@ class T2CharString(object):
 			bytes = self.bytecode[index:newIndex]
 			index = newIndex
 		else:
-			bytes = self.program[index]
+			bytes = self._program[index]
 			index = index + 1
 		assert len(bytes) == nBytes
 		return bytes, index
@@ -1137,10 +1169,10 @@ class T1CharString(T2CharString):
 	operators, opcodes = buildOperatorDict(t1Operators)
 
 	def __init__(self, bytecode=None, program=None, subrs=None):
-		if program is None:
+		if program is None and bytecode is None:
 			program = []
 		self.bytecode = bytecode
-		self.program = program
+		self._program = program
 		self.subrs = subrs
 
 	def getIntEncoder(self):
@@ -1168,6 +1200,141 @@ class T1CharString(T2CharString):
 		self.width = extractor.width
 
 
+class _PathRecorder(object):
+
+	"""Pen that records a path as a string of opcodes, one per segment,
+	and the coordinates of the segments' points."""
+
+	def __init__(self):
+		self.opcodes = []
+		self.coordinates = []
+		self.components = []
+
+	def moveTo(self, pt):
+		self.opcodes.append("M")
+		self.coordinates.extend(pt)
+
+	def lineTo(self, pt):
+		self.opcodes.append("L")
+		self.coordinates.extend(pt)
+
+	def curveTo(self, pt1, pt2, pt3):
+		self.opcodes.append("C")
+		self.coordinates.extend(pt1)
+		self.coordinates.extend(pt2)
+		self.coordinates.extend(pt3)
+
+	def closePath(self):
+		self.opcodes.append("Z")
+
+	def endPath(self):
+		self.opcodes.append("E")
+
+	def addComponent(self, glyphName, transformation):
+		self.opcodes.append("A")
+		self.components.append(glyphName)
+		self.coordinates.extend(transformation)
+
+
+class CharStringPathCache(object):
+
+	"""Cache of the paths that charstrings draw, to draw them again
+	without interpreting them.
+
+	draw(charString, pen) draws the charstring like charString.draw(pen)
+	does. The first time, the path is also recorded: desubroutinized, with
+	absolute coordinates, as a string of opcodes and an array of the
+	coordinates. Later, that is replayed to the pen.
+
+	The least recently drawn paths are evicted when the recorded paths
+	take more than 'maxSize' bytes, roughly. A path is recorded again if
+	the charstring got a new program or bytecode; after changing a program
+	in place, or subroutines, clear() the cache.
+	"""
+
+	# rough size of an entry, besides its opcodes and coordinates
+	entryOverhead = 200
+
+	def __init__(self, maxSize=8*1024*1024):
+		self.maxSize = maxSize
+		self.size = 0
+		self.hits = self.misses = 0
+		self._paths = OrderedDict()
+
+	def __len__(self):
+		return len(self._paths)
+
+	def clear(self):
+		self._paths.clear()
+		self.size = 0
+
+	def draw(self, charString, pen):
+		path = self._paths.pop(charString, None)
+		if path is not None and (path[0] is not charString.bytecode or
+				path[1] is not charString._program):
+			self.size -= path[-1]
+			path = None
+		if path is None:
+			self.misses += 1
+			path = self._record(charString)
+		else:
+			self.hits += 1
+		# most recently drawn last
+		self._paths[charString] = path
+		while self.size > self.maxSize and len(self._paths) > 1:
+			evicted = self._paths.popitem(last=False)[1]
+			self.size -= evicted[-1]
+		self._replay(path, pen)
+		charString.width = path[5]
+
+	def _record(self, charString):
+		recorder = _PathRecorder()
+		charString.draw(recorder)
+		coordinates = recorder.coordinates
+		# keep integers integers, as the charstring draws them
+		try:
+			if all(type(v) is int for v in coordinates):
+				coordinates = array.array("i", coordinates)
+			else:
+				coordinates = array.array("d", coordinates)
+		except OverflowError:
+			coordinates = array.array("d", coordinates)
+		opcodes = "".join(recorder.opcodes)
+		size = (self.entryOverhead + len(opcodes) +
+				coordinates.itemsize * len(coordinates))
+		self.size += size
+		return (charString.bytecode, charString._program, opcodes, coordinates,
+				recorder.components, charString.width, size)
+
+	@staticmethod
+	def _replay(path, pen):
+		opcodes, coordinates, components = path[2:5]
+		i = 0
+		componentIndex = 0
+		for opcode in opcodes:
+			if opcode == "C":
+				pen.curveTo(
+					(coordinates[i], coordinates[i+1]),
+					(coordinates[i+2], coordinates[i+3]),
+					(coordinates[i+4], coordinates[i+5]))
+				i += 6
+			elif opcode == "L":
+				pen.lineTo((coordinates[i], coordinates[i+1]))
+				i += 2
+			elif opcode == "M":
+				pen.moveTo((coordinates[i], coordinates[i+1]))
+				i += 2
+			elif opcode == "Z":
+				pen.closePath()
+			elif opcode == "E":
+				pen.endPath()
+			else:
+				pen.addComponent(components[componentIndex],
+						tuple(coordinates[i:i+6]))
+				componentIndex += 1
+				i += 6
+
+
 class DictDecompiler(object):
 
 	operandEncoding = cffDictOperandEncoding
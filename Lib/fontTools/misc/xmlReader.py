@@ -3,8 +3,10 @@ from fontTools.misc.py23 import *
 from fontTools import ttLib
 from fontTools.misc.textTools import safeEval
 from fontTools.ttLib.tables.DefaultTable import DefaultTable
+from functools import partial
 import sys
 import os
+import re
 import logging
 
 
@@ -51,15 +53,99 @@ class XMLReader(object):
 		if rootless:
 			self.stackSize -= 1
 
+	def index(self):
+		"""Read the file without parsing the tables: only record the byte
+		range of each table element, and register a loader for each table
+		with the font, which parses the table from its range when the table
+		is first accessed. The GlyphOrder is parsed right away, as the font
+		needs it for most tables.
+
+		If the file was given as a path, it is read again when the tables
+		are parsed; a file object is read into memory.
+		"""
+		if self._closeStream:
+			path, data = os.path.abspath(self.file.name), None
+			file = self.file
+		else:
+			path, data = None, self.file.read()
+			file = BytesIO(data)
+		head = file.read(BUFSIZE)
+		file.seek(0)
+		# chunks are parsed with the XML declaration of the file, in case
+		# it specifies the encoding
+		xmlDecl = head[:head.find(b"?>") + 2] if head.startswith(b"<?xml") else b""
+		if self.progress:
+			file.seek(0, 2)
+			fileSize = file.tell()
+			self.progress.set(0, fileSize // 100 or 1)
+			file.seek(0)
+		self._ranges = {}
+		self._tableStart = None
+		self._parseFile(file, indexOnly=True)
+		self._parser = None
+		if self._closeStream:
+			self.close()
+		for tag, ranges in self._ranges.items():
+			self.ttFont._addPendingTable(
+				tag, _PendingTable(self.ttFont, path, data, xmlDecl, ranges))
+		if "GlyphOrder" in self.ttFont._pendingTables:
+			self.ttFont["GlyphOrder"]
+
+	def _indexStartElementHandler(self, name, attrs):
+		if self.stackSize != 1:
+			if not self.stackSize:
+				self._startElementHandler(name, attrs)
+				self.contentStack.pop()
+			else:
+				self.stackSize += 1
+			return
+		self._endTableRange()
+		self.stackSize += 1
+		tag = ttLib.xmlToTag(name)
+		subFile = attrs.get("src")
+		if subFile is not None:
+			subFile = os.path.join(self._getSubFileDir(), subFile)
+			self.ttFont._addPendingTable(
+				tag, partial(_readSubFile, self.ttFont, subFile))
+			return
+		log.debug("Indexing '%s' table...", tag)
+		self._tableStart = (tag, self._parser.CurrentByteIndex)
+
+	def _indexEndElementHandler(self, name):
+		self.stackSize -= 1
+		if not self.stackSize:
+			self._endTableRange()
+
+	def _endTableRange(self):
+		# a table element extends to the start of the next one, or to the
+		# end tag of the root: only whitespace and comments are in between
+		if self._tableStart is not None:
+			tag, start = self._tableStart
+			end = self._parser.CurrentByteIndex
+			self._ranges.setdefault(tag, []).append((start, end))
+			self._tableStart = None
+
 	def close(self):
 		self.file.close()
 
-	def _parseFile(self, file):
+	def _getSubFileDir(self):
+		if hasattr(self.file, 'name'):
+			# if file has a name, get its parent directory
+			return os.path.dirname(self.file.name)
+		else:
+			# else fall back to using the current working directory
+			return os.getcwd()
+
+	def _parseFile(self, file, indexOnly=False):
 		from xml.parsers.expat import ParserCreate
-		parser = ParserCreate()
-		parser.StartElementHandler = self._startElementHandler
-		parser.EndElementHandler = self._endElementHandler
-		parser.CharacterDataHandler = self._characterDataHandler
+		parser = self._parser = ParserCreate()
+		if indexOnly:
+			parser.StartElementHandler = self._indexStartElementHandler
+			parser.EndElementHandler = self._indexEndElementHandler
+		else:
+			parser.StartElementHandler = self._startElementHandler
+			parser.EndElementHandler = self._endElementHandler
+			parser.CharacterDataHandler = self._characterDataHandler
 
 		pos = 0
 		while True:
@@ -87,13 +173,7 @@ class XMLReader(object):
 		elif stackSize == 1:
 			subFile = attrs.get("src")
 			if subFile is not None:
-				if hasattr(self.file, 'name'):
-					# if file has a name, get its parent directory
-					dirname = os.path.dirname(self.file.name)
-				else:
-					# else fall back to using the current working directory
-					dirname = os.getcwd()
-				subFile = os.path.join(dirname, subFile)
+				subFile = os.path.join(self._getSubFileDir(), subFile)
 				subReader = XMLReader(subFile, self.ttFont, self.progress)
 				subReader.read()
 				self.contentStack.append([])
@@ -142,6 +222,56 @@ class XMLReader(object):
 			self.root = None
 
 
+class _PendingTable(object):
+	"""Loader of a table found by XMLReader.index(): parses the table from
+	the byte ranges of its elements in the file, given by its path or its
+	contents. See TTFont._addPendingTable()."""
+
+	def __init__(self, ttFont, path, data, xmlDecl, ranges):
+		self.ttFont = ttFont
+		self.path = path
+		self.data = data
+		self.xmlDecl = xmlDecl
+		self.ranges = ranges
+
+	def _readChunks(self):
+		if self.path is None:
+			return [self.data[start:end] for start, end in self.ranges]
+		chunks = []
+		with open(self.path, "rb") as file:
+			for start, end in self.ranges:
+				file.seek(start)
+				chunks.append(file.read(end - start))
+		return chunks
+
+	def __call__(self):
+		for chunk in self._readChunks():
+			reader = XMLReader(BytesIO(self.xmlDecl + chunk), self.ttFont)
+			reader.read(rootless=True)
+
+	def copyXML(self, writer):
+		"""Write the table element, as it is in the file, to the XMLWriter.
+		Return False, and write nothing, if the file isn't UTF-8 encoded
+		or has more than one element for the table."""
+		encoding = re.search(br"encoding=[\"']([^\"']*)", self.xmlDecl)
+		if encoding and encoding.group(1).lower().replace(b"-", b"") != b"utf8":
+			return False
+		if len(self.ranges) != 1:
+			return False
+		chunk = self._readChunks()[0].rstrip()
+		newline = tobytes(writer.newlinestr)
+		if newline != b"\n":
+			chunk = chunk.replace(b"\r\n", b"\n").replace(b"\n", newline)
+		writer._writeraw(chunk)
+		writer.newline()
+		writer.newline()
+		return True
+
+
+def _readSubFile(ttFont, path):
+	XMLReader(path, ttFont).read()
+
+
 class ProgressPrinter(object):
 
 	def __init__(self, title, maxval=100):
@@ -6,6 +6,7 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools import ttLib
 from fontTools.ttLib.tables import otTables
+from fontTools.ttLib.tables.otBase import BaseTTXConverter
 from fontTools.misc import psCharStrings
 from fontTools.pens.basePen import NullPen
 from fontTools.misc.loggingTools import Timer
@@ -13,6 +14,7 @@ import sys
 import struct
 import array
 import logging
+from copy import deepcopy
 from types import MethodType
 
 __usage__ = "pyftsubset font-file [glyph...] [--option=value]..."
@@ -364,12 +366,6 @@ def _add_method(*clazzes):
 def _uniq_sort(l):
     return sorted(set(l))
 
-def _set_update(s, *others):
-    # Jython's set.update only takes one other argument.
-    # Emulate real set.update...
-    for other in others:
-        s.update(other)
-
 def _dict_subset(d, glyphs):
     return {g:d[g] for g in glyphs}
 
@@ -430,8 +426,9 @@ def remap(self, class_map):
     self.classDefs = {g:class_map.index(v) for g,v in self.classDefs.items()}
 
 @_add_method(otTables.SingleSubst)
-def closure_glyphs(self, s, cur_glyphs):
-    s.glyphs.update(v for g,v in self.mapping.items() if g in cur_glyphs)
+def closure_rules(self, graph, glyphs):
+    for g in graph.restrict(self.mapping, glyphs):
+        graph.add_rule([g], outputs=[self.mapping[g]])
 
 @_add_method(otTables.SingleSubst)
 def subset_glyphs(self, s):
@@ -440,10 +437,9 @@ def subset_glyphs(self, s):
     return bool(self.mapping)
 
 @_add_method(otTables.MultipleSubst)
-def closure_glyphs(self, s, cur_glyphs):
-    for glyph, subst in self.mapping.items():
-        if glyph in cur_glyphs:
-            _set_update(s.glyphs, subst)
+def closure_rules(self, graph, glyphs):
+    for g in graph.restrict(self.mapping, glyphs):
+        graph.add_rule([g], outputs=self.mapping[g])
 
 @_add_method(otTables.MultipleSubst)
 def subset_glyphs(self, s):
@@ -452,9 +448,9 @@ def subset_glyphs(self, s):
     return bool(self.mapping)
 
 @_add_method(otTables.AlternateSubst)
-def closure_glyphs(self, s, cur_glyphs):
-    _set_update(s.glyphs, *(vlist for g,vlist in self.alternates.items()
-                            if g in cur_glyphs))
+def closure_rules(self, graph, glyphs):
+    for g in graph.restrict(self.alternates, glyphs):
+        graph.add_rule([g], outputs=self.alternates[g])
 
 @_add_method(otTables.AlternateSubst)
 def subset_glyphs(self, s):
@@ -465,11 +461,11 @@ def subset_glyphs(self, s):
     return bool(self.alternates)
 
 @_add_method(otTables.LigatureSubst)
-def closure_glyphs(self, s, cur_glyphs):
-    _set_update(s.glyphs, *([seq.LigGlyph for seq in seqs
-                             if all(c in s.glyphs for c in seq.Component)]
-                            for g,seqs in self.ligatures.items()
-                            if g in cur_glyphs))
+def closure_rules(self, graph, glyphs):
+    for g in graph.restrict(self.ligatures, glyphs):
+        for seq in self.ligatures[g]:
+            graph.add_rule([g], [frozenset([c]) for c in seq.Component],
+                           outputs=[seq.LigGlyph])
 
 @_add_method(otTables.LigatureSubst)
 def subset_glyphs(self, s):
@@ -483,14 +479,13 @@ def subset_glyphs(self, s):
     return bool(self.ligatures)
 
 @_add_method(otTables.ReverseChainSingleSubst)
-def closure_glyphs(self, s, cur_glyphs):
+def closure_rules(self, graph, glyphs):
     if self.Format == 1:
-        indices = self.Coverage.intersect(cur_glyphs)
-        if(not indices or
-           not all(c.intersect(s.glyphs)
-                   for c in self.LookAheadCoverage + self.BacktrackCoverage)):
-            return
-        s.glyphs.update(self.Substitute[i] for i in indices)
+        conditions = [frozenset(c.glyphs)
+                      for c in self.LookAheadCoverage + self.BacktrackCoverage]
+        for i,g in enumerate(self.Coverage.glyphs):
+            if glyphs is None or g in glyphs:
+                graph.add_rule([g], conditions, outputs=[self.Substitute[i]])
     else:
         assert 0, "unknown format: %s" % self.Format
 
@@ -883,95 +878,79 @@ def __subset_classify_context(self):
         self.__class__.__ContextHelpers[self.Format] = helper
     return self.__class__.__ContextHelpers[self.Format]
 
+def _context_lookups(graph, lookupRecords, positions, chaosEnd):
+    """Returns the (lookup index, glyphs) pairs that a context rule applies,
+    given the glyphs at each input position.  Positions after a lookup that
+    may change the number of glyphs are not known anymore."""
+    lookups = []
+    chaos = set()
+    for ll in lookupRecords:
+        if not ll: continue
+        seqi = ll.SequenceIndex
+        if seqi in chaos or seqi >= len(positions):
+            # TODO Can we improve this?
+            pos_glyphs = None
+        else:
+            pos_glyphs = positions[seqi]
+        lookups.append((ll.LookupListIndex, pos_glyphs))
+        chaos.add(seqi)
+        if graph.may_have_non_1to1(ll.LookupListIndex):
+            chaos.update(range(seqi, chaosEnd))
+    return lookups
+
 @_add_method(otTables.ContextSubst,
              otTables.ChainContextSubst)
-def closure_glyphs(self, s, cur_glyphs):
+def closure_rules(self, graph, glyphs):
     c = self.__subset_classify_context()
 
-    indices = c.Coverage(self).intersect(cur_glyphs)
-    if not indices:
-        return []
-    cur_glyphs = c.Coverage(self).intersect_glyphs(cur_glyphs)
+    cur_glyphs = graph.restrict(c.Coverage(self).glyphs, glyphs)
+    if not cur_glyphs:
+        return
 
     if self.Format == 1:
-        ContextData = c.ContextData(self)
+        cur_glyphs = set(cur_glyphs)
         rss = getattr(self, c.RuleSet)
         rssCount = getattr(self, c.RuleSetCount)
-        for i in indices:
+        for i,g in enumerate(c.Coverage(self).glyphs):
+            if g not in cur_glyphs: continue
             if i >= rssCount or not rss[i]: continue
             for r in getattr(rss[i], c.Rule):
                 if not r: continue
-                if not all(all(c.Intersect(s.glyphs, cd, k) for k in klist)
-                           for cd,klist in zip(ContextData, c.RuleData(r))):
-                    continue
-                chaos = set()
-                for ll in getattr(r, c.LookupRecord):
-                    if not ll: continue
-                    seqi = ll.SequenceIndex
-                    if seqi in chaos:
-                        # TODO Can we improve this?
-                        pos_glyphs = None
-                    else:
-                        if seqi == 0:
-                            pos_glyphs = frozenset([c.Coverage(self).glyphs[i]])
-                        else:
-                            pos_glyphs = frozenset([r.Input[seqi - 1]])
-                    lookup = s.table.LookupList.Lookup[ll.LookupListIndex]
-                    chaos.add(seqi)
-                    if lookup.may_have_non_1to1():
-                        chaos.update(range(seqi, len(r.Input)+2))
-                    lookup.closure_glyphs(s, cur_glyphs=pos_glyphs)
+                conditions = [frozenset([k])
+                              for klist in c.RuleData(r) for k in klist]
+                positions = [frozenset([g])] + [frozenset([k]) for k in r.Input]
+                lookups = _context_lookups(graph, getattr(r, c.LookupRecord),
+                                           positions, len(r.Input)+2)
+                graph.add_rule([g], conditions, lookups=lookups)
     elif self.Format == 2:
         ClassDef = getattr(self, c.ClassDef)
-        indices = ClassDef.intersect(cur_glyphs)
         ContextData = c.ContextData(self)
         rss = getattr(self, c.RuleSet)
         rssCount = getattr(self, c.RuleSetCount)
-        for i in indices:
+        triggers = {}
+        for g in cur_glyphs:
+            triggers.setdefault(ClassDef.classDefs.get(g, 0), []).append(g)
+        for i,trigger in triggers.items():
             if i >= rssCount or not rss[i]: continue
             for r in getattr(rss[i], c.Rule):
                 if not r: continue
-                if not all(all(c.Intersect(s.glyphs, cd, k) for k in klist)
-                           for cd,klist in zip(ContextData, c.RuleData(r))):
-                    continue
-                chaos = set()
-                for ll in getattr(r, c.LookupRecord):
-                    if not ll: continue
-                    seqi = ll.SequenceIndex
-                    if seqi in chaos:
-                        # TODO Can we improve this?
-                        pos_glyphs = None
-                    else:
-                        if seqi == 0:
-                            pos_glyphs = frozenset(ClassDef.intersect_class(cur_glyphs, i))
-                        else:
-                            pos_glyphs = frozenset(ClassDef.intersect_class(s.glyphs, getattr(r, c.Input)[seqi - 1]))
-                    lookup = s.table.LookupList.Lookup[ll.LookupListIndex]
-                    chaos.add(seqi)
-                    if lookup.may_have_non_1to1():
-                        chaos.update(range(seqi, len(getattr(r, c.Input))+2))
-                    lookup.closure_glyphs(s, cur_glyphs=pos_glyphs)
+                conditions = [graph.class_glyphs(cd, k)
+                              for cd,klist in zip(ContextData, c.RuleData(r))
+                              for k in klist]
+                inputs = getattr(r, c.Input)
+                positions = ([frozenset(trigger)] +
+                             [graph.class_glyphs(ClassDef, k) for k in inputs])
+                lookups = _context_lookups(graph, getattr(r, c.LookupRecord),
+                                           positions, len(inputs)+2)
+                graph.add_rule(trigger, conditions, lookups=lookups)
     elif self.Format == 3:
-        if not all(x.intersect(s.glyphs) for x in c.RuleData(self)):
-            return []
-        r = self
-        chaos = set()
-        for ll in getattr(r, c.LookupRecord):
-            if not ll: continue
-            seqi = ll.SequenceIndex
-            if seqi in chaos:
-                # TODO Can we improve this?
-                pos_glyphs = None
-            else:
-                if seqi == 0:
-                    pos_glyphs = frozenset(cur_glyphs)
-                else:
-                    pos_glyphs = frozenset(r.InputCoverage[seqi].intersect_glyphs(s.glyphs))
-            lookup = s.table.LookupList.Lookup[ll.LookupListIndex]
-            chaos.add(seqi)
-            if lookup.may_have_non_1to1():
-                chaos.update(range(seqi, len(r.InputCoverage)+1))
-            lookup.closure_glyphs(s, cur_glyphs=pos_glyphs)
+        conditions = [frozenset(x.glyphs) for x in c.RuleData(self)]
+        inputs = self.InputCoverage if c.Chain else self.Coverage
+        positions = ([frozenset(cur_glyphs)] +
+                     [frozenset(x.glyphs) for x in inputs[1:]])
+        lookups = _context_lookups(graph, getattr(self, c.LookupRecord),
+                                   positions, len(inputs)+1)
+        graph.add_rule(cur_glyphs, conditions, lookups=lookups)
     else:
         assert 0, "unknown format: %s" % self.Format
 
@@ -1097,9 +1076,9 @@ def collect_lookups(self):
         assert 0, "unknown format: %s" % self.Format
 
 @_add_method(otTables.ExtensionSubst)
-def closure_glyphs(self, s, cur_glyphs):
+def closure_rules(self, graph, glyphs):
     if self.Format == 1:
-        self.ExtSubTable.closure_glyphs(s, cur_glyphs)
+        self.ExtSubTable.closure_rules(graph, glyphs)
     else:
         assert 0, "unknown format: %s" % self.Format
 
@@ -1143,23 +1122,10 @@ def collect_lookups(self):
         assert 0, "unknown format: %s" % self.Format
 
 @_add_method(otTables.Lookup)
-def closure_glyphs(self, s, cur_glyphs=None):
-    if cur_glyphs is None:
-        cur_glyphs = frozenset(s.glyphs)
-
-    # Memoize
-    if (id(self), cur_glyphs) in s._doneLookups:
-        return
-    s._doneLookups.add((id(self), cur_glyphs))
-
-    if self in s._activeLookups:
-        raise Exception("Circular loop in lookup recursion")
-    s._activeLookups.append(self)
+def closure_rules(self, graph, glyphs):
     for st in self.SubTable:
         if not st: continue
-        st.closure_glyphs(s, cur_glyphs)
-    assert(s._activeLookups[-1] == self)
-    del s._activeLookups[-1]
+        st.closure_rules(graph, glyphs)
 
 @_add_method(otTables.Lookup)
 def subset_glyphs(self, s):
@@ -1341,30 +1307,205 @@ def subset_glyphs(self, s):
                      for strike in self.strikeData]
   return True
 
+class _NotIn(object):
+    """The (unbounded) set of glyphs not in 'glyphs'; ClassDef class 0."""
+
+    __slots__ = ('glyphs',)
+
+    def __init__(self, glyphs):
+        self.glyphs = frozenset(glyphs)
+
+    def __contains__(self, glyph):
+        return glyph not in self.glyphs
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.glyphs == other.glyphs
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((_NotIn, self.glyphs))
+
+
+class GSUBClosureGraph(object):
+    """Glyph dependency graph of a GSUB table, for computing closures.
+
+    The graph is built once from the lookups reachable from the selected
+    features (all features by default).  Each substitution becomes a rule:
+    when a trigger glyph is present and each of the rule's conditions is
+    met (at least one of a set of glyphs is present), the rule adds its
+    output glyphs, or activates further lookups on a given set of glyphs
+    (context lookups).  Closing a set of glyphs over the graph is then a
+    single traversal, rather than iterating all lookups to a fixed point.
+
+    >>> graph = GSUBClosureGraph(font['GSUB'], features=['smcp'])  # doctest: +SKIP
+    >>> graph.produces('a')  # doctest: +SKIP
+    {'a.sc'}
+    """
+
+    def __init__(self, table, features=None):
+        table = table.table
+        self._lookups = table.LookupList.Lookup if table.LookupList else []
+        if table.ScriptList:
+            feature_indices = table.ScriptList.collect_features()
+        else:
+            feature_indices = []
+        if table.FeatureList:
+            if features is not None:
+                features = set(features)
+                records = table.FeatureList.FeatureRecord
+                feature_indices = [i for i in feature_indices
+                                   if i < table.FeatureList.FeatureCount and
+                                      records[i].FeatureTag in features]
+            lookup_indices = table.FeatureList.collect_lookups(feature_indices)
+        else:
+            lookup_indices = []
+
+        self._conditions = {}           # glyphs -> condition index
+        self._glyphConditions = {}      # glyph -> [condition index]
+        self._notInConditions = []      # [(condition index, _NotIn)]
+        self._conditionRules = []       # condition index -> [rule index]
+        self._ruleActivation = []       # rule index -> activation index
+        self._ruleConditionCount = []   # rule index -> number of conditions
+        self._ruleOutputs = []          # rule index -> glyphs added
+        self._ruleLookups = []          # rule index -> activations
+        self._activations = {}          # (lookup index, glyphs) -> activation index
+        self._activationRules = []      # activation index -> [rule index]
+        self._pending = []
+        self._current = None
+        self._classGlyphs = {}
+
+        self._roots = [self._activate(i, None) for i in lookup_indices
+                       if i < len(self._lookups) and self._lookups[i]]
+        while self._pending:
+            self._current, lookupIndex, glyphs = self._pending.pop()
+            self._lookups[lookupIndex].closure_rules(self, glyphs)
+        del self._pending, self._current, self._classGlyphs
+
+    def _activate(self, lookupIndex, glyphs):
+        key = (lookupIndex, glyphs)
+        activation = self._activations.get(key)
+        if activation is None:
+            activation = self._activations[key] = len(self._activationRules)
+            self._activationRules.append([])
+            self._pending.append((activation, lookupIndex, glyphs))
+        return activation
+
+    def _condition(self, glyphs):
+        condition = self._conditions.get(glyphs)
+        if condition is None:
+            condition = self._conditions[glyphs] = len(self._conditionRules)
+            self._conditionRules.append([])
+            if isinstance(glyphs, _NotIn):
+                self._notInConditions.append((condition, glyphs))
+            else:
+                for g in glyphs:
+                    self._glyphConditions.setdefault(g, []).append(condition)
+        return condition
+
+    # Used by the closure_rules() methods of the lookup subtables.
+
+    def restrict(self, glyphs, restriction):
+        """Returns the glyphs of 'glyphs' that are in 'restriction', which is
+        None for all glyphs."""
+        if restriction is None:
+            return list(glyphs)
+        return [g for g in glyphs if g in restriction]
+
+    def class_glyphs(self, classDef, klass):
+        """Returns the glyphs of class 'klass' of 'classDef'."""
+        if classDef is None:
+            return _NotIn(()) if klass == 0 else frozenset()
+        classes = self._classGlyphs.get(id(classDef))
+        if classes is None:
+            classes = {}
+            for g,v in classDef.classDefs.items():
+                classes.setdefault(v, []).append(g)
+            classes = {v:frozenset(l) for v,l in classes.items()}
+            classes[0] = _NotIn(classDef.classDefs)
+            self._classGlyphs[id(classDef)] = classes
+        return classes.get(klass, frozenset())
+
+    def may_have_non_1to1(self, lookupIndex):
+        lookup = self._lookups[lookupIndex]
+        return bool(lookup) and lookup.may_have_non_1to1()
+
+    def add_rule(self, trigger, conditions=(), outputs=(), lookups=()):
+        """Adds a rule to the lookup being processed: if any of the 'trigger'
+        glyphs is present, as well as at least one glyph of each of the
+        'conditions' glyph sets, the 'outputs' glyphs are added and the
+        'lookups' are applied.  The latter are (lookup index, glyphs) pairs,
+        where glyphs restricts the glyphs the lookup applies to, or is None
+        for all."""
+        conditions = [frozenset(trigger)] + list(conditions)
+        if not all(conditions):
+            return # Can never match
+        conditions = set(self._condition(c) for c in conditions)
+        rule = len(self._ruleActivation)
+        for c in conditions:
+            self._conditionRules[c].append(rule)
+        self._ruleActivation.append(self._current)
+        self._ruleConditionCount.append(len(conditions))
+        self._ruleOutputs.append(tuple(outputs))
+        self._ruleLookups.append(tuple(self._activate(i, glyphs)
+                                       for i,glyphs in lookups
+                                       if i < len(self._lookups) and
+                                          self._lookups[i]))
+        self._activationRules[self._current].append(rule)
+
+    def closure(self, glyphs):
+        """Returns the set of 'glyphs' and all glyphs they can be
+        substituted with."""
+        remaining = self._ruleConditionCount[:]
+        satisfied = [False] * len(self._conditionRules)
+        active = [False] * len(self._activationRules)
+        notIn = self._notInConditions
+        result = set()
+        pendingGlyphs = list(glyphs)
+        pendingActivations = list(self._roots)
+        pendingRules = []
+        while pendingGlyphs or pendingActivations or pendingRules:
+            while pendingRules:
+                rule = pendingRules.pop()
+                pendingGlyphs.extend(self._ruleOutputs[rule])
+                pendingActivations.extend(self._ruleLookups[rule])
+            if pendingActivations:
+                activation = pendingActivations.pop()
+                if active[activation]: continue
+                active[activation] = True
+                pendingRules.extend(r for r in self._activationRules[activation]
+                                    if not remaining[r])
+                continue
+            if pendingGlyphs:
+                g = pendingGlyphs.pop()
+                if g in result: continue
+                result.add(g)
+                conditions = [c for c in self._glyphConditions.get(g, ())
+                              if not satisfied[c]]
+                if notIn:
+                    conditions.extend(c for c,klass in notIn if g in klass)
+                    notIn = [(c,klass) for c,klass in notIn if g not in klass]
+                for c in conditions:
+                    satisfied[c] = True
+                    for r in self._conditionRules[c]:
+                        remaining[r] -= 1
+                        if not remaining[r] and active[self._ruleActivation[r]]:
+                            pendingRules.append(r)
+        return result
+
+    def produces(self, glyph):
+        """Returns the set of glyphs that 'glyph' can be substituted with
+        on its own."""
+        return self.closure([glyph]) - {glyph}
+
 @_add_method(ttLib.getTableClass('GSUB'))
 def closure_glyphs(self, s):
-    s.table = self.table
-    if self.table.ScriptList:
-        feature_indices = self.table.ScriptList.collect_features()
+    if s._prepared is not None:
+        graph = s._prepared._gsub_graph
     else:
-        feature_indices = []
-    if self.table.FeatureList:
-        lookup_indices = self.table.FeatureList.collect_lookups(feature_indices)
-    else:
-        lookup_indices = []
-    if self.table.LookupList:
-        while True:
-            orig_glyphs = frozenset(s.glyphs)
-            s._activeLookups = []
-            s._doneLookups = set()
-            for i in lookup_indices:
-                if i >= self.table.LookupList.LookupCount: continue
-                if not self.table.LookupList.Lookup[i]: continue
-                self.table.LookupList.Lookup[i].closure_glyphs(s)
-            del s._activeLookups, s._doneLookups
-            if orig_glyphs == s.glyphs:
-                break
-    del s.table
+        graph = GSUBClosureGraph(self)
+    s.glyphs.update(graph.closure(s.glyphs))
 
 @_add_method(ttLib.getTableClass('GSUB'),
              ttLib.getTableClass('GPOS'))
@@ -1785,14 +1926,18 @@ def remapComponentsFast(self, indices):
 
 @_add_method(ttLib.getTableClass('glyf'))
 def closure_glyphs(self, s):
+    if s._prepared is not None:
+        graph = s._prepared._glyf_components
+        getComponentNames = lambda g: graph.get(g, ())
+    else:
+        getComponentNames = lambda g: self.glyphs[g].getComponentNames(self)
     decompose = s.glyphs
     while True:
         components = set()
         for g in decompose:
             if g not in self.glyphs:
                 continue
-            gl = self.glyphs[g]
-            for c in gl.getComponentNames(self):
+            for c in getComponentNames(g):
                 if c not in s.glyphs:
                     components.add(c)
         components = set(c for c in components if c not in s.glyphs)
@@ -2229,12 +2374,13 @@ def prune_post_subset(self, options):
 
         # Renumber subroutines to remove unused ones
 
-        # Mark all used subroutines
-        for g in font.charset:
-            c, _ = cs.getItemAndSelector(g)
-            subrs = getattr(c.private, "Subrs", [])
-            decompiler = _MarkingT2Decompiler(subrs, c.globalSubrs)
-            decompiler.execute(c)
+        # Mark all used subroutines, unless a PreparedFont did
+        if not hasattr(font.GlobalSubrs, '_used'):
+            for g in font.charset:
+                c, _ = cs.getItemAndSelector(g)
+                subrs = getattr(c.private, "Subrs", [])
+                decompiler = _MarkingT2Decompiler(subrs, c.globalSubrs)
+                decompiler.execute(c)
 
         all_subrs = [font.GlobalSubrs]
         if hasattr(font, 'FDSelect'):
@@ -2242,8 +2388,6 @@ def prune_post_subset(self, options):
         elif hasattr(font.Private, 'Subrs') and font.Private.Subrs:
             all_subrs.append(font.Private.Subrs)
 
-        subrs = set(subrs) # Remove duplicates
-
         # Prepare
         for subrs in all_subrs:
             if not hasattr(subrs, '_used'):
@@ -2281,6 +2425,15 @@ def prune_post_subset(self, options):
         for subrs in all_subrs:
             del subrs._used, subrs._old_bias, subrs._new_bias
 
+        # Compile the programs back to bytecode, which takes much less
+        # memory until the font is saved
+        for g in font.charset:
+            c, _ = cs.getItemAndSelector(g)
+            c.compile()
+        for subrs in all_subrs:
+            for subr in subrs.items:
+                subr.compile()
+
     return True
 
 @_add_method(ttLib.getTableClass('cmap'))
@@ -2583,6 +2736,7 @@ class Subsetter(object):
         self.unicodes_requested = set()
         self.glyph_names_requested = set()
         self.glyph_ids_requested = set()
+        self._prepared = None
 
     def populate(self, glyphs=[], gids=[], unicodes=[], text=""):
         self.unicodes_requested.update(unicodes)
@@ -2787,6 +2941,264 @@ class Subsetter(object):
         self._prune_post_subset(font)
 
 
+class PreparedFont(object):
+    """A font that is loaded and pruned once, then subset many times.
+
+    Loading a font and running the pre-subset pruning dominates the cost
+    of small subsets.  A PreparedFont does that work once, for a fixed
+    set of Options, and then answers any number of subset requests from
+    the same parsed font.  Each request closes the glyph set over the
+    shared font, which is only read, and returns a new TTFont that holds
+    copies of the retained glyphs only:
+
+        prepared = PreparedFont("font.ttf", options)
+        for text in requests:
+            font = prepared.subset(text=text)
+            save_font(font, outfile, options)
+
+    Besides the pruned font, the following are computed once and shared:
+    the 'GSUB' closure graph, the 'glyf' components, the cmap mappings of
+    each glyph, and, unless hints are dropped or the font desubroutinized,
+    the CFF subroutines each glyph calls.  A request copies only the cmap
+    mappings and subroutines it keeps.  The OpenType Layout tables are
+    still decompiled and subset for every request, from data compiled
+    once after pruning.  If that compile has to fix offset overflows,
+    the lookups it promotes to Extension lookups stay so in the subsets.
+
+    The prepared font itself is never modified, so requests may run in
+    separate threads.
+    """
+
+    def __init__(self, fontFile, options=None, **kwargs):
+
+        if not options:
+            options = Options()
+
+        self.options = options
+        with timer("prepare font"):
+            self.font = font = load_font(fontFile, options, **kwargs)
+            Subsetter(options)._prune_pre_subset(font)
+            self._load_all(font)
+
+            # OpenType Layout tables are big object graphs of which a
+            # request only touches a small part.  Store them compiled
+            # after pruning, and decompile them lazily for each request.
+            # Compiling also fully decompiles the shared tables.  The
+            # lookups pruned above are None; remove them first, as
+            # prune_post_subset() does for every request anyway.
+            self._otl_data = {}
+            for tag in font.keys():
+                if tag == 'GlyphOrder': continue
+                if isinstance(font[tag], BaseTTXConverter):
+                    if tag in ('GSUB', 'GPOS'):
+                        font[tag].prune_lookups()
+                    self._otl_data[tag] = font[tag].compile(font)
+
+            self._gsub_graph = None
+            if 'GSUB' in font:
+                self._gsub_graph = GSUBClosureGraph(font['GSUB'])
+
+            self._glyf_components = {}
+            if 'glyf' in font:
+                glyf = font['glyf']
+                for g, gl in glyf.glyphs.items():
+                    components = gl.getComponentNames(glyf)
+                    if components:
+                        self._glyf_components[g] = components
+
+            # The unicodes of each glyph, per cmap subtable.
+            self._cmap_reverse = []
+            if 'cmap' in font:
+                for t in font['cmap'].tables:
+                    if t.format == 14: continue
+                    reverse = {}
+                    for u, g in t.cmap.items():
+                        reverse.setdefault(g, []).append(u)
+                    self._cmap_reverse.append((t, reverse))
+
+            # The subroutines each glyph calls, unless dropping hints or
+            # desubroutinizing changes them.
+            self._cff_subrs_used = None
+            if ('CFF ' in font and options.hinting and
+                    not options.desubroutinize):
+                self._cff_subrs_used = self._mark_subrs(font['CFF '].cff)
+
+    @staticmethod
+    def _load_all(font):
+        # Decompile everything that would otherwise be decompiled on
+        # first access, so that requests never write to the shared font.
+        font.getGlyphOrder()
+        font.getReverseGlyphMap()
+        for tag in font.keys():
+            if tag == 'GlyphOrder': continue
+            table = font[tag]
+            if tag == 'cmap':
+                for t in table.tables:
+                    t.cmap
+            elif tag == 'gvar':
+                table.variations = dict(table.variations.items())
+            elif tag in ('CFF ', 'CFF2'):
+                cff = table.cff
+                list(cff.GlobalSubrs)
+                for fontname in cff.keys():
+                    topDict = cff[fontname]
+                    dicts = [topDict]
+                    if hasattr(topDict, 'FDArray'):
+                        dicts.extend(topDict.FDArray)
+                    for d in dicts:
+                        for name in list(d.rawDict):
+                            getattr(d, name, None)
+                        private = getattr(d, 'Private', None)
+                        if private is None: continue
+                        for name in list(private.rawDict):
+                            getattr(private, name, None)
+                        if hasattr(private, 'Subrs'):
+                            list(private.Subrs)
+                    if hasattr(topDict, 'CharStrings'):
+                        list(topDict.CharStrings.values())
+
+    @staticmethod
+    def _mark_subrs(cff):
+        # Return, for each glyph, the (subrs, indices) pairs of the
+        # subroutines that its charstring calls, directly or not.
+        # Executing the charstrings decompiles them; restore their
+        # bytecode afterwards, which takes much less memory.
+        charstrings = list(cff.GlobalSubrs)
+        for fontname in cff.keys():
+            topDict = cff[fontname]
+            charstrings.extend(topDict.CharStrings.values())
+            privates = [fd.Private for fd in getattr(topDict, 'FDArray', [])]
+            if hasattr(topDict, 'Private'):
+                privates.append(topDict.Private)
+            for private in privates:
+                charstrings.extend(getattr(private, 'Subrs', []))
+        bytecodes = [(c, c.bytecode) for c in charstrings
+                     if c.bytecode is not None]
+
+        used = {}
+        for fontname in cff.keys():
+            topDict = cff[fontname]
+            cs = topDict.CharStrings
+            for g in topDict.charset:
+                c, _ = cs.getItemAndSelector(g)
+                subrs = getattr(c.private, "Subrs", [])
+                _MarkingT2Decompiler(subrs, c.globalSubrs).execute(c)
+                used[g] = []
+                for index in (subrs, c.globalSubrs):
+                    if hasattr(index, '_used'):
+                        if index._used:
+                            used[g].append((index, frozenset(index._used)))
+                        del index._used
+
+        for c, bytecode in bytecodes:
+            c.setBytecode(bytecode)
+        return used
+
+    def _copy_font(self, s):
+        src = self.font
+        glyphs = s.glyphs_all
+        font = ttLib.TTFont(sfntVersion=src.sfntVersion,
+                            flavor=src.flavor,
+                            recalcBBoxes=src.recalcBBoxes,
+                            recalcTimestamp=src.recalcTimestamp)
+        font.flavorData = deepcopy(src.flavorData)
+        font.setGlyphOrder(list(src.getGlyphOrder()))
+
+        # Tables refer back to the font and to the glyph order; redirect
+        # those to the new font.  The large per-glyph containers are
+        # pre-seeded with copies of the retained glyphs only, which is
+        # where most of the time of a full copy would go.
+        memo = {id(src): font, id(src.glyphOrder): font.glyphOrder}
+        def seed(d, items):
+            memo[id(d)] = {g: deepcopy(v, memo) for g, v in items}
+        if 'glyf' in src:
+            d = src['glyf'].glyphs
+            seed(d, ((g, d[g]) for g in glyphs if g in d))
+        for tag in ('hmtx', 'vmtx'):
+            if tag in src:
+                d = src[tag].metrics
+                seed(d, ((g, d[g]) for g in glyphs if g in d))
+        if 'gvar' in src:
+            d = src['gvar'].variations
+            seed(d, ((g, d[g]) for g in glyphs if g in d))
+        if 'cmap' in src:
+            # What cmap.subset_glyphs() keeps of the subtables
+            for t, reverse in self._cmap_reverse:
+                cmap = t.cmap
+                kept = {}
+                for g in s.glyphs_requested:
+                    for u in reverse.get(g, ()):
+                        kept[u] = g
+                if t.isUnicode():
+                    for u in s.unicodes_requested:
+                        if u in cmap:
+                            kept[u] = cmap[u]
+                memo[id(cmap)] = kept
+        subrs_used = []
+        if self._cff_subrs_used is not None:
+            cff = src['CFF '].cff
+            used = {}
+            for g in glyphs:
+                for subrs, indices in self._cff_subrs_used.get(g, ()):
+                    used.setdefault(id(subrs), set()).update(indices)
+            all_subrs = [cff.GlobalSubrs]
+            for fontname in cff.keys():
+                topDict = cff[fontname]
+                privates = [fd.Private for fd in getattr(topDict, 'FDArray', [])]
+                if hasattr(topDict, 'Private'):
+                    privates.append(topDict.Private)
+                all_subrs.extend(p.Subrs for p in privates if hasattr(p, 'Subrs'))
+            for subrs in all_subrs:
+                indices = used.get(id(subrs), set())
+                memo[id(subrs.items)] = [deepcopy(v, memo) if i in indices else None
+                                         for i, v in enumerate(subrs.items)]
+                subrs_used.append((subrs, indices))
+        for tag in ('CFF ', 'CFF2'):
+            if tag not in src: continue
+            cff = src[tag].cff
+            if hasattr(cff.topDictIndex, 'file'):
+                memo[id(cff.topDictIndex.file)] = cff.topDictIndex.file
+            for fontname in cff.keys():
+                topDict = cff[fontname]
+                cs = topDict.CharStrings
+                if cs.charStringsAreIndexed:
+                    items = cs.charStringsIndex.items
+                    memo[id(items)] = [deepcopy(v, memo) if g in glyphs else None
+                                       for g, v in zip(topDict.charset, items)]
+                else:
+                    d = cs.charStrings
+                    seed(d, ((g, d[g]) for g in glyphs if g in d))
+
+        for tag in src.keys():
+            if tag == 'GlyphOrder': continue
+            if tag in self._otl_data:
+                # Decompile against the prepared font, whose glyph order
+                # does not change when the new font is subset.
+                table = ttLib.newTable(tag)
+                table.decompile(self._otl_data[tag], src)
+                font[tag] = table
+            else:
+                font[tag] = deepcopy(src[tag], memo)
+        # The CFF prune_post_subset() then needs not run the charstrings
+        # to mark the subroutines they call.
+        for subrs, indices in subrs_used:
+            memo[id(subrs)]._used = indices
+        return font
+
+    def subset(self, glyphs=[], gids=[], unicodes=[], text=""):
+        """Return a new TTFont subset to the requested glyphs; the
+        arguments are the same as for Subsetter.populate()."""
+        subsetter = Subsetter(self.options)
+        subsetter.populate(glyphs=glyphs, gids=gids, unicodes=unicodes, text=text)
+        subsetter._prepared = self
+        subsetter._closure_glyphs(self.font)
+        with timer("copy retained glyphs"):
+            font = self._copy_font(subsetter)
+        subsetter._subset_glyphs(font)
+        subsetter._prune_post_subset(font)
+        return font
+
+
 @timer("load font")
 def load_font(fontFile,
               options,
@@ -2988,6 +3400,8 @@ def main(args=None):
 __all__ = [
     'Options',
     'Subsetter',
+    'PreparedFont',
+    'GSUBClosureGraph',
     'load_font',
     'save_font',
     'parse_gids',
@@ -47,6 +47,11 @@ from fontTools.misc.loggingTools import deprecateArgument, deprecateFunction
 import os
 import sys
 import logging
+import numbers
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
 
 
 log = logging.getLogger(__name__)
@@ -65,7 +70,8 @@ class TTFont(object):
 	def __init__(self, file=None, res_name_or_index=None,
 			sfntVersion="\000\001\000\000", flavor=None, checkChecksums=False,
 			verbose=None, recalcBBoxes=True, allowVID=False, ignoreDecompileErrors=False,
-			recalcTimestamp=True, fontNumber=-1, lazy=None, quiet=None):
+			recalcTimestamp=True, fontNumber=-1, lazy=None, quiet=None,
+			mmap=False, columnarGlyf=False):
 
 		"""The constructor can be called with a few different arguments.
 		When reading a font from disk, 'file' should be either a pathname
@@ -120,6 +126,18 @@ class TTFont(object):
 		If lazy is set to True, many data structures are loaded lazily, upon
 		access only.  If it is set to False, many data structures are loaded
 		immediately.  The default is lazy=None which is somewhere in between.
+
+		If mmap is set to True, a font file on disk is mapped in memory instead
+		of being read: the raw data of each table is then a memoryview on the
+		mapping, so that only the parts of the file that are actually used are
+		read from disk. This is useful when opening many fonts, or single fonts
+		out of large collections, of which only a few tables are needed. The
+		font can still be saved to the file it was read from.
+
+		If columnarGlyf is set to True, the outlines of all simple glyphs in
+		the 'glyf' table are decompiled at once into a single GlyphColumns
+		object, instead of one Glyph at a time as they are accessed. This
+		saves much memory and time for operations that touch all glyphs.
 		"""
 
 		from fontTools.ttLib import sfnt
@@ -133,8 +151,11 @@ class TTFont(object):
 		self.lazy = lazy
 		self.recalcBBoxes = recalcBBoxes
 		self.recalcTimestamp = recalcTimestamp
+		self.columnarGlyf = columnarGlyf
 		self.tables = {}
 		self.reader = None
+		self._pendingTables = {}
+		self._varInstancers = None
 
 		# Permit the user to reference glyphs that are not int the font.
 		self.last_vid = 0xFFFE # Can't make it be 0xFFFF, as the world is full unsigned short integer counters that get incremented after the last seen GID value.
@@ -168,7 +189,7 @@ class TTFont(object):
 		else:
 			# assume "file" is a readable file object
 			closeStream = False
-		if not self.lazy:
+		if not self.lazy and not mmap:
 			# read input file in memory and wrap a stream around it to allow overwriting
 			tmp = BytesIO(file.read())
 			if hasattr(file, 'name'):
@@ -178,6 +199,8 @@ class TTFont(object):
 				file.close()
 			file = tmp
 		self.reader = sfnt.SFNTReader(file, checkChecksums, fontNumber=fontNumber)
+		if mmap:
+			self.reader.mapFile()
 		self.sfntVersion = self.reader.sfntVersion
 		self.flavor = self.reader.flavor
 		self.flavorData = self.reader.flavorData
@@ -187,14 +210,39 @@ class TTFont(object):
 		if self.reader is not None:
 			self.reader.close()
 
-	def save(self, file, reorderTables=True):
+	def save(self, file, reorderTables=True, jobs=1):
 		"""Save the font to disk. Similarly to the constructor,
 		the 'file' argument can be either a pathname or a writable
 		file object.
+
+		If 'jobs' is more than 1 (or 0, for the number of CPUs), the
+		tables that neither depend on other tables nor have tables
+		depending on them (like GSUB, GPOS, CFF or cmap) are compiled
+		in that many forked worker processes, while this process compiles
+		the others. The output is the same as when compiling the tables
+		one by one. Where compiling a GSUB or GPOS table in a worker
+		fixes offset overflows (splitting lookup subtables, or promoting
+		lookups to Extension lookups), the changed table is sent back to
+		replace this font's table, as when it is compiled here. The other
+		tables that can be compiled in workers only update data derived
+		from them (like the compiled charstrings of CFF), which stays in
+		the workers. Where processes can't be forked, the tables are
+		compiled one by one.
 		"""
-		from fontTools.ttLib import sfnt
+		_checkJobs(jobs)
+		replacePath = None
 		if not hasattr(file, "write"):
-			if self.lazy and self.reader.file.name == file:
+			if self._isMappedFile(file):
+				# Overwriting the mapped file in place would change, or
+				# truncate, the data the tables are still reading from. Write
+				# a new file and move it over the old one instead: the mapping
+				# keeps the old file's data alive.
+				import tempfile
+				replacePath = file
+				fd, file = tempfile.mkstemp(
+					dir=os.path.dirname(os.path.abspath(replacePath)))
+				os.close(fd)
+			elif self.lazy and self.reader.file.name == file:
 				raise TTLibError(
 					"Can't overwrite TTFont when 'lazy' attribute is True")
 			closeStream = True
@@ -209,6 +257,49 @@ class TTFont(object):
 		tags = list(self.keys())
 		if "GlyphOrder" in tags:
 			tags.remove("GlyphOrder")
+		pool, compiled = None, None
+		if jobs != 1:
+			pool, compiled = self._compileTablesInPool(tags, jobs)
+		try:
+			self._save(file, tags, reorderTables, compiled)
+		finally:
+			if pool is not None:
+				pool.terminate()
+				pool.join()
+
+		if closeStream:
+			file.close()
+		if replacePath is not None:
+			import shutil
+			shutil.copymode(replacePath, file.name)
+			getattr(os, "replace", os.rename)(file.name, replacePath)
+
+	def _save(self, file, tags, reorderTables, compiled):
+		from fontTools.ttLib import sfnt
+		numTables = len(tags)
+		if self.flavor is None:
+			# stream the tables to the file in their final order
+			if (reorderTables is None or
+					(reorderTables is False and self.reader is None)):
+				# write the tables in the order they are compiled
+				tableOrder = None
+			elif reorderTables is False:
+				# sort tables using the original font's order
+				tableOrder = sortedTagList(tags, list(self.reader.keys()))
+			else:
+				# use the recommended order from the OpenType specification
+				tableOrder = sortedTagList(tags)
+			writer = sfnt.SFNTStreamWriter(file, numTables, self.sfntVersion, tableOrder)
+			done = []
+			for tag in tags:
+				self._writeTable(tag, writer, done, compiled)
+			writer.close()
+		else:
+			self._saveFlavored(file, tags, reorderTables, compiled)
+
+	def _saveFlavored(self, file, tags, reorderTables, compiled):
+		"""Save a WOFF or WOFF2 font, assembling it in memory first."""
+		from fontTools.ttLib import sfnt
 		numTables = len(tags)
 		# write to a temporary stream to allow saving to unseekable streams
 		tmp = BytesIO()
@@ -216,7 +307,7 @@ class TTFont(object):
 
 		done = []
 		for tag in tags:
-			self._writeTable(tag, writer, done)
+			self._writeTable(tag, writer, done, compiled)
 
 		writer.close()
 
@@ -240,8 +331,14 @@ class TTFont(object):
 			tmp.close()
 			tmp2.close()
 
-		if closeStream:
-			file.close()
+	def _isMappedFile(self, path):
+		if self.reader is None or self.reader.mappedFile is None:
+			return False
+		try:
+			return os.path.samestat(
+				os.stat(path), os.fstat(self.reader.file.fileno()))
+		except OSError:
+			return False
 
 	def saveXML(self, fileOrPath, progress=None, quiet=None,
 			tables=None, skipTables=None, splitTables=False, disassembleInstructions=True,
@@ -325,6 +422,18 @@ class TTFont(object):
 	def _tableToXML(self, writer, tag, progress, quiet=None):
 		if quiet is not None:
 			deprecateArgument("quiet", "configure logging instead")
+		# tables of a lazily imported TTX file that were never parsed get
+		# copied from the file, unless they would be dumped differently
+		loaders = self._pendingTables.get(tag)
+		if (loaders and len(loaders) == 1 and hasattr(loaders[0], "copyXML") and
+				getattr(self, "disassembleInstructions", True) and
+				getattr(self, "bitmapGlyphDataFormat", "raw") == "raw" and
+				loaders[0].copyXML(writer)):
+			report = "Copied '%s' table." % tag
+			if progress:
+				progress.setLabel(report)
+			log.info(report)
+			return
 		if tag in self:
 			table = self[tag]
 			report = "Dumping '%s' table..." % tag
@@ -352,12 +461,25 @@ class TTFont(object):
 		writer.newline()
 		writer.newline()
 
-	def importXML(self, fileOrPath, progress=None, quiet=None):
+	def importXML(self, fileOrPath, progress=None, quiet=None, jobs=1):
 		"""Import a TTX file (an XML-based text format), so as to recreate
 		a font object.
+
+		If the font was created with lazy=True, the file is only indexed,
+		and each table is parsed when it is first accessed: tables that are
+		never accessed, nor saved, are never parsed. Errors in a table are
+		then only reported when it is parsed.
+
+		Otherwise, if 'jobs' is more than 1 (or 0, for the number of CPUs),
+		the tables are parsed in that many forked worker processes, each
+		table after the tables it depends on (like 'gvar' after 'fvar' and
+		'glyf'). This is most useful for TTX files split with
+		splitTables=True, whose tables are in files of their own. Where
+		processes can't be forked, the tables are parsed one by one.
 		"""
 		if quiet is not None:
 			deprecateArgument("quiet", "configure logging instead")
+		_checkJobs(jobs)
 
 		if "maxp" in self and "post" in self:
 			# Make sure the glyph order is loaded, as it otherwise gets
@@ -369,7 +491,24 @@ class TTFont(object):
 		from fontTools.misc import xmlReader
 
 		reader = xmlReader.XMLReader(fileOrPath, self, progress)
-		reader.read()
+		if self.lazy:
+			reader.index()
+		elif jobs != 1:
+			reader.index()
+			self._loadPendingTables(jobs)
+		else:
+			reader.read()
+
+	def _addPendingTable(self, tag, loader):
+		"""Register a callable that loads the table identified by 'tag',
+		when it's first accessed. The table replaces the one the font
+		already has, if any."""
+		tag = Tag(tag)
+		if tag != "loca":
+			# 'loca' is loaded into the existing table, as the original is
+			# needed if the 'glyf' table isn't recompiled
+			self.tables.pop(tag, None)
+		self._pendingTables.setdefault(tag, []).append(loader)
 
 	def isLoaded(self, tag):
 		"""Return true if the table identified by 'tag' has been
@@ -379,6 +518,8 @@ class TTFont(object):
 	def has_key(self, tag):
 		if self.isLoaded(tag):
 			return True
+		elif tag in self._pendingTables:
+			return True
 		elif self.reader and tag in self.reader:
 			return True
 		elif tag == "GlyphOrder":
@@ -390,6 +531,9 @@ class TTFont(object):
 
 	def keys(self):
 		keys = list(self.tables.keys())
+		for key in self._pendingTables:
+			if key not in keys:
+				keys.append(key)
 		if self.reader:
 			for key in list(self.reader.keys()):
 				if key not in keys:
@@ -408,6 +552,12 @@ class TTFont(object):
 		try:
 			return self.tables[tag]
 		except KeyError:
+			loaders = self._pendingTables.pop(tag, None)
+			if loaders is not None:
+				log.debug("Parsing '%s' table", tag)
+				for loader in loaders:
+					loader()
+				return self.tables[tag]
 			if tag == "GlyphOrder":
 				table = GlyphOrder(tag)
 				self.tables[tag] = table
@@ -417,6 +567,8 @@ class TTFont(object):
 				log.debug("Reading '%s' table from disk", tag)
 				data = self.reader[tag]
 				tableClass = getTableClass(tag)
+				if isinstance(data, memoryview) and not tableClass.acceptsMemoryView:
+					data = data.tobytes()
 				table = tableClass(tag)
 				self.tables[tag] = table
 				log.debug("Decompiling '%s' table", tag)
@@ -434,19 +586,24 @@ class TTFont(object):
 					table = DefaultTable(tag)
 					table.ERROR = file.getvalue()
 					self.tables[tag] = table
+					if isinstance(data, memoryview):
+						data = data.tobytes()
 					table.decompile(data, self)
 				return table
 			else:
 				raise KeyError("'%s' table not found" % tag)
 
 	def __setitem__(self, tag, table):
-		self.tables[Tag(tag)] = table
+		tag = Tag(tag)
+		self.tables[tag] = table
+		self._pendingTables.pop(tag, None)
 
 	def __delitem__(self, tag):
 		if tag not in self:
 			raise KeyError("'%s' table not found" % tag)
 		if tag in self.tables:
 			del self.tables[tag]
+		self._pendingTables.pop(tag, None)
 		if self.reader and tag in self.reader:
 			del self.reader[tag]
 
@@ -642,7 +799,84 @@ class TTFont(object):
 		for glyphID in range(len(glyphOrder)):
 			d[glyphOrder[glyphID]] = glyphID
 
-	def _writeTable(self, tag, writer, done):
+	def _compileTablesInPool(self, tags, jobs):
+		"""Start compiling the independent tables in a pool of forked
+		worker processes. Return the pool and a dict mapping the tags to
+		the pending results, or (None, None) if processes can't be forked.
+		"""
+		dependents = set()
+		for tag in tags:
+			dependents.update(getTableClass(tag).dependencies)
+		independent = [tag for tag in tags if self.isLoaded(tag) and
+				tag not in dependents and not getTableClass(tag).dependencies]
+		if not independent:
+			return None, None
+		numProcesses = min(_numProcesses(jobs), len(independent))
+		pool = self._forkPool(numProcesses)
+		if pool is None:
+			log.debug("can't fork processes; compiling tables one by one")
+			return None, None
+		log.debug("compiling %s in %d processes",
+				", ".join(repr(tag) for tag in independent), numProcesses)
+		compiled = {tag: pool.apply_async(_compileTable, (tag,))
+				for tag in independent}
+		return pool, compiled
+
+	def _loadPendingTables(self, jobs):
+		"""Parse the pending tables of an indexed TTX file in a pool of
+		forked worker processes, which send the tables back pickled.
+		The tables are parsed in rounds, each after the tables it depends
+		on, which every round of workers is forked with.
+		"""
+		while self._pendingTables:
+			ready = [tag for tag in self._pendingTables if not any(
+					masterTable in self._pendingTables
+					for masterTable in getTableClass(tag).dependencies)]
+			if not ready:
+				# circular dependencies: just parse them all
+				ready = list(self._pendingTables)
+			# tables that are loaded into an existing table (like 'loca'),
+			# or that have several elements, are parsed here
+			parallel = []
+			for tag in ready:
+				if tag in self.tables or len(self._pendingTables[tag]) > 1:
+					self[tag]
+				else:
+					parallel.append(tag)
+			if len(parallel) < 2:
+				for tag in parallel:
+					self[tag]
+				continue
+			numProcesses = min(_numProcesses(jobs), len(parallel))
+			pool = self._forkPool(numProcesses)
+			if pool is None:
+				log.debug("can't fork processes; parsing tables one by one")
+				for tag in list(self._pendingTables):
+					self[tag]
+				return
+			log.debug("parsing %s in %d processes",
+					", ".join(repr(tag) for tag in parallel), numProcesses)
+			try:
+				for tag, data in zip(parallel, pool.imap(_parseTable, parallel)):
+					table = _unpickleTable(self, data)
+					self._pendingTables.pop(tag)
+					self.tables[tag] = table
+				pool.close()
+			finally:
+				pool.terminate()
+				pool.join()
+
+	def _forkPool(self, numProcesses):
+		"""Return a pool of worker processes forked from this process,
+		where this font is the '_workerFont', or None if processes can't
+		be forked."""
+		context = _forkContext()
+		if context is None:
+			return None
+		# forked workers inherit the initializer's arguments, unpickled
+		return context.Pool(numProcesses, _initWorker, (self,))
+
+	def _writeTable(self, tag, writer, done, compiled=None):
 		"""Internal helper function for self.save(). Keeps track of
 		inter-table dependencies.
 		"""
@@ -652,28 +886,41 @@ class TTFont(object):
 		for masterTable in tableClass.dependencies:
 			if masterTable not in done:
 				if masterTable in self:
-					self._writeTable(masterTable, writer, done)
+					self._writeTable(masterTable, writer, done, compiled)
 				else:
 					done.append(masterTable)
-		tabledata = self.getTableData(tag)
-		log.debug("writing '%s' table to disk", tag)
-		writer[tag] = tabledata
+		if compiled and tag in compiled:
+			log.debug("writing '%s' table compiled in a worker process", tag)
+			tabledata, table = compiled.pop(tag).get()
+			if table is not None:
+				log.debug("replacing '%s' table changed by its compile", tag)
+				self.tables[tag] = _unpickleTable(self, table)
+			writer[tag] = tabledata
+		elif (hasattr(writer, "copyTable") and not self.isLoaded(tag) and
+				tag not in self._pendingTables and
+				self.reader is not None and tag in self.reader):
+			log.debug("copying '%s' table from disk", tag)
+			writer.copyTable(tag, self.reader)
+		else:
+			tabledata = self.getTableData(tag)
+			log.debug("writing '%s' table to disk", tag)
+			writer[tag] = tabledata
 		done.append(tag)
 
 	def getTableData(self, tag):
 		"""Returns raw table data, whether compiled or directly read from disk.
 		"""
 		tag = Tag(tag)
-		if self.isLoaded(tag):
+		if self.isLoaded(tag) or tag in self._pendingTables:
 			log.debug("compiling '%s' table", tag)
-			return self.tables[tag].compile(self)
+			return self[tag].compile(self)
 		elif self.reader and tag in self.reader:
 			log.debug("Reading '%s' table from disk", tag)
 			return self.reader[tag]
 		else:
 			raise KeyError(tag)
 
-	def getGlyphSet(self, preferCFF=True):
+	def getGlyphSet(self, preferCFF=True, location=None, normalized=False):
 		"""Return a generic GlyphSet, which is a dict-like object
 		mapping glyph names to glyph objects. The returned glyph objects
 		have a .draw() method that supports the Pen protocol, and will
@@ -684,22 +931,163 @@ class TTFont(object):
 		If the font contains both a 'CFF '/'CFF2' and a 'glyf' table, you can use
 		the 'preferCFF' argument to specify which one should be taken. If the
 		font contains both a 'CFF ' and a 'CFF2' table, the latter is taken.
+
+		If 'location' is given, a dict mapping axis tags to values, the
+		glyphs are those of a variable TrueType font at that location: the
+		'gvar' deltas are applied to the outlines, and the 'HVAR' deltas (or
+		the 'gvar' phantom point deltas, if there is no 'HVAR' table) to the
+		advance widths. This happens lazily, when a glyph is accessed. The
+		location is in user space, eg. {'wght': 700}, unless 'normalized'
+		is true. Only 'glyf' outlines are supported.
 		"""
+		if location is not None and "fvar" not in self:
+			raise TTLibError("Font has no 'fvar' table; can't use a location")
+
 		glyphs = None
 		if (preferCFF and any(tb in self for tb in ["CFF ", "CFF2"]) or
 		   ("glyf" not in self and any(tb in self for tb in ["CFF ", "CFF2"]))):
+			if location is not None:
+				raise TTLibError("Locations are only supported for 'glyf' outlines")
 			table_tag = "CFF2" if "CFF2" in self else "CFF "
 			glyphs = _TTGlyphSet(self,
 			    list(self[table_tag].cff.values())[0].CharStrings, _TTGlyphCFF)
 
 		if glyphs is None and "glyf" in self:
-			glyphs = _TTGlyphSet(self, self["glyf"], _TTGlyphGlyf)
+			if location is not None:
+				glyphs = _TTVarGlyphSet(self, location, normalized)
+			else:
+				glyphs = _TTGlyphSet(self, self["glyf"], _TTGlyphGlyf)
 
 		if glyphs is None:
 			raise TTLibError("Font contains no outlines")
 
 		return glyphs
 
+	def _getVarInstancers(self):
+		"""Return the 'gvar' and 'HVAR' instancers of the font, either None
+		if the table is missing. They are shared by the glyph sets returned
+		by getGlyphSet() for different locations, so that the decoded deltas
+		and region scalars they cache are only computed once. New ones are
+		made when the tables are replaced.
+		"""
+		tables = tuple(self[tag] if tag in self else None
+		               for tag in ("glyf", "gvar", "HVAR"))
+		cached = self._varInstancers
+		if cached is None or any(a is not b for a, b in zip(cached[0], tables)):
+			from fontTools.varLib.mutator import GvarInstancer, VarStoreInstancer
+			_, gvar, hvar = tables
+			gvarInstancer = GvarInstancer(self) if gvar is not None else None
+			hvarInstancer = None
+			if hvar is not None:
+				hvarInstancer = VarStoreInstancer(
+					hvar.table.VarStore, self["fvar"].axes)
+			cached = self._varInstancers = (tables, gvarInstancer, hvarInstancer)
+		return cached[1:]
+
+
+def _checkJobs(jobs):
+	"""Raise an error unless 'jobs' is a non-negative integer, the number
+	of processes to use (0 meaning the number of CPUs)."""
+	if not isinstance(jobs, numbers.Integral):
+		raise TypeError("jobs must be a non-negative integer, not %r" % (jobs,))
+	if jobs < 0:
+		raise ValueError("jobs must be a non-negative integer, not %d" % jobs)
+
+
+def _numProcesses(jobs):
+	if jobs == 0:
+		import multiprocessing
+		return multiprocessing.cpu_count()
+	return jobs
+
+
+def _forkContext():
+	"""Return the multiprocessing context (or module) that forks worker
+	processes, or None if processes can't be forked."""
+	import multiprocessing
+	try:
+		return multiprocessing.get_context("fork")
+	except AttributeError:
+		# Python 2 always forks, where it can
+		return multiprocessing if os.name == "posix" else None
+	except ValueError:
+		return None
+
+
+def _reopenFile(font):
+	"""Open the file of a font read from disk again, in a forked worker
+	process, so as not to share the file position with the parent."""
+	reader = font.reader
+	if reader is not None and reader.mappedFile is None:
+		try:
+			os.fstat(reader.file.fileno())
+			if isinstance(reader.file.name, basestring):
+				reader.file = open(reader.file.name, "rb")
+		except (AttributeError, EnvironmentError, ValueError):
+			pass
+
+
+def _initWorker(font):
+	"""Set up a worker process forked by TTFont._forkPool, keeping the
+	font whose tables it compiles or parses."""
+	_reopenFile(font)
+	global _workerFont
+	_workerFont = font
+
+
+def _compileTable(tag):
+	"""Compile a table in a worker process. Return its data, and the table
+	pickled if compiling it changed the lookups of GSUB or GPOS to fix
+	offset overflows, or None."""
+	font = _workerFont
+	table = font[tag]
+	lookups = _lookupShapes(table)
+	data = font.getTableData(tag)
+	if lookups is not None and _lookupShapes(table) != lookups:
+		return data, _pickleTable(font, table)
+	return data, None
+
+
+def _lookupShapes(table):
+	"""Return the type and number of subtables of each lookup of an OTL
+	table, which fixing offset overflows changes, or None."""
+	lookupList = getattr(getattr(table, "table", None), "LookupList", None)
+	if lookupList is None:
+		return None
+	return [(lookup.LookupType, len(lookup.SubTable))
+			for lookup in lookupList.Lookup]
+
+
+def _parseTable(tag):
+	"""Parse a pending table in a worker process, and pickle it."""
+	font = _workerFont
+	return _pickleTable(font, font[tag])
+
+
+def _pickleTable(font, table):
+	"""Pickle a table of a font in a worker process. The font and its other
+	tables, which the table may refer to, are pickled as references to
+	those of the parent process."""
+	references = {id(font): ("font",)}
+	for otherTag, other in font.tables.items():
+		if other is not table:
+			references[id(other)] = ("table", otherTag)
+	file = BytesIO()
+	pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+	pickler.persistent_id = lambda obj: references.get(id(obj))
+	pickler.dump(table)
+	return file.getvalue()
+
+
+def _unpickleTable(font, data):
+	def load(reference):
+		if reference[0] == "font":
+			return font
+		return font[reference[1]]
+	unpickler = pickle.Unpickler(BytesIO(data))
+	unpickler.persistent_load = load
+	return unpickler.load()
+
 
 class _TTGlyphSet(object):
 
@@ -760,7 +1148,16 @@ class _TTGlyph(object):
 		self._glyph.draw(pen)
 
 class _TTGlyphCFF(_TTGlyph):
-	pass
+
+	def draw(self, pen):
+		"""Draw the glyph onto Pen. See fontTools.pens.basePen for details
+		how that works.
+		"""
+		drawCache = self._glyphset._glyphs.drawCache
+		if drawCache is not None:
+			drawCache.draw(self._glyph, pen)
+		else:
+			self._glyph.draw(pen)
 
 class _TTGlyphGlyf(_TTGlyph):
 
@@ -774,6 +1171,93 @@ class _TTGlyphGlyf(_TTGlyph):
 		glyph.draw(pen, glyfTable, offset)
 
 
+class _TTVarGlyphSet(_TTGlyphSet):
+
+	"""GlyphSet of a variable TrueType font at a given location; see
+	TTFont.getGlyphSet(). The 'location' attribute holds the normalized
+	location.
+	"""
+
+	def __init__(self, ttFont, location, normalized=False):
+		_TTGlyphSet.__init__(self, ttFont, ttFont["glyf"], _TTVarGlyphGlyf)
+		from fontTools.varLib.mutator import normalizeVariableFontLocation
+		if normalized:
+			axisTags = [axis.axisTag for axis in ttFont["fvar"].axes]
+			location = {tag: location.get(tag, 0.) for tag in axisTags}
+		else:
+			location = normalizeVariableFontLocation(ttFont, location)
+		self.location = location
+		self._ttFont = ttFont
+		self._gvarInstancer, self._hvarInstancer = ttFont._getVarInstancers()
+
+	def _getAdvanceDelta(self, glyphName):
+		glyphID = self._ttFont.getGlyphID(glyphName)
+		advWidthMap = self._ttFont["HVAR"].table.AdvWidthMap
+		if advWidthMap is None:
+			varIdx = glyphID
+		else:
+			mapping = advWidthMap.mapping
+			varIdx = mapping[min(glyphID, len(mapping) - 1)]
+		return self._hvarInstancer.getDelta(varIdx, self.location)
+
+	def __getitem__(self, glyphName):
+		glyph = self._glyphs[glyphName]
+		horizontalMetrics = self._hmtx[glyphName]
+		verticalMetrics = self._vmtx[glyphName] if self._vmtx else None
+		coordinates = None
+		if self._gvarInstancer is not None:
+			coordinates = self._gvarInstancer.getGlyphCoordinates(
+				glyphName, self.location)
+		width, lsb = horizontalMetrics
+		if self._hvarInstancer is not None:
+			width += self._getAdvanceDelta(glyphName)
+		elif coordinates is not None:
+			width = coordinates[-3][0] - coordinates[-4][0]
+		return _TTVarGlyphGlyf(
+			self, glyph, (width, lsb), verticalMetrics, coordinates)
+
+
+class _TTVarGlyphGlyf(_TTGlyphGlyf):
+
+	"""A glyph of a _TTVarGlyphSet. The outline and 'width' are those at the
+	glyph set's location, and may have fractional coordinates; 'lsb' is
+	computed from the outline when first accessed.
+	"""
+
+	def __init__(self, glyphset, glyph, horizontalMetrics, verticalMetrics=None,
+			coordinates=None):
+		_TTGlyphGlyf.__init__(
+			self, glyphset, glyph, horizontalMetrics, verticalMetrics)
+		self._coordinates = coordinates
+		if coordinates is not None:
+			del self.lsb
+
+	def __getattr__(self, attr):
+		if attr != "lsb":
+			raise AttributeError(attr)
+		from fontTools.pens.boundsPen import ControlBoundsPen
+		pen = ControlBoundsPen(self._glyphset)
+		self.draw(pen)
+		lsb = pen.bounds[0] if pen.bounds else 0
+		if self._glyph.isComposite():
+			lsb -= self._coordinates[-4][0]
+		self.lsb = lsb
+		return lsb
+
+	def draw(self, pen):
+		"""Draw the glyph onto Pen. See fontTools.pens.basePen for details
+		how that works.
+		"""
+		coordinates = self._coordinates
+		if coordinates is None:
+			_TTGlyphGlyf.draw(self, pen)
+			return
+		glyfTable = self._glyphset._glyphs
+		# The origin is at the left phantom point
+		offset = -coordinates[-4][0]
+		self._glyph.draw(pen, glyfTable, offset, coordinates)
+
+
 class GlyphOrder(object):
 
 	"""A pseudo table. The glyph order isn't in the font as a separate
@@ -19,6 +19,7 @@ from fontTools.ttLib import getSearchRange
 import struct
 from collections import OrderedDict
 import logging
+import mmap
 
 
 log = logging.getLogger(__name__)
@@ -26,6 +27,9 @@ log = logging.getLogger(__name__)
 
 class SFNTReader(object):
 
+	# mmap of the input file, see mapFile()
+	mappedFile = None
+
 	def __new__(cls, *args, **kwargs):
 		""" Return an instance of the SFNTReader sub-class which is compatible
 		with the input file type.
@@ -108,14 +112,35 @@ class SFNTReader(object):
 	def keys(self):
 		return self.tables.keys()
 
+	def mapFile(self):
+		"""Map the input file in memory, after which the raw table data is
+		returned as memoryview slices of the mapping rather than read into
+		new bytes objects; only the pages that are actually used get read
+		from disk. On Python 2, where mmap objects can't be viewed, slices
+		of the mapping are copied instead.
+
+		Return False, and keep reading the file, if it can't be mapped (e.g.
+		when it is not a file on disk).
+		"""
+		try:
+			self.mappedFile = mmap.mmap(
+				self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		except (AttributeError, EnvironmentError, ValueError) as e:
+			log.debug("can't map font file in memory: %s", e)
+			return False
+		return True
+
 	def __getitem__(self, tag):
 		"""Fetch the raw table data."""
 		entry = self.tables[Tag(tag)]
-		data = entry.loadData (self.file)
+		if self.mappedFile is not None:
+			data = entry.loadData(self.mappedFile)
+		else:
+			data = entry.loadData(self.file)
 		if self.checkChecksums:
 			if tag == 'head':
 				# Beh: we have to special-case the 'head' table.
-				checksum = calcChecksum(data[:8] + b'\0\0\0\0' + data[12:])
+				checksum = calcChecksum(bytes(data[:8]) + b'\0\0\0\0' + bytes(data[12:]))
 			else:
 				checksum = calcChecksum(data)
 			if self.checkChecksums > 1:
@@ -130,6 +155,13 @@ class SFNTReader(object):
 		del self.tables[Tag(tag)]
 
 	def close(self):
+		if self.mappedFile is not None:
+			try:
+				self.mappedFile.close()
+			except BufferError:
+				# Tables still hold views on the mapping, which gets
+				# closed when the last of them is gone.
+				pass
 		self.file.close()
 
 
@@ -234,7 +266,7 @@ class SFNTWriter(object):
 		entry.tag = tag
 		entry.offset = self.nextTableOffset
 		if tag == 'head':
-			entry.checkSum = calcChecksum(data[:8] + b'\0\0\0\0' + data[12:])
+			entry.checkSum = calcChecksum(bytes(data[:8]) + b'\0\0\0\0' + bytes(data[12:]))
 			self.headTable = data
 			entry.uncompressed = True
 		else:
@@ -361,6 +393,177 @@ class SFNTWriter(object):
 		return False
 
 
+class SFNTStreamWriter(object):
+	"""Write a plain (not WOFF-compressed) sfnt font without assembling
+	it in memory first.
+
+	If 'tableOrder' is given, it is the final order of the tables in the
+	file, and the tables may be added in any order: each one is written
+	out as soon as all tables preceding it have been added, and only
+	tables added ahead of their turn are held in memory. Otherwise the
+	tables are written in the order they are added.
+
+	Seekable files get the directory and the 'head' checkSumAdjustment
+	filled in when the writer is closed. For unseekable streams, which
+	have to start with the directory, the table data is collected until
+	close() instead; tables copied from a reader are only read when they
+	are written.
+	"""
+
+	# size of the blocks in which tables are copied from the input file
+	copyBlockSize = 0x10000
+
+	def __init__(self, file, numTables, sfntVersion="\000\001\000\000",
+			tableOrder=None):
+		self.file = file
+		self.numTables = numTables
+		self.sfntVersion = Tag(sfntVersion)
+		self.tableOrder = tableOrder
+		self.searchRange, self.entrySelector, self.rangeShift = getSearchRange(numTables, 16)
+		self.tables = OrderedDict()
+		self.pending = {}
+		self.added = []
+		self.nextTableOffset = sfntDirectorySize + numTables * sfntDirectoryEntrySize
+		try:
+			self.seekable = file.seekable()
+		except AttributeError:
+			try:
+				file.tell()
+			except (AttributeError, IOError, OSError):
+				self.seekable = False
+			else:
+				self.seekable = True
+		if self.seekable:
+			self.start = file.tell()
+			# clear out directory area
+			file.write(b'\0' * self.nextTableOffset)
+
+	def __setitem__(self, tag, data):
+		"""Add raw table data."""
+		self._add(tag, data)
+
+	def copyTable(self, tag, reader):
+		"""Add a table whose data is copied from the plain sfnt 'reader'
+		when the table is written, in blocks of copyBlockSize bytes.
+		"""
+		tag = Tag(tag)
+		if (tag == 'head' or reader.flavor is not None or
+				reader.checkChecksums):
+			# head gets patched, and compressed or checked tables have
+			# to go through the reader
+			self._add(tag, reader[tag])
+		else:
+			self._add(tag, (reader, reader.tables[tag]))
+
+	def _add(self, tag, data):
+		if tag in self.tables or tag in self.pending:
+			from fontTools import ttLib
+			raise ttLib.TTLibError("cannot rewrite '%s' table" % tag)
+		self.pending[tag] = data
+		self.added.append(tag)
+		if self.seekable:
+			self._flush()
+
+	def _flush(self):
+		order = self.added if self.tableOrder is None else self.tableOrder
+		i = len(self.tables)
+		while i < len(order) and order[i] in self.pending:
+			tag = order[i]
+			self._writeTable(tag, self.pending.pop(tag))
+			i += 1
+
+	def _blocks(self, data):
+		if not isinstance(data, tuple):
+			yield data
+			return
+		reader, readerEntry = data
+		offset, end = readerEntry.offset, readerEntry.offset + readerEntry.length
+		while offset < end:
+			size = min(self.copyBlockSize, end - offset)
+			if reader.mappedFile is not None:
+				try:
+					block = memoryview(reader.mappedFile)[offset:offset + size]
+				except TypeError:
+					block = reader.mappedFile[offset:offset + size]
+			else:
+				reader.file.seek(offset)
+				block = reader.file.read(size)
+			if len(block) != size:
+				from fontTools import ttLib
+				raise ttLib.TTLibError(
+					"not enough data for '%s' table" % readerEntry.tag)
+			yield block
+			offset += size
+
+	def _writeTable(self, tag, data, write=True):
+		"""Add the directory entry for the table, computing the checksum
+		block by block, and write the padded data unless 'write' is false.
+		"""
+		entry = SFNTDirectoryEntry()
+		entry.tag = tag
+		entry.offset = self.nextTableOffset
+		entry.length = 0
+		if tag == 'head':
+			entry.checkSum = calcChecksum(bytes(data[:8]) + b'\0\0\0\0' + bytes(data[12:]))
+		else:
+			entry.checkSum = 0
+		for block in self._blocks(data):
+			if tag != 'head':
+				# all blocks but the last are multiples of four bytes long
+				entry.checkSum = (entry.checkSum + calcChecksum(block)) & 0xffffffff
+			if write:
+				self.file.write(block)
+			entry.length += len(block)
+		# Add NUL bytes to pad the table data to a 4-byte boundary.
+		padding = -entry.length & 3
+		if write:
+			self.file.write(b'\0' * padding)
+		self.nextTableOffset += entry.length + padding
+		self.tables[tag] = entry
+
+	def close(self):
+		"""All tables must have been added. Now write the directory, and
+		for unseekable streams, the table data.
+		"""
+		numTables = len(self.tables) + len(self.pending)
+		if numTables != self.numTables:
+			from fontTools import ttLib
+			raise ttLib.TTLibError("wrong number of tables; expected %d, found %d" % (self.numTables, numTables))
+		order = self.added if self.tableOrder is None else self.tableOrder
+		if not self.seekable:
+			for tag in order:
+				self._writeTable(tag, self.pending[tag], write=False)
+		assert not self.seekable or not self.pending
+
+		directory = sstruct.pack(sfntDirectoryFormat, self)
+		for tag, entry in sorted(self.tables.items()):
+			directory = directory + entry.toString()
+		checksumAdjustment = None
+		if 'head' in self.tables:
+			checksums = [entry.checkSum for entry in self.tables.values()]
+			checksums.append(calcChecksum(directory))
+			# BiboAfba!
+			checksumAdjustment = (0xB1B0AFBA - sum(checksums)) & 0xffffffff
+
+		if self.seekable:
+			end = self.file.tell()
+			self.file.seek(self.start)
+			self.file.write(directory)
+			if checksumAdjustment is not None:
+				self.file.seek(self.start + self.tables['head'].offset + 8)
+				self.file.write(struct.pack(">L", checksumAdjustment))
+			self.file.seek(end)
+		else:
+			self.file.write(directory)
+			for tag in order:
+				data = self.pending.pop(tag)
+				if tag == 'head':
+					data = bytes(data[:8]) + struct.pack(">L", checksumAdjustment) + bytes(data[12:])
+				for block in self._blocks(data):
+					self.file.write(block)
+				self.file.write(b'\0' * (-self.tables[tag].length & 3))
+
+
 # -- sfnt directory helpers and cruft
 
 ttcHeaderFormat = """
@@ -449,8 +652,16 @@ class DirectoryEntry(object):
 			return "<%s at %x>" % (self.__class__.__name__, id(self))
 
 	def loadData(self, file):
-		file.seek(self.offset)
-		data = file.read(self.length)
+		if isinstance(file, mmap.mmap):
+			end = self.offset + self.length
+			try:
+				data = memoryview(file)[self.offset:end]
+			except TypeError:
+				# Python 2 mmap objects don't support memoryview
+				data = file[self.offset:end]
+		else:
+			file.seek(self.offset)
+			data = file.read(self.length)
 		assert len(data) == self.length
 		if hasattr(self.__class__, 'decodeData'):
 			data = self.decodeData(data)
@@ -555,13 +766,13 @@ def calcChecksum(data):
 		3655064932
 	"""
 	remainder = len(data) % 4
-	if remainder:
-		data += b"\0" * (4 - remainder)
 	value = 0
 	blockSize = 4096
 	assert blockSize % 4 == 0
 	for i in range(0, len(data), blockSize):
 		block = data[i:i+blockSize]
+		if remainder and i + blockSize >= len(data):
+			block = bytes(block) + b"\0" * (4 - remainder)
 		longs = struct.unpack(">%dL" % (len(block) // 4), block)
 		value = (value + sum(longs)) & 0xffffffff
 	return value
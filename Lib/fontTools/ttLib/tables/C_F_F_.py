@@ -6,6 +6,9 @@ from . import DefaultTable
 
 class table_C_F_F_(DefaultTable.DefaultTable):
 
+	# Set to True to subroutinize the charstrings when compiling.
+	subroutinize = False
+
 	def __init__(self, tag=None):
 		DefaultTable.DefaultTable.__init__(self, tag)
 		self.cff = cffLib.CFFFontSet()
@@ -17,7 +20,8 @@ class table_C_F_F_(DefaultTable.DefaultTable):
 
 	def compile(self, otFont):
 		f = BytesIO()
-		self.cff.compile(f, otFont, isCFF2=False)
+		self.cff.compile(f, otFont, isCFF2=False,
+			subroutinize=self.subroutinize)
 		return f.getvalue()
 
 	def haveGlyphNames(self):
@@ -12,5 +12,6 @@ class table_C_F_F__2(table_C_F_F_):
 
     def compile(self, otFont):
         f = BytesIO()
-        self.cff.compile(f, otFont, isCFF2=True)
+        self.cff.compile(f, otFont, isCFF2=True,
+                         subroutinize=self.subroutinize)
         return f.getvalue()
@@ -6,6 +6,11 @@ class DefaultTable(object):
 
 	dependencies = []
 
+	# Whether decompile() can take a memoryview of the table data, as read
+	# from a font file mapped in memory (see the 'mmap' argument of TTFont).
+	# Other tables get a copy of the data as a bytes object.
+	acceptsMemoryView = False
+
 	def __init__(self, tag=None):
 		if tag is None:
 			tag = getClassTag(self.__class__)
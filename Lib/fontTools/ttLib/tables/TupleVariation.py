@@ -5,6 +5,7 @@ from fontTools.misc.textTools import safeEval
 import array
 import io
 import logging
+import re
 import struct
 import sys
 
@@ -146,11 +147,10 @@ class TupleVariation(object):
 		return (tupleData, auxData)
 
 	def compileCoord(self, axisTags):
-		result = []
-		for axis in axisTags:
-			_minValue, value, _maxValue = self.axes.get(axis, (0.0, 0.0, 0.0))
-			result.append(struct.pack(">h", floatToFixed(value, 14)))
-		return bytesjoin(result)
+		axes = self.axes
+		return struct.pack(">%dh" % len(axisTags), *[
+			floatToFixed(axes[axis][1], 14) if axis in axes else 0
+			for axis in axisTags])
 
 	def compileIntermediateCoord(self, axisTags):
 		needed = False
@@ -287,20 +287,64 @@ class TupleVariation(object):
 			            (",".join(sorted(badPoints)), tableTag))
 		return (result, pos)
 
-	def compileDeltas(self, points):
+	@staticmethod
+	def getPointsSize_(points, numPointsInGlyph):
+		"""Return the length of compilePoints(points, numPointsInGlyph)."""
+		if len(points) == numPointsInGlyph:
+			return 1
+		points = sorted(points)
+		numPoints = len(points)
+		size = 1 if numPoints < 0x80 else 2
+		MAX_RUN_LENGTH = 127
+		pos = 0
+		lastValue = 0
+		while pos < numPoints:
+			runLength = 0
+			useByteEncoding = None
+			while pos < numPoints and runLength <= MAX_RUN_LENGTH:
+				curValue = points[pos]
+				delta = curValue - lastValue
+				if useByteEncoding is None:
+					useByteEncoding = 0 <= delta <= 0xff
+				if useByteEncoding and (delta > 0xff or delta < 0):
+					break
+				lastValue = curValue
+				pos += 1
+				runLength += 1
+			size += 1 + (runLength if useByteEncoding else 2 * runLength)
+		return size
+
+	def getDeltas_(self, points):
+		deltas = [self.coordinates[p] for p in sorted(points)]
+		deltas = [c for c in deltas if c is not None]
+		if all(type(c) is tuple and len(c) == 2 for c in deltas):
+			return [c[0] for c in deltas], [c[1] for c in deltas]
 		deltaX = []
 		deltaY = []
-		for p in sorted(list(points)):
-			c = self.coordinates[p]
+		for c in deltas:
 			if type(c) is tuple and len(c) == 2:
 				deltaX.append(c[0])
 				deltaY.append(c[1])
 			elif type(c) is int:
 				deltaX.append(c)
-			elif c is not None:
+			else:
 				raise ValueError("invalid type of delta: %s" % type(c))
+		return deltaX, deltaY
+
+	def compileDeltas(self, points):
+		deltaX, deltaY = self.getDeltas_(points)
 		return self.compileDeltaValues_(deltaX) + self.compileDeltaValues_(deltaY)
 
+	def getDataSize(self):
+		"""Return the length of the point numbers and deltas that compile()
+		emits for this variation when it has private point numbers,
+		without compiling them."""
+		points = self.getUsedPoints()
+		deltaX, deltaY = self.getDeltas_(points)
+		return (self.getPointsSize_(points, len(self.coordinates)) +
+		        self.getDeltaValuesSize_(deltaX) +
+		        self.getDeltaValuesSize_(deltaY))
+
 	@staticmethod
 	def compileDeltaValues_(deltas):
 		"""[value1, value2, value3, ...] --> bytestring
@@ -318,90 +362,77 @@ class TupleVariation(object):
 		bytes; if (header & 0x40) is set, the delta values are
 		signed 16-bit integers.
 		"""  # Explaining the format because the 'gvar' spec is hard to understand.
-		stream = io.BytesIO()
-		pos = 0
-		while pos < len(deltas):
-			value = deltas[pos]
-			if value == 0:
-				pos = TupleVariation.encodeDeltaRunAsZeroes_(deltas, pos, stream)
-			elif value >= -128 and value <= 127:
-				pos = TupleVariation.encodeDeltaRunAsBytes_(deltas, pos, stream)
+		values, runs = TupleVariation.getDeltaRuns_(deltas)
+		result = bytearray()
+		for kind, start, end in runs:
+			if kind == "z":
+				result.append(DELTAS_ARE_ZERO | (end - start - 1))
+			elif kind == "b":
+				result.append(end - start - 1)
+				result.extend(array.array("b", values[start:end]).tostring())
 			else:
-				pos = TupleVariation.encodeDeltaRunAsWords_(deltas, pos, stream)
-		return stream.getvalue()
+				result.append(DELTAS_ARE_WORDS | (end - start - 1))
+				run = values[start:end]
+				if sys.byteorder != "big":
+					run.byteswap()
+				result.extend(run.tostring())
+		return bytes(result)
 
 	@staticmethod
-	def encodeDeltaRunAsZeroes_(deltas, offset, stream):
-		runLength = 0
-		pos = offset
-		numDeltas = len(deltas)
-		while pos < numDeltas and runLength < 64 and deltas[pos] == 0:
-			pos += 1
-			runLength += 1
-		assert runLength >= 1 and runLength <= 64
-		stream.write(bytechr(DELTAS_ARE_ZERO | (runLength - 1)))
-		return pos
+	def getDeltaValuesSize_(deltas):
+		"""Return the length of compileDeltaValues_(deltas)."""
+		_, runs = TupleVariation.getDeltaRuns_(deltas)
+		size = len(runs)
+		for kind, start, end in runs:
+			if kind == "b":
+				size += end - start
+			elif kind == "w":
+				size += 2 * (end - start)
+		return size
 
-	@staticmethod
-	def encodeDeltaRunAsBytes_(deltas, offset, stream):
-		runLength = 0
-		pos = offset
-		numDeltas = len(deltas)
-		while pos < numDeltas and runLength < 64:
-			value = deltas[pos]
-			if value < -128 or value > 127:
-				break
-			# Within a byte-encoded run of deltas, a single zero
-			# is best stored literally as 0x00 value. However,
-			# if are two or more zeroes in a sequence, it is
-			# better to start a new run. For example, the sequence
-			# of deltas [15, 15, 0, 15, 15] becomes 6 bytes
-			# (04 0F 0F 00 0F 0F) when storing the zero value
-			# literally, but 7 bytes (01 0F 0F 80 01 0F 0F)
-			# when starting a new run.
-			if value == 0 and pos+1 < numDeltas and deltas[pos+1] == 0:
-				break
-			pos += 1
-			runLength += 1
-		assert runLength >= 1 and runLength <= 64
-		stream.write(bytechr(runLength - 1))
-		for i in range(offset, pos):
-			stream.write(struct.pack('b', round(deltas[i])))
-		return pos
+	# Each delta value is classified as zero ("z"), byte-encodable ("b")
+	# or word-encodable ("w"); runs are then matched over the string of
+	# classes, at most 64 values each.
+	#
+	# Within a byte-encoded run of deltas, a single zero is best stored
+	# literally as 0x00 value. However, if are two or more zeroes in a
+	# sequence, it is better to start a new run. For example, the
+	# sequence of deltas [15, 15, 0, 15, 15] becomes 6 bytes
+	# (04 0F 0F 00 0F 0F) when storing the zero value literally, but 7
+	# bytes (01 0F 0F 80 01 0F 0F) when starting a new run.
+	#
+	# Within a word-encoded run of deltas, it is easiest to start a new
+	# run (with a different encoding) whenever we encounter a zero value.
+	# For example, the sequence [0x6666, 0, 0x7777] needs 7 bytes when
+	# storing the zero literally (42 66 66 00 00 77 77), and equally 7
+	# bytes when starting a new run (40 66 66 80 40 77 77). However, a
+	# single value in the range (-128..127) should be encoded literally
+	# because it is more compact. For example, the sequence
+	# [0x6666, 2, 0x7777] becomes 7 bytes when storing the value
+	# literally (42 66 66 00 02 77 77), but 8 bytes when starting a new
+	# run (40 66 66 00 02 40 77 77).
+	_deltaRunRE = re.compile(r"z{1,64}|b(?:b|z(?!z)){0,63}|w(?:w|b(?![bz])){0,63}")
 
 	@staticmethod
-	def encodeDeltaRunAsWords_(deltas, offset, stream):
-		runLength = 0
-		pos = offset
-		numDeltas = len(deltas)
-		while pos < numDeltas and runLength < 64:
-			value = deltas[pos]
-			# Within a word-encoded run of deltas, it is easiest
-			# to start a new run (with a different encoding)
-			# whenever we encounter a zero value. For example,
-			# the sequence [0x6666, 0, 0x7777] needs 7 bytes when
-			# storing the zero literally (42 66 66 00 00 77 77),
-			# and equally 7 bytes when starting a new run
-			# (40 66 66 80 40 77 77).
-			if value == 0:
-				break
-
-			# Within a word-encoded run of deltas, a single value
-			# in the range (-128..127) should be encoded literally
-			# because it is more compact. For example, the sequence
-			# [0x6666, 2, 0x7777] becomes 7 bytes when storing
-			# the value literally (42 66 66 00 02 77 77), but 8 bytes
-			# when starting a new run (40 66 66 00 02 40 77 77).
-			isByteEncodable = lambda value: value >= -128 and value <= 127
-			if isByteEncodable(value) and pos+1 < numDeltas and isByteEncodable(deltas[pos+1]):
-				break
-			pos += 1
-			runLength += 1
-		assert runLength >= 1 and runLength <= 64
-		stream.write(bytechr(DELTAS_ARE_WORDS | (runLength - 1)))
-		for i in range(offset, pos):
-			stream.write(struct.pack('>h', round(deltas[i])))
-		return pos
+	def getDeltaRuns_(deltas):
+		"""Return the deltas rounded to integers, as an array of signed
+		shorts, and the list of (kind, start, end) runs to encode them
+		in; kind is "z" for zeroes, "b" for bytes and "w" for words."""
+		try:
+			values = array.array("h", deltas)
+		except TypeError:
+			values = array.array("h", [round(v) for v in deltas])
+		kinds = "".join(["z" if v == 0 else "b" if -128 <= v <= 127 else "w"
+		                 for v in values])
+		runs = []
+		match = TupleVariation._deltaRunRE.match
+		pos = 0
+		numDeltas = len(kinds)
+		while pos < numDeltas:
+			end = match(kinds, pos).end()
+			runs.append((kinds[pos], pos, end))
+			pos = end
+		return values, runs
 
 	@staticmethod
 	def decompileDeltas_(numDeltas, data, offset):
@@ -449,8 +480,18 @@ def decompileSharedTuples(axisTags, sharedTupleCount, data, offset):
 
 
 def compileSharedTuples(axisTags, variations):
+	"""Return the peak tuples worth sharing, most used first.
+
+	Referring to a shared tuple saves the 2 bytes per axis of an embedded
+	peak tuple, and sharing it costs those bytes once; so only tuples used
+	by more than one variation (ignoring those without impact, which
+	compileTupleVariationStore drops) save space. At most 4096 tuples can
+	be shared; the ones that save the most are kept.
+	"""
 	coordCount = {}
 	for var in variations:
+		if not var.hasImpact():
+			continue
 		coord = var.compileCoord(axisTags)
 		coordCount[coord] = coordCount.get(coord, 0) + 1
 	sharedCoords = [(count, coord)
@@ -462,7 +503,8 @@ def compileSharedTuples(axisTags, variations):
 
 
 def compileTupleVariationStore(variations, pointCount,
-                               axisTags, sharedTupleIndices):
+                               axisTags, sharedTupleIndices,
+                               useSharedPoints=True):
 	variations = [v for v in variations if v.hasImpact()]
 	if len(variations) == 0:
 		return (0, b"", b"")
@@ -470,66 +512,44 @@ def compileTupleVariationStore(variations, pointCount,
 	# Each glyph variation tuples modifies a set of control points. To
 	# indicate which exact points are getting modified, a single tuple
 	# can either refer to a shared set of points, or the tuple can
-	# supply its private point numbers.  Because the impact of sharing
-	# can be positive (no need for a private point list) or negative
-	# (need to supply 0,0 deltas for unused points), it is not obvious
-	# how to determine which tuples should take their points from the
-	# shared pool versus have their own. Perhaps we should resort to
-	# brute force, and try all combinations? However, if a glyph has n
-	# variation tuples, we would need to try 2^n combinations (because
-	# each tuple may or may not be part of the shared set). How many
-	# variations tuples do glyphs have?
-	#
-	#   Skia.ttf: {3: 1, 5: 11, 6: 41, 7: 62, 8: 387, 13: 1, 14: 3}
-	#   JamRegular.ttf: {3: 13, 4: 122, 5: 1, 7: 4, 8: 1, 9: 1, 10: 1}
-	#   BuffaloGalRegular.ttf: {1: 16, 2: 13, 4: 2, 5: 4, 6: 19, 7: 1, 8: 3, 9: 8}
-	#   (Reading example: In Skia.ttf, 41 glyphs have 6 variation tuples).
+	# supply its private point numbers. A tuple can only use the shared
+	# set if it is the same as its own: in 'gvar', points that a tuple
+	# doesn't list are inferred (IUP), so they can't be padded with
+	# zero deltas. Sharing the point set used by n tuples thus saves
+	# n - 1 times its encoded size; we share the set that saves the most.
 	#
+	# Apple macOS 10.9.5 (maybe also earlier) up to 10.12 had a bug that
+	# broke variations if the 'gvar' table contains shared points;
+	# pass useSharedPoints=False to produce fonts for those systems.
+	# https://rawgit.com/unicode-org/text-rendering-tests/master/reports/CoreText.html#GVAR-1
+	pointSets = [frozenset(v.getUsedPoints()) for v in variations]
+	sharedPoints = None
+	if useSharedPoints:
+		pointSetCount = {}
+		for points in pointSets:
+			pointSetCount[points] = pointSetCount.get(points, 0) + 1
+		bestSavings = 0
+		for points in pointSets:  # in order, for deterministic ties
+			count = pointSetCount[points]
+			if count < 2:
+				continue
+			savings = (count - 1) * TupleVariation.getPointsSize_(points, pointCount)
+			if savings > bestSavings:
+				sharedPoints, bestSavings = points, savings
 
-	# Is this even worth optimizing? If we never use a shared point
-	# list, the private lists will consume 112K for Skia, 5K for
-	# BuffaloGalRegular, and 15K for JamRegular. If we always use a
-	# shared point list, the shared lists will consume 16K for Skia,
-	# 3K for BuffaloGalRegular, and 10K for JamRegular. However, in
-	# the latter case the delta arrays will become larger, but I
-	# haven't yet measured by how much. From gut feeling (which may be
-	# wrong), the optimum is to share some but not all points;
-	# however, then we would need to try all combinations.
-	#
-	# For the time being, we try two variants and then pick the better one:
-	# (a) each tuple supplies its own private set of points;
-	# (b) all tuples refer to a shared set of points, which consists of
-	#     "every control point in the glyph".
-	allPoints = set(range(pointCount))
 	tuples = []
 	data = []
-	someTuplesSharePoints = False
-	for v in variations:
-		privateTuple, privateData = v.compile(
-			axisTags, sharedTupleIndices, sharedPoints=None)
-		sharedTuple, sharedData = v.compile(
-			axisTags, sharedTupleIndices, sharedPoints=allPoints)
-		# TODO: Apple macOS 10.9.5 (maybe also earlier) up to 10.12 had a bug
-		# that broke variations if the `gvar` table contains shared tuples.
-		# Apple will likely fix this in macOS 10.13. But for the time being,
-		# we never emit shared points although the result would be more compact.
-		# https://rawgit.com/unicode-org/text-rendering-tests/master/reports/CoreText.html#GVAR-1
-		#if (len(sharedTuple) + len(sharedData)) < (len(privateTuple) + len(privateData)):
-		if False:
-			tuples.append(sharedTuple)
-			data.append(sharedData)
-			someTuplesSharePoints = True
-		else:
-			tuples.append(privateTuple)
-			data.append(privateData)
-	if someTuplesSharePoints:
-		data = bytechr(0) + bytesjoin(data)  # 0x00 = "all points in glyph"
-		tupleVariationCount = tv.TUPLES_SHARE_POINT_NUMBERS | len(tuples)
-	else:
-		data = bytesjoin(data)
-		tupleVariationCount = len(tuples)
-	tuples = bytesjoin(tuples)
-	return tupleVariationCount, tuples, data
+	for v, points in zip(variations, pointSets):
+		thisTuple, thisData = v.compile(
+			axisTags, sharedTupleIndices,
+			sharedPoints=points if points == sharedPoints else None)
+		tuples.append(thisTuple)
+		data.append(thisData)
+	tupleVariationCount = len(tuples)
+	if sharedPoints is not None:
+		data.insert(0, TupleVariation.compilePoints(sharedPoints, pointCount))
+		tupleVariationCount |= TUPLES_SHARE_POINT_NUMBERS
+	return tupleVariationCount, bytesjoin(tuples), bytesjoin(data)
 
 
 def decompileTupleVariationStore(tableTag, axisTags,
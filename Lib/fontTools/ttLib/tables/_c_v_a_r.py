@@ -25,6 +25,9 @@ CVAR_HEADER_SIZE = sstruct.calcsize(CVAR_HEADER_FORMAT)
 class table__c_v_a_r(DefaultTable.DefaultTable):
     dependencies = ["cvt ", "fvar"]
 
+    # See table__g_v_a_r.useSharedPoints.
+    useSharedPoints = True
+
     def __init__(self, tag=None):
         DefaultTable.DefaultTable.__init__(self, tag)
         self.majorVersion, self.minorVersion = 1, 0
@@ -35,7 +38,8 @@ class table__c_v_a_r(DefaultTable.DefaultTable):
             variations=[v for v in self.variations if v.hasImpact()],
             pointCount=len(ttFont["cvt "].values),
             axisTags=[axis.axisTag for axis in ttFont["fvar"].axes],
-            sharedTupleIndices={})
+            sharedTupleIndices={},
+            useSharedPoints=self.useSharedPoints)
         header = {
             "majorVersion": self.majorVersion,
             "minorVersion": self.minorVersion,
@@ -16,6 +16,11 @@ import sys
 import struct
 import array
 import logging
+import weakref
+try:
+	import numpy as np
+except ImportError:
+	np = None
 
 
 log = logging.getLogger(__name__)
@@ -41,12 +46,17 @@ class table__g_l_y_f(DefaultTable.DefaultTable):
 	# no padding, except for when padding would allow to use short loca offsets.
 	padding = 1
 
+	# Glyph data is kept as slices of the table data until the glyph is expanded.
+	acceptsMemoryView = True
+
 	def decompile(self, data, ttFont):
 		loca = ttFont['loca']
 		last = int(loca[0])
 		noname = 0
+		self.flattenCache.clear()
 		self.glyphs = {}
 		self.glyphOrder = glyphOrder = ttFont.getGlyphOrder()
+		columns = GlyphColumns() if ttFont.columnarGlyf else None
 		for i in range(0, len(loca)-1):
 			try:
 				glyphName = glyphOrder[i]
@@ -57,7 +67,11 @@ class table__g_l_y_f(DefaultTable.DefaultTable):
 			glyphdata = data[last:next]
 			if len(glyphdata) != (next - last):
 				raise ttLib.TTLibError("not enough 'glyf' table data")
-			glyph = Glyph(glyphdata)
+			if columns is not None and len(glyphdata) > 10 and \
+					struct.unpack(">h", glyphdata[:2])[0] > 0:
+				glyph = columns.addGlyph(glyphdata)
+			else:
+				glyph = Glyph(glyphdata)
 			self.glyphs[glyphName] = glyph
 			last = next
 		if len(data) - next >= 4:
@@ -191,15 +205,39 @@ class table__g_l_y_f(DefaultTable.DefaultTable):
 		self.glyphs[glyphName] = glyph
 		if glyphName not in self.glyphOrder:
 			self.glyphOrder.append(glyphName)
+		self.flattenCache.clear()
 
 	def __delitem__(self, glyphName):
 		del self.glyphs[glyphName]
 		self.glyphOrder.remove(glyphName)
+		self.flattenCache.clear()
 
 	def __len__(self):
 		assert len(self.glyphOrder) == len(self.glyphs)
 		return len(self.glyphs)
 
+	@property
+	def flattenCache(self):
+		"""The FlattenCache of the composite glyphs of this table."""
+		key = id(self)
+		entry = _flattenCaches.get(key)
+		if entry is None or entry[0]() is not self:
+			ref = weakref.ref(self, lambda ref: _dropFlattenCache(key, ref))
+			entry = _flattenCaches[key] = (ref, FlattenCache())
+		return entry[1]
+
+
+# The FlattenCache of each glyf table, by id() of the table, along with a weak
+# reference to it.  It is kept out of the tables' __dict__, so that comparing,
+# copying, pickling or merging tables doesn't see it.
+_flattenCaches = {}
+
+
+def _dropFlattenCache(key, ref):
+	entry = _flattenCaches.get(key)
+	if entry is not None and entry[0] is ref:
+		del _flattenCaches[key]
+
 
 glyphHeaderFormat = """
 		>	# big endian
@@ -310,6 +348,14 @@ class Glyph(object):
 			return
 		self.data = data
 
+	def __getattr__(self, attr):
+		# Glyphs stored in GlyphColumns get their outline data on first use.
+		columns = self.__dict__.get("columns")
+		if columns is None or attr not in GlyphColumns.glyphAttrs:
+			raise AttributeError(attr)
+		columns.expandGlyph(self)
+		return getattr(self, attr)
+
 	def compact(self, glyfTable, recalcBBoxes=True):
 		data = self.compile(glyfTable, recalcBBoxes)
 		self.__dict__.clear()
@@ -324,7 +370,10 @@ class Glyph(object):
 			del self.data
 			self.numberOfContours = 0
 			return
-		dummy, data = sstruct.unpack2(glyphHeaderFormat, self.data, self)
+		data = self.data
+		if isinstance(data, memoryview):
+			data = data.tobytes()
+		dummy, data = sstruct.unpack2(glyphHeaderFormat, data, self)
 		del self.data
 		# Some fonts (eg. Neirizi.ttf) have a 0 for numberOfContours in
 		# some glyphs; decompileCoordinates assumes that there's at least
@@ -337,10 +386,14 @@ class Glyph(object):
 			self.decompileCoordinates(data)
 
 	def compile(self, glyfTable, recalcBBoxes=True):
+		if hasattr(self, "columns"):
+			return self.columns.compileGlyph(self, recalcBBoxes)
 		if hasattr(self, "data"):
 			if recalcBBoxes:
 				# must unpack glyph in order to recalculate bounding box
 				self.expand(glyfTable)
+			elif isinstance(self.data, memoryview):
+				return self.data.tobytes()
 			else:
 				return self.data
 		if self.numberOfContours == 0:
@@ -427,23 +480,31 @@ class Glyph(object):
 
 	def getCompositeMaxpValues(self, glyfTable, maxComponentDepth=1):
 		assert self.isComposite()
-		nContours = 0
-		nPoints = 0
+		cache = glyfTable.flattenCache
+		entry = cache.findEntry(glyfTable, self)
+		if entry is None:
+			nPoints, nContours, depth = self._getCompositeMaxpValues(glyfTable)
+		else:
+			nPoints, nContours, depth = cache.getEntryMaxpValues(glyfTable, entry)
+		return CompositeMaxpValues(nPoints, nContours, maxComponentDepth + depth)
+
+	def _getCompositeMaxpValues(self, glyfTable):
+		# Return the number of points and contours of the composite, and how
+		# much deeper than itself its components go.
+		cache = glyfTable.flattenCache
+		nPoints = nContours = depth = 0
 		for compo in self.components:
-			baseGlyph = glyfTable[compo.glyphName]
-			if baseGlyph.numberOfContours == 0:
-				continue
-			elif baseGlyph.numberOfContours > 0:
-				nP, nC = baseGlyph.getMaxpValues()
-			else:
-				nP, nC, maxComponentDepth = baseGlyph.getCompositeMaxpValues(
-						glyfTable, maxComponentDepth + 1)
+			nP, nC, compoDepth = cache.getMaxpValues(glyfTable, compo.glyphName)
+			if compoDepth is not None:
+				depth = depth + 1 + compoDepth
 			nPoints = nPoints + nP
 			nContours = nContours + nC
-		return CompositeMaxpValues(nPoints, nContours, maxComponentDepth)
+		return nPoints, nContours, depth
 
 	def getMaxpValues(self):
 		assert self.numberOfContours > 0
+		if hasattr(self, "columns"):
+			return self.columns.getMaxpValues(self)
 		return len(self.coordinates), len(self.endPtsOfContours)
 
 	def decompileComponents(self, data, glyfTable):
@@ -710,6 +771,13 @@ class Glyph(object):
 		return (compressedFlags, compressedXs, compressedYs)
 
 	def recalcBounds(self, glyfTable):
+		if self.isComposite():
+			cache = glyfTable.flattenCache
+			entry = cache.findEntry(glyfTable, self)
+			if entry is not None:
+				self.xMin, self.yMin, self.xMax, self.yMax = \
+					cache.getEntryBounds(glyfTable, entry)
+				return
 		coords, endPts, flags = self.getCoordinates(glyfTable)
 		if len(coords) > 0:
 			if 0:
@@ -780,50 +848,64 @@ class Glyph(object):
 		return self.components[componentIndex]
 
 	def getCoordinates(self, glyfTable):
+		if hasattr(self, "columns"):
+			return self.columns.getCoordinates(self)
 		if self.numberOfContours > 0:
 			return self.coordinates, self.endPtsOfContours, self.flags
 		elif self.isComposite():
 			# it's a composite
-			allCoords = GlyphCoordinates()
-			allFlags = array.array("B")
-			allEndPts = []
-			for compo in self.components:
-				g = glyfTable[compo.glyphName]
-				coordinates, endPts, flags = g.getCoordinates(glyfTable)
-				if hasattr(compo, "firstPt"):
-					# move according to two reference points
-					x1,y1 = allCoords[compo.firstPt]
-					x2,y2 = coordinates[compo.secondPt]
-					move = x1-x2, y1-y2
-				else:
-					move = compo.x, compo.y
+			cache = glyfTable.flattenCache
+			entry = cache.findEntry(glyfTable, self)
+			if entry is None:
+				return self._flattenComponents(glyfTable)
+			allCoords, allEndPts, allFlags = cache.getEntryCoordinates(glyfTable, entry)
+			return allCoords.copy(), list(allEndPts), array.array("B", allFlags)
+		else:
+			return GlyphCoordinates(), [], array.array("B")
 
-				coordinates = GlyphCoordinates(coordinates)
-				if not hasattr(compo, "transform"):
+	def _flattenComponents(self, glyfTable):
+		cache = glyfTable.flattenCache
+		allCoords = GlyphCoordinates()
+		allFlags = array.array("B")
+		allEndPts = []
+		for compo in self.components:
+			coordinates, endPts, flags = cache.getCoordinates(glyfTable, compo.glyphName)
+			if hasattr(compo, "firstPt"):
+				# move according to two reference points
+				x1,y1 = allCoords[compo.firstPt]
+				x2,y2 = coordinates[compo.secondPt]
+				move = x1-x2, y1-y2
+			else:
+				move = compo.x, compo.y
+
+			coordinates = coordinates.copy()
+			if not hasattr(compo, "transform"):
+				coordinates.translate(move)
+			else:
+				apple_way = compo.flags & SCALED_COMPONENT_OFFSET
+				ms_way = compo.flags & UNSCALED_COMPONENT_OFFSET
+				assert not (apple_way and ms_way)
+				if not (apple_way or ms_way):
+					scale_component_offset = SCALE_COMPONENT_OFFSET_DEFAULT  # see top of this file
+				else:
+					scale_component_offset = apple_way
+				if scale_component_offset:
+					# the Apple way: first move, then scale (ie. scale the component offset)
 					coordinates.translate(move)
+					coordinates.transform(compo.transform)
 				else:
-					apple_way = compo.flags & SCALED_COMPONENT_OFFSET
-					ms_way = compo.flags & UNSCALED_COMPONENT_OFFSET
-					assert not (apple_way and ms_way)
-					if not (apple_way or ms_way):
-						scale_component_offset = SCALE_COMPONENT_OFFSET_DEFAULT  # see top of this file
-					else:
-						scale_component_offset = apple_way
-					if scale_component_offset:
-						# the Apple way: first move, then scale (ie. scale the component offset)
-						coordinates.translate(move)
-						coordinates.transform(compo.transform)
-					else:
-						# the MS way: first scale, then move
-						coordinates.transform(compo.transform)
-						coordinates.translate(move)
-				offset = len(allCoords)
-				allEndPts.extend(e + offset for e in endPts)
-				allCoords.extend(coordinates)
-				allFlags.extend(flags)
-			return allCoords, allEndPts, allFlags
-		else:
-			return GlyphCoordinates(), [], array.array("B")
+					# the MS way: first scale, then move
+					coordinates.transform(compo.transform)
+					coordinates.translate(move)
+			offset = len(allCoords)
+			allEndPts.extend(e + offset for e in endPts)
+			if coordinates.isFloat():
+				allCoords._ensureFloat()
+			elif allCoords.isFloat():
+				coordinates._ensureFloat()
+			allCoords._a.extend(coordinates._a)
+			allFlags.extend(flags)
+		return allCoords, allEndPts, allFlags
 
 	def getComponentNames(self, glyfTable):
 		if not hasattr(self, "data"):
@@ -860,6 +942,10 @@ class Glyph(object):
 		""" Remove padding and, if requested, hinting, from a glyph.
 			This works on both expanded and compacted glyphs, without
 			expanding it."""
+		if hasattr(self, "columns"):
+			if remove_hinting:
+				self.columns.removeInstructions(self)
+			return
 		if not hasattr(self, "data"):
 			if remove_hinting:
 				self.program = ttProgram.Program()
@@ -943,15 +1029,26 @@ class Glyph(object):
 	def removeHinting(self):
 		self.trim (remove_hinting=True)
 
-	def draw(self, pen, glyfTable, offset=0):
+	def draw(self, pen, glyfTable, offset=0, coordinates=None):
+		"""Draw the glyph onto pen, shifted horizontally by offset.
+
+		If given, 'coordinates' replaces the glyph's points, or the offsets
+		of its components for composite glyphs; any trailing points, such
+		as the 'gvar' phantom points, are ignored.
+		"""
 
 		if self.isComposite():
-			for component in self.components:
+			for i, component in enumerate(self.components):
 				glyphName, transform = component.getComponentInfo()
+				if coordinates is not None:
+					transform = transform[:4] + tuple(coordinates[i])
 				pen.addComponent(glyphName, transform)
 			return
 
-		coordinates, endPts, flags = self.getCoordinates(glyfTable)
+		if coordinates is None:
+			coordinates, endPts, flags = self.getCoordinates(glyfTable)
+		else:
+			_, endPts, flags = self.getCoordinates(glyfTable)
 		if offset:
 			coordinates = coordinates.copy()
 			coordinates.translate((offset, 0))
@@ -988,12 +1085,312 @@ class Glyph(object):
 	def __eq__(self, other):
 		if type(self) != type(other):
 			return NotImplemented
+		for glyph in (self, other):
+			if hasattr(glyph, "columns"):
+				glyph.columns.expandGlyph(glyph)
 		return self.__dict__ == other.__dict__
 
 	def __ne__(self, other):
 		result = self.__eq__(other)
 		return result if result is NotImplemented else not result
 
+class FlattenCache(object):
+
+	"""Cache of the flattened outlines of the composite glyphs of a 'glyf'
+	table, keyed by glyph name.
+
+	For each composite glyph, it keeps the coordinates, endPtsOfContours and
+	flags with all components resolved, the bounds and the maxp values, each
+	computed on first use.  Flattening a composite uses the cached results of
+	its components, so every glyph is only flattened once, however deep the
+	component trees.
+
+	Entries are checked before use against the glyph objects, their
+	components and the GlyphCoordinates of the simple glyphs they use, so
+	they are recomputed after any change made to those; the table clears the
+	whole cache when glyphs are set or deleted.  Changes written straight
+	into GlyphCoordinates.array, or in-place changes to flags and
+	endPtsOfContours, are not noticed.
+	"""
+
+	def __init__(self):
+		self.entries = {}
+		self._names = None
+
+	def clear(self):
+		self.entries.clear()
+		self._names = None
+
+	def getEntry(self, glyfTable, glyphName):
+		"""Return the up-to-date _FlattenedGlyph of composite glyphName."""
+		glyph = glyfTable[glyphName]
+		stamp, refs = self._getStamp(glyfTable, glyph)
+		entry = self.entries.get(glyphName)
+		if entry is None or entry.glyph is not glyph or entry.stamp != stamp:
+			entry = self.entries[glyphName] = _FlattenedGlyph(glyph, stamp, refs)
+		return entry
+
+	def findEntry(self, glyfTable, glyph):
+		"""Return the _FlattenedGlyph of composite glyph, or None if glyph
+		is not in glyfTable."""
+		glyphs = glyfTable.glyphs
+		names = self._names
+		if names is None or names[0] is not glyphs or names[1] != len(glyphs):
+			names = self._names = (
+				glyphs, len(glyphs), {id(g): n for n, g in glyphs.items()})
+		glyphName = names[2].get(id(glyph))
+		if glyphName is None or glyphs.get(glyphName) is not glyph:
+			return None
+		return self.getEntry(glyfTable, glyphName)
+
+	def _getStamp(self, glyfTable, glyph):
+		# Return a tuple identifying the state of everything the flattening
+		# of glyph depends on, and the objects whose ids it contains; the
+		# entry keeps those alive, so that their ids can't be reused.
+		stamp = []
+		refs = []
+		for compo in glyph.components:
+			transform = getattr(compo, "transform", None)
+			if transform is not None:
+				transform = tuple(tuple(row) for row in transform)
+			stamp.append((compo.glyphName, getattr(compo, "x", None),
+				getattr(compo, "y", None), getattr(compo, "firstPt", None),
+				getattr(compo, "secondPt", None), transform, compo.flags))
+			baseGlyph = glyfTable[compo.glyphName]
+			if baseGlyph.isComposite():
+				baseState = self.getEntry(glyfTable, compo.glyphName)
+				stamp.append(id(baseState))
+				refs.append(baseState)
+			elif "columns" in baseGlyph.__dict__ or baseGlyph.numberOfContours <= 0:
+				# outlines in GlyphColumns can't be changed in place
+				stamp.append(id(baseGlyph))
+				refs.append(baseGlyph)
+			else:
+				coordinates = baseGlyph.coordinates
+				stamp.append((id(baseGlyph), id(coordinates), coordinates._version,
+					id(baseGlyph.flags), id(baseGlyph.endPtsOfContours)))
+				refs.extend([baseGlyph, coordinates, baseGlyph.flags,
+					baseGlyph.endPtsOfContours])
+		return tuple(stamp), refs
+
+	def getCoordinates(self, glyfTable, glyphName):
+		"""Like glyfTable[glyphName].getCoordinates(glyfTable), but the result
+		must not be modified, as it may be shared with the cache."""
+		glyph = glyfTable[glyphName]
+		if not glyph.isComposite():
+			return glyph.getCoordinates(glyfTable)
+		return self.getEntryCoordinates(glyfTable, self.getEntry(glyfTable, glyphName))
+
+	def getMaxpValues(self, glyfTable, glyphName):
+		"""Return the number of points and contours of glyphName, and None
+		if it isn't composite, or else how much deeper than itself its
+		components go."""
+		glyph = glyfTable[glyphName]
+		if glyph.numberOfContours == 0:
+			return 0, 0, None
+		elif not glyph.isComposite():
+			nPoints, nContours = glyph.getMaxpValues()
+			return nPoints, nContours, None
+		return self.getEntryMaxpValues(glyfTable, self.getEntry(glyfTable, glyphName))
+
+	def getEntryMaxpValues(self, glyfTable, entry):
+		if entry.maxpValues is None:
+			entry.maxpValues = entry.glyph._getCompositeMaxpValues(glyfTable)
+		return entry.maxpValues
+
+	def getEntryCoordinates(self, glyfTable, entry):
+		if entry.coordinates is None:
+			entry.coordinates = entry.glyph._flattenComponents(glyfTable)
+		return entry.coordinates
+
+	def getEntryBounds(self, glyfTable, entry):
+		if entry.bounds is None:
+			coordinates = self.getEntryCoordinates(glyfTable, entry)[0]
+			if len(coordinates) > 0:
+				entry.bounds = calcIntBounds(coordinates)
+			else:
+				entry.bounds = (0, 0, 0, 0)
+		return entry.bounds
+
+
+class _FlattenedGlyph(object):
+
+	def __init__(self, glyph, stamp, refs):
+		self.glyph = glyph
+		self.stamp = stamp
+		self.refs = refs
+		self.coordinates = None
+		self.bounds = None
+		self.maxpValues = None
+
+
+class GlyphColumns(object):
+
+	"""The outlines of the simple glyphs of a 'glyf' table, stored in a few
+	arrays shared by all the glyphs instead of in objects of their own.
+
+	The Glyph objects returned by addGlyph() only hold their header values
+	(numberOfContours and bounding box) and their place in the columns.
+	Their coordinates, flags, endPtsOfContours and program are only made on
+	first use; the coordinates are then a view sharing the memory of the
+	columns (a copy on Python 2).  Until then, they compile straight from
+	the columns.
+	"""
+
+	glyphAttrs = frozenset(["coordinates", "flags", "endPtsOfContours", "program"])
+
+	def __init__(self):
+		# x, y pairs of absolute coordinates, for all points of all glyphs
+		self.coordinates = array.array("h")
+		# on-curve flag of all points
+		self.flags = array.array("B")
+		# end points of all contours, relative to the start of their glyph
+		self.endPtsOfContours = array.array("H")
+		self.instructions = bytearray()
+		# Per glyph index: where the points, contours and instructions of the
+		# glyph start in the arrays above.  The end of glyph i is the start of
+		# glyph i + 1, except for instructions, which can be removed.
+		self.pointIndex = array.array("L", [0])
+		self.contourIndex = array.array("L", [0])
+		self.instructionStart = array.array("L")
+		self.instructionEnd = array.array("L")
+
+	def __len__(self):
+		return len(self.instructionStart)
+
+	def addGlyph(self, data):
+		"""Decompile the data of a simple glyph into the columns, and return
+		a Glyph for it."""
+		if isinstance(data, memoryview):
+			data = data.tobytes()
+		glyph = Glyph()
+		dummy, data = sstruct.unpack2(glyphHeaderFormat, data, glyph)
+		numberOfContours = glyph.numberOfContours
+		assert numberOfContours > 0
+		data = bytearray(data)
+
+		endPtsOfContours = array.array("H")
+		endPtsOfContours.fromstring(bytes(data[:2*numberOfContours]))
+		if sys.byteorder != "big":
+			endPtsOfContours.byteswap()
+		i = 2 * numberOfContours
+		instructionLength = (data[i] << 8) | data[i+1]
+		i += 2
+		instructions = data[i:i+instructionLength]
+		i += instructionLength
+		nCoordinates = endPtsOfContours[-1] + 1
+
+		flags = []
+		while len(flags) < nCoordinates:
+			flag = data[i]
+			i += 1
+			if flag & flagRepeat:
+				flags.extend([flag] * (data[i] + 1))
+				i += 1
+			else:
+				flags.append(flag)
+		assert len(flags) == nCoordinates, "bad glyph flags"
+
+		# Unpack and apply the coordinate deltas; the glyf data has all the
+		# x coordinates first, then all the y coordinates.
+		coordinates = [0] * (2 * nCoordinates)
+		for short, same, k in ((flagXShort, flagXsame, 0), (flagYShort, flagYsame, 1)):
+			v = 0
+			for flag in flags:
+				if flag & short:
+					if flag & same:
+						v += data[i]
+					else:
+						v -= data[i]
+					i += 1
+				elif not flag & same:
+					delta = (data[i] << 8) | data[i+1]
+					v += delta - 0x10000 if delta & 0x8000 else delta
+					i += 2
+				coordinates[k] = v
+				k += 2
+		if len(data) - i >= 4:
+			log.warning("too much glyph data: %d excess bytes", len(data) - i)
+
+		glyph.columns = self
+		glyph.columnIndex = len(self.instructionStart)
+		self.coordinates.extend(coordinates)
+		self.flags.extend([flag & flagOnCurve for flag in flags])
+		self.endPtsOfContours.extend(endPtsOfContours)
+		self.instructionStart.append(len(self.instructions))
+		self.instructions.extend(instructions)
+		self.instructionEnd.append(len(self.instructions))
+		self.pointIndex.append(len(self.flags))
+		self.contourIndex.append(len(self.endPtsOfContours))
+		return glyph
+
+	def expandGlyph(self, glyph):
+		"""Give glyph its own coordinates, flags, endPtsOfContours and
+		program, after which it no longer refers to the columns."""
+		i = glyph.columnIndex
+		del glyph.columns, glyph.columnIndex
+		start, end = self.pointIndex[i], self.pointIndex[i+1]
+		coordinates = GlyphCoordinates()
+		try:
+			coordinates._a = memoryview(self.coordinates)[2*start:2*end]
+		except TypeError:
+			# Python 2 arrays can't be viewed.
+			coordinates._a = self.coordinates[2*start:2*end]
+		glyph.coordinates = coordinates
+		glyph.flags = self.flags[start:end]
+		glyph.endPtsOfContours = self.endPtsOfContours[
+			self.contourIndex[i]:self.contourIndex[i+1]].tolist()
+		glyph.program = ttProgram.Program()
+		glyph.program.fromBytecode(
+			bytes(self.instructions[self.instructionStart[i]:self.instructionEnd[i]]))
+
+	def getCoordinates(self, glyph):
+		"""Return a copy of the coordinates, endPtsOfContours and flags of
+		glyph, leaving it unexpanded."""
+		i = glyph.columnIndex
+		start, end = self.pointIndex[i], self.pointIndex[i+1]
+		coordinates = GlyphCoordinates()
+		coordinates._a = self.coordinates[2*start:2*end]
+		endPtsOfContours = self.endPtsOfContours[
+			self.contourIndex[i]:self.contourIndex[i+1]].tolist()
+		return coordinates, endPtsOfContours, self.flags[start:end]
+
+	def removeInstructions(self, glyph):
+		i = glyph.columnIndex
+		self.instructionEnd[i] = self.instructionStart[i]
+
+	def getMaxpValues(self, glyph):
+		i = glyph.columnIndex
+		return (self.pointIndex[i+1] - self.pointIndex[i],
+			self.contourIndex[i+1] - self.contourIndex[i])
+
+	def compileGlyph(self, glyph, recalcBBoxes=True):
+		"""Compile glyph from the columns, like Glyph.compile would once
+		expanded."""
+		i = glyph.columnIndex
+		start, end = self.pointIndex[i], self.pointIndex[i+1]
+		xs = self.coordinates[2*start:2*end:2]
+		ys = self.coordinates[2*start+1:2*end:2]
+		if recalcBBoxes:
+			glyph.xMin, glyph.yMin = min(xs), min(ys)
+			glyph.xMax, glyph.yMax = max(xs), max(ys)
+		data = [sstruct.pack(glyphHeaderFormat, glyph)]
+
+		endPtsOfContours = self.endPtsOfContours[
+			self.contourIndex[i]:self.contourIndex[i+1]]
+		if sys.byteorder != "big":
+			endPtsOfContours.byteswap()
+		data.append(endPtsOfContours.tostring())
+		instructions = bytes(self.instructions[self.instructionStart[i]:self.instructionEnd[i]])
+		data.append(struct.pack(">h", len(instructions)))
+		data.append(instructions)
+
+		dxs = [x - last for x, last in zip(xs, [0] + xs.tolist())]
+		dys = [y - last for y, last in zip(ys, [0] + ys.tolist())]
+		data.extend(glyph.compileDeltasGreedy(self.flags[start:end], zip(dxs, dys)))
+		return bytesjoin(data)
+
+
 class GlyphComponent(object):
 
 	def __init__(self):
@@ -1159,8 +1556,17 @@ class GlyphComponent(object):
 		result = self.__eq__(other)
 		return result if result is NotImplemented else not result
 
+# Below this many coordinates (twice the number of points), the loops of
+# GlyphCoordinates beat setting up the NumPy views.
+_NP_MIN_SIZE = 64
+
+
 class GlyphCoordinates(object):
 
+	# Incremented by the methods that change the coordinates in place, so
+	# that FlattenCache can tell when they were changed.
+	_version = 0
+
 	def __init__(self, iterable=[], typecode="h"):
 		self._a = array.array(typecode)
 		self.extend(iterable)
@@ -1170,7 +1576,18 @@ class GlyphCoordinates(object):
 		return self._a
 
 	def isFloat(self):
-		return self._a.typecode == 'd'
+		# Views of GlyphColumns coordinates (memoryviews) are never float.
+		return getattr(self._a, "typecode", None) == 'd'
+
+	def _ensureArray(self):
+		# Give a view of GlyphColumns coordinates an array of its own,
+		# before resizing it.
+		if isinstance(self._a, memoryview):
+			self._a = array.array("h", self._a.tolist())
+
+	def __getstate__(self):
+		self._ensureArray()
+		return self.__dict__
 
 	def _ensureFloat(self):
 		if self.isFloat():
@@ -1187,12 +1604,42 @@ class GlyphCoordinates(object):
 				self._ensureFloat()
 		return p
 
+	def _numpyView(self):
+		"""Return a NumPy array sharing the memory of the coordinates, or
+		None if NumPy isn't available, or not worth it for so few of them.
+		The array must not outlive the method using it, as the coordinates
+		can't be resized while it exists."""
+		a = self._a
+		if np is None or len(a) < _NP_MIN_SIZE:
+			return None
+		a = np.frombuffer(a, dtype=getattr(a, "typecode", None) or a.format)
+		if not a.flags.writeable:
+			return None
+		return a
+
+	@staticmethod
+	def _widen(a):
+		"""Return the values of the view 'a' in a type that doesn't
+		overflow, like the Python numbers the loops compute with."""
+		return a.astype(np.int64) if a.dtype.kind == 'i' else a
+
+	@staticmethod
+	def _store(a, values):
+		"""Store 'values' into the view 'a', raising OverflowError if they
+		don't fit, like the array would."""
+		if a.dtype.kind == 'i' and values.size:
+			if values.min() < -0x8000:
+				raise OverflowError("signed short integer is less than minimum")
+			if values.max() > 0x7FFF:
+				raise OverflowError("signed short integer is greater than maximum")
+		a[...] = values
+
 	@staticmethod
 	def zeros(count):
 		return GlyphCoordinates([(0,0)] * count)
 
 	def copy(self):
-		c = GlyphCoordinates(typecode=self._a.typecode)
+		c = GlyphCoordinates(typecode="d" if self.isFloat() else "h")
 		c._a.extend(self._a)
 		return c
 
@@ -1214,41 +1661,71 @@ class GlyphCoordinates(object):
 			return
 		v = self._checkFloat(v)
 		self._a[2*k],self._a[2*k+1] = v
+		self._version += 1
 
 	def __delitem__(self, i):
+		self._ensureArray()
 		i = (2*i) % len(self._a)
 		del self._a[i]
 		del self._a[i]
+		self._version += 1
 
 
 	def __repr__(self):
 		return 'GlyphCoordinates(['+','.join(str(c) for c in self)+'])'
 
 	def append(self, p):
+		self._ensureArray()
 		p = self._checkFloat(p)
 		self._a.extend(tuple(p))
+		self._version += 1
 
 	def extend(self, iterable):
+		self._ensureArray()
 		for p in iterable:
 			p = self._checkFloat(p)
 			self._a.extend(p)
+		self._version += 1
 
 	def toInt(self):
 		if not self.isFloat():
 			return
-		a = array.array("h")
-		for n in self._a:
-			a.append(int(round(n)))
+		# NumPy rounds halves to even, like Python 3 but not Python 2
+		v = self._numpyView() if sys.version_info[0] >= 3 else None
+		if v is not None:
+			values = np.round(v)
+			a = array.array("h", [0]) * len(values)
+			self._store(np.frombuffer(a, dtype=np.int16), values)
+		else:
+			a = array.array("h")
+			for n in self._a:
+				a.append(int(round(n)))
 		self._a = a
+		self._version += 1
 
 	def relativeToAbsolute(self):
+		v = self._numpyView()
+		if v is not None:
+			# adding 0 turns -0.0 into 0.0, as the loop does
+			self._store(v, np.cumsum(self._widen(v).reshape(-1, 2), axis=0).ravel() + 0)
+			self._version += 1
+			return
 		a = self._a
 		x,y = 0,0
 		for i in range(len(a) // 2):
 			a[2*i  ] = x = a[2*i  ] + x
 			a[2*i+1] = y = a[2*i+1] + y
+		self._version += 1
 
 	def absoluteToRelative(self):
+		v = self._numpyView()
+		if v is not None:
+			values = self._widen(v).reshape(-1, 2)
+			deltas = values.copy()
+			deltas[1:] -= values[:-1]
+			self._store(v, deltas.ravel())
+			self._version += 1
+			return
 		a = self._a
 		x,y = 0,0
 		for i in range(len(a) // 2):
@@ -1258,31 +1735,61 @@ class GlyphCoordinates(object):
 			y = a[2*i+1]
 			a[2*i  ] = dx
 			a[2*i+1] = dy
+		self._version += 1
 
 	def translate(self, p):
 		"""
 		>>> GlyphCoordinates([(1,2)]).translate((.5,0))
 		"""
 		(x,y) = self._checkFloat(p)
+		v = self._numpyView()
+		if v is not None:
+			self._store(v, (self._widen(v).reshape(-1, 2) + (x, y)).ravel())
+			self._version += 1
+			return
 		a = self._a
 		for i in range(len(a) // 2):
 			a[2*i  ] += x
 			a[2*i+1] += y
+		self._version += 1
 
 	def scale(self, p):
 		"""
 		>>> GlyphCoordinates([(1,2)]).scale((.5,0))
 		"""
 		(x,y) = self._checkFloat(p)
+		v = self._numpyView()
+		if v is not None:
+			self._store(v, (self._widen(v).reshape(-1, 2) * (x, y)).ravel())
+			self._version += 1
+			return
 		a = self._a
 		for i in range(len(a) // 2):
 			a[2*i  ] *= x
 			a[2*i+1] *= y
+		self._version += 1
 
 	def transform(self, t):
 		"""
 		>>> GlyphCoordinates([(1,2)]).transform(((.5,0),(.2,.5)))
 		"""
+		v = self._numpyView()
+		if v is not None:
+			values = self._widen(v)
+			x, y = values[0::2], values[1::2]
+			transformed = np.empty((len(x), 2), dtype=np.result_type(
+				values, t[0][0], t[0][1], t[1][0], t[1][1]))
+			transformed[:, 0] = x * t[0][0] + y * t[1][0]
+			transformed[:, 1] = x * t[0][1] + y * t[1][1]
+			transformed = transformed.ravel()
+			if (not self.isFloat() and transformed.dtype.kind == 'f' and
+					not (transformed == np.trunc(transformed)).all()):
+				# like __setitem__, only keep floats if some aren't integers
+				self._a = array.array("d", transformed.tobytes())
+			else:
+				self._store(v, transformed)
+			self._version += 1
+			return
 		a = self._a
 		for i in range(len(a) // 2):
 			x = a[2*i  ]
@@ -1351,6 +1858,10 @@ class GlyphCoordinates(object):
 		GlyphCoordinates([(1, 2)])
 		"""
 		r = self.copy()
+		v = r._numpyView()
+		if v is not None:
+			r._store(v, -r._widen(v))
+			return r
 		a = r._a
 		for i in range(len(a)):
 			a[i] = -a[i]
@@ -1390,11 +1901,18 @@ class GlyphCoordinates(object):
 			return self
 		if isinstance(other, GlyphCoordinates):
 			if other.isFloat(): self._ensureFloat()
+			v, w = self._numpyView(), other._numpyView()
+			if v is not None and w is not None:
+				assert len(v) == len(w)
+				self._store(v, self._widen(v) + self._widen(w))
+				self._version += 1
+				return self
 			other = other._a
 			a = self._a
 			assert len(a) == len(other)
 			for i in range(len(a)):
 				a[i] += other[i]
+			self._version += 1
 			return self
 		return NotImplemented
 
@@ -1415,11 +1933,18 @@ class GlyphCoordinates(object):
 			return self
 		if isinstance(other, GlyphCoordinates):
 			if other.isFloat(): self._ensureFloat()
+			v, w = self._numpyView(), other._numpyView()
+			if v is not None and w is not None:
+				assert len(v) == len(w)
+				self._store(v, self._widen(v) - self._widen(w))
+				self._version += 1
+				return self
 			other = other._a
 			a = self._a
 			assert len(a) == len(other)
 			for i in range(len(a)):
 				a[i] -= other[i]
+			self._version += 1
 			return self
 		return NotImplemented
 
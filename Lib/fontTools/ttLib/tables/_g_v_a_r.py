@@ -5,6 +5,7 @@ from fontTools.misc import sstruct
 from fontTools.misc.textTools import safeEval
 from fontTools.ttLib import TTLibError
 from . import DefaultTable
+from functools import partial
 import array
 import itertools
 import logging
@@ -12,6 +13,11 @@ import struct
 import sys
 import fontTools.ttLib.tables.TupleVariation as tv
 
+try:
+	from collections import UserDict
+except ImportError:
+	from UserDict import UserDict
+
 
 log = logging.getLogger(__name__)
 TupleVariation = tv.TupleVariation
@@ -41,9 +47,42 @@ GVAR_HEADER_FORMAT = """
 GVAR_HEADER_SIZE = sstruct.calcsize(GVAR_HEADER_FORMAT)
 
 
+class _LazyDict(UserDict):
+	"""Dict of glyphName -> TupleVariation list, where values are
+	decompiled from the binary table on first access.
+
+	Values that are still pending are stored as callables; calling one
+	returns the decompiled list, which then replaces it in the dict.
+	"""
+
+	def __init__(self, data):
+		self.data = data
+
+	def __getitem__(self, glyphName):
+		value = self.data[glyphName]
+		if callable(value):
+			value = value()
+			self.data[glyphName] = value
+		return value
+
+	# Python 2's UserDict returns the raw values from these; make sure
+	# pending entries are decompiled first.
+
+	def values(self):
+		return [self[k] for k in self.data]
+
+	def items(self):
+		return [(k, self[k]) for k in self.data]
+
+
 class table__g_v_a_r(DefaultTable.DefaultTable):
 	dependencies = ["fvar", "glyf"]
 
+	# Whether the glyphs' tuples may share their point numbers. Set it to
+	# False on a table for macOS 10.9 to 10.12, which break on shared points;
+	# see TupleVariation.compileTupleVariationStore.
+	useSharedPoints = True
+
 	def __init__(self, tag=None):
 		DefaultTable.DefaultTable.__init__(self, tag)
 		self.version, self.reserved = 1, 0
@@ -88,7 +127,8 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 			pointCount = self.getNumPoints_(glyph)
 			variations = self.variations.get(glyphName, [])
 			result.append(compileGlyph_(variations, pointCount,
-			                            axisTags, sharedCoordIndices))
+			                            axisTags, sharedCoordIndices,
+			                            self.useSharedPoints))
 		return result
 
 	def decompile(self, data, ttFont):
@@ -100,16 +140,25 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 		offsets = self.decompileOffsets_(data[GVAR_HEADER_SIZE:], tableFormat=(self.flags & 1), glyphCount=self.glyphCount)
 		sharedCoords = tv.decompileSharedTuples(
 			axisTags, self.sharedTupleCount, data, self.offsetToSharedTuples)
-		self.variations = {}
 		offsetToData = self.offsetToGlyphVariationData
-		for i in range(self.glyphCount):
-			glyphName = glyphs[i]
-			glyph = ttFont["glyf"][glyphName]
-			numPointsInGlyph = self.getNumPoints_(glyph)
-			gvarData = data[offsetToData + offsets[i] : offsetToData + offsets[i + 1]]
-			self.variations[glyphName] = decompileGlyph_(
+		glyf = ttFont["glyf"]
+
+		def decompileVarGlyph(glyphName, gid):
+			gvarData = data[offsetToData + offsets[gid] : offsetToData + offsets[gid + 1]]
+			if not gvarData:
+				return []
+			numPointsInGlyph = self.getNumPoints_(glyf[glyphName])
+			return decompileGlyph_(
 				numPointsInGlyph, sharedCoords, axisTags, gvarData)
 
+		if ttFont.lazy is False: # Be lazy for None and True
+			self.variations = {glyphs[gid]: decompileVarGlyph(glyphs[gid], gid)
+			                   for gid in range(self.glyphCount)}
+		else:
+			self.variations = _LazyDict({
+				glyphs[gid]: partial(decompileVarGlyph, glyphs[gid], gid)
+				for gid in range(self.glyphCount)})
+
 	@staticmethod
 	def decompileOffsets_(data, tableFormat, glyphCount):
 		if tableFormat == 0:
@@ -207,9 +256,11 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 			return len(getattr(glyph, "coordinates", [])) + NUM_PHANTOM_POINTS
 
 
-def compileGlyph_(variations, pointCount, axisTags, sharedCoordIndices):
+def compileGlyph_(variations, pointCount, axisTags, sharedCoordIndices,
+                  useSharedPoints=True):
 	tupleVariationCount, tuples, data = tv.compileTupleVariationStore(
-		variations, pointCount, axisTags, sharedCoordIndices)
+		variations, pointCount, axisTags, sharedCoordIndices,
+		useSharedPoints=useSharedPoints)
 	if tupleVariationCount == 0:
 		return b""
 	result = (struct.pack(">HH", tupleVariationCount, 4 + len(tuples)) +
@@ -7,6 +7,10 @@ import sys
 import struct
 import array
 import logging
+try:
+	from collections.abc import MutableMapping
+except ImportError:
+	from UserDict import DictMixin as MutableMapping
 
 
 log = logging.getLogger(__name__)
@@ -27,80 +31,87 @@ class table__h_m_t_x(DefaultTable.DefaultTable):
 			log.warning("The %s.%s exceeds the maxp.numGlyphs" % (
 				self.headerTag, self.numberOfMetricsName))
 			numberOfMetrics = numGlyphs
+		numberOfSideBearings = numGlyphs - numberOfMetrics
+		size = 4 * numberOfMetrics + 2 * numberOfSideBearings
 		if len(data) < 4 * numberOfMetrics:
 			raise ttLib.TTLibError("not enough '%s' table data" % self.tableTag)
 		# Note: advanceWidth is unsigned, but some font editors might
 		# read/write as signed. We can't be sure whether it was a mistake
 		# or not, so we read as unsigned but also issue a warning...
-		metricsFmt = ">" + self.longMetricFormat * numberOfMetrics
-		metrics = struct.unpack(metricsFmt, data[:4 * numberOfMetrics])
-		data = data[4 * numberOfMetrics:]
-		numberOfSideBearings = numGlyphs - numberOfMetrics
-		sideBearings = array.array("h", data[:2 * numberOfSideBearings])
-		data = data[2 * numberOfSideBearings:]
-
+		longMetrics = array.array("H", data[:4 * numberOfMetrics])
+		sideBearings = array.array("h", data[4 * numberOfMetrics:size])
+		if len(data) > size:
+			log.warning("too much '%s' table data" % self.tableTag)
 		if sys.byteorder != "big":
+			longMetrics.byteswap()
 			sideBearings.byteswap()
-		if data:
-			log.warning("too much '%s' table data" % self.tableTag)
-		self.metrics = {}
+		advances = longMetrics[0::2]
+		# the side bearings are signed
+		sideBearings = array.array("h", longMetrics[1::2].tostring()) + sideBearings
 		glyphOrder = ttFont.getGlyphOrder()
-		for i in range(numberOfMetrics):
-			glyphName = glyphOrder[i]
-			advanceWidth, lsb = metrics[i*2:i*2+2]
-			if advanceWidth > 32767:
-				log.warning(
-					"Glyph %r has a huge advance %s (%d); is it intentional or "
-					"an (invalid) negative value?", glyphName, self.advanceName,
-					advanceWidth)
-			self.metrics[glyphName] = (advanceWidth, lsb)
-		lastAdvance = metrics[-2]
-		for i in range(numberOfSideBearings):
-			glyphName = glyphOrder[i + numberOfMetrics]
-			self.metrics[glyphName] = (lastAdvance, sideBearings[i])
+		if advances and max(advances) > 32767:
+			for i, advance in enumerate(advances):
+				if advance > 32767:
+					log.warning(
+						"Glyph %r has a huge advance %s (%d); is it intentional or "
+						"an (invalid) negative value?", glyphOrder[i], self.advanceName,
+						advance)
+		if numberOfSideBearings:
+			advances.extend(advances[-1:] * numberOfSideBearings)
+		if len(sideBearings) < numGlyphs:
+			raise ttLib.TTLibError("not enough '%s' table data" % self.tableTag)
+		self.metrics = _MetricsArrays(
+			glyphOrder[:numGlyphs], advances, sideBearings)
 
 	def compile(self, ttFont):
-		metrics = []
+		glyphOrder = ttFont.getGlyphOrder()
+		metrics = self.metrics
+		if (isinstance(metrics, _MetricsArrays) and
+				metrics.glyphOrder == glyphOrder and metrics.isPacked()):
+			advances, sideBearings = metrics.advances, metrics.sideBearings
+			numberOfMetrics = _countLongMetrics(advances)
+		else:
+			numberOfMetrics, advances, sideBearings = self._getMetricsArrays(glyphOrder)
+		setattr(ttFont[self.headerTag], self.numberOfMetricsName, numberOfMetrics)
+
+		# interleave the advances with the side bearings, reinterpreted
+		# as unsigned
+		longMetrics = array.array("H", advances[:numberOfMetrics]) * 2
+		longMetrics[0::2] = advances[:numberOfMetrics]
+		longMetrics[1::2] = array.array(
+			"H", sideBearings[:numberOfMetrics].tostring())
+		additionalMetrics = sideBearings[numberOfMetrics:]
+		if sys.byteorder != "big":
+			longMetrics.byteswap()
+			additionalMetrics.byteswap()
+		return longMetrics.tostring() + additionalMetrics.tostring()
+
+	def _getMetricsArrays(self, glyphOrder):
+		"""Return the number of long metrics, and the rounded advances and
+		side bearings of the glyphs as arrays."""
+		advances = []
+		sideBearings = []
 		hasNegativeAdvances = False
-		for glyphName in ttFont.getGlyphOrder():
-			advanceWidth, sideBearing = self.metrics[glyphName]
-			if advanceWidth < 0:
+		for glyphName in glyphOrder:
+			advance, sideBearing = self.metrics[glyphName]
+			if advance < 0:
 				log.error("Glyph %r has negative advance %s" % (
 					glyphName, self.advanceName))
 				hasNegativeAdvances = True
-			metrics.append([advanceWidth, sideBearing])
-		lastAdvance = metrics[-1][0]
-		lastIndex = len(metrics)
-		while metrics[lastIndex-2][0] == lastAdvance:
-			lastIndex -= 1
-			if lastIndex <= 1:
-				# all advances are equal
-				lastIndex = 1
-				break
-		additionalMetrics = metrics[lastIndex:]
-		additionalMetrics = [int(round(sb)) for _, sb in additionalMetrics]
-		metrics = metrics[:lastIndex]
-		numberOfMetrics = len(metrics)
-		setattr(ttFont[self.headerTag], self.numberOfMetricsName, numberOfMetrics)
-
-		allMetrics = []
-		for advance, sb in metrics:
-			allMetrics.extend([int(round(advance)), int(round(sb))])
-		metricsFmt = ">" + self.longMetricFormat * numberOfMetrics
+			advances.append(advance)
+			sideBearings.append(int(round(sideBearing)))
+		numberOfMetrics = _countLongMetrics(advances)
 		try:
-			data = struct.pack(metricsFmt, *allMetrics)
-		except struct.error as e:
-			if "out of range" in str(e) and hasNegativeAdvances:
+			return (numberOfMetrics,
+				array.array("H", [int(round(advance)) for advance in advances]),
+				array.array("h", sideBearings))
+		except OverflowError as e:
+			if hasNegativeAdvances:
 				raise ttLib.TTLibError(
 					"'%s' table can't contain negative advance %ss"
 					% (self.tableTag, self.advanceName))
-			else:
-				raise
-		additionalMetrics = array.array("h", additionalMetrics)
-		if sys.byteorder != "big":
-			additionalMetrics.byteswap()
-		data = data + additionalMetrics.tostring()
-		return data
+			# like struct.pack
+			raise struct.error(str(e))
 
 	def toXML(self, writer, ttFont):
 		names = sorted(self.metrics.keys())
@@ -128,3 +139,116 @@ class table__h_m_t_x(DefaultTable.DefaultTable):
 
 	def __setitem__(self, glyphName, advance_sb_pair):
 		self.metrics[glyphName] = tuple(advance_sb_pair)
+
+
+def _countLongMetrics(advances):
+	"""Return the number of glyphs that need a long metric: the glyphs
+	after them all have the same advance as the last of them."""
+	lastAdvance = advances[-1]
+	lastIndex = len(advances)
+	while advances[lastIndex-2] == lastAdvance:
+		lastIndex -= 1
+		if lastIndex <= 1:
+			# all advances are equal
+			lastIndex = 1
+			break
+	return lastIndex
+
+
+class _MetricsArrays(MutableMapping):
+	"""Dict of glyphName -> (advance, sideBearing) tuples, where the metrics
+	of the glyphs in 'glyphOrder' are stored in arrays of unsigned advances
+	and signed side bearings, indexed by glyph ID, as in the binary table.
+
+	Glyphs that aren't in 'glyphOrder', and metrics that don't fit in the
+	arrays (like floats), are stored in a dict instead.
+	"""
+
+	def __init__(self, glyphOrder, advances, sideBearings):
+		self.glyphOrder = glyphOrder
+		self.advances = advances
+		self.sideBearings = sideBearings
+		# glyph IDs whose entries in the arrays are deleted, or overridden
+		# by the dict
+		self._deleted = set()
+		self._other = {}
+
+	@property
+	def glyphIDs(self):
+		# only built when glyphs are looked up by name
+		glyphIDs = self.__dict__.get("_glyphIDs")
+		if glyphIDs is None:
+			glyphIDs = self._glyphIDs = {glyphName: glyphID
+					for glyphID, glyphName in enumerate(self.glyphOrder)}
+		return glyphIDs
+
+	def isPacked(self):
+		"""Return true if the arrays hold all the metrics."""
+		return not self._deleted and not self._other
+
+	def __getitem__(self, glyphName):
+		glyphID = self.glyphIDs.get(glyphName)
+		if glyphID is not None and glyphID not in self._deleted:
+			return (self.advances[glyphID], self.sideBearings[glyphID])
+		return self._other[glyphName]
+
+	def __setitem__(self, glyphName, value):
+		advance, sideBearing = value
+		glyphID = self.glyphIDs.get(glyphName)
+		if glyphID is not None:
+			if type(advance) is int and type(sideBearing) is int:
+				try:
+					self.advances[glyphID] = advance
+					self.sideBearings[glyphID] = sideBearing
+				except OverflowError:
+					pass
+				else:
+					self._deleted.discard(glyphID)
+					self._other.pop(glyphName, None)
+					return
+			self._deleted.add(glyphID)
+		self._other[glyphName] = value
+
+	def __delitem__(self, glyphName):
+		glyphID = self.glyphIDs.get(glyphName)
+		if glyphName in self._other:
+			del self._other[glyphName]
+		elif glyphID is None or glyphID in self._deleted:
+			raise KeyError(glyphName)
+		if glyphID is not None:
+			self._deleted.add(glyphID)
+
+	def __contains__(self, glyphName):
+		glyphID = self.glyphIDs.get(glyphName)
+		if glyphID is not None and glyphID not in self._deleted:
+			return True
+		return glyphName in self._other
+
+	def __iter__(self):
+		deleted = self._deleted
+		for glyphID, glyphName in enumerate(self.glyphOrder):
+			if glyphID not in deleted:
+				yield glyphName
+		for glyphName in self._other:
+			yield glyphName
+
+	def __len__(self):
+		return len(self.glyphOrder) - len(self._deleted) + len(self._other)
+
+	def keys(self):
+		return list(self)
+
+	def items(self):
+		if self.isPacked():
+			return list(zip(self.glyphOrder,
+					zip(self.advances, self.sideBearings)))
+		return [(glyphName, self[glyphName]) for glyphName in self]
+
+	def values(self):
+		return [value for _, value in self.items()]
+
+	def copy(self):
+		return dict(self.items())
+
+	def __repr__(self):
+		return repr(self.copy())
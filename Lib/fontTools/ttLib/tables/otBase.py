@@ -15,6 +15,7 @@ class OverflowErrorRecord(object):
 		self.SubTableIndex = overflowTuple[2]
 		self.itemName = overflowTuple[3]
 		self.itemIndex = overflowTuple[4]
+		self.offset = overflowTuple[5] if len(overflowTuple) > 5 else None
 
 	def __repr__(self):
 		return str((self.tableType, "LookupIndex:", self.LookupListIndex, "SubTableIndex:", self.SubTableIndex, "ItemName:", self.itemName, "ItemIndex:", self.itemIndex))
@@ -53,41 +54,56 @@ class BaseTTXConverter(DefaultTable):
 						This creates a tree of writers, rooted at the GUSB/GPOS writer, with
 						each writer representing a table, and the writer.items list containing
 						the child data strings and writers.
-			call the getAllData method
+			call the _layoutTables method
 				call _doneWriting, which removes duplicates
 				call _gatherTables. This traverses the tables, adding unique occurences to a flat list of tables
 				Traverse the flat list of tables, calling getDataLength on each to update their position
-				Traverse the flat list of tables again, calling getData each get the data in the table, now that
-				pos's and offset are known.
-
-				If a lookup subtable overflows an offset, we have to start all over.
+			collect the records of all offsets that overflow in this layout
+			if there are none, traverse the flat list of tables again, calling getData to
+			get the data in each table, now that pos's and offset are known.
+
+			If lookup subtables overflow offsets, all overflows found are fixed at
+			once by fixOverFlows, and we compile again.  The writers of lookup
+			subtables that were not touched by the fixes are kept in
+			subTableWriters and reused, so only the affected subtables are
+			compiled again.
 		"""
-		overflowRecord = None
+		hasLookups = hasattr(self.table, "LookupList")
+		subTableWriters = {} if hasLookups else None
+		passes = fixes = 0
 
 		while True:
-			try:
-				writer = OTTableWriter(tableTag=self.tableTag)
-				self.table.compile(writer, font)
-				return writer.getAllData()
-
-			except OTLOffsetOverflowError as e:
-
-				if overflowRecord == e.value:
-					raise # Oh well...
-
-				overflowRecord = e.value
-				log.info("Attempting to fix OTLOffsetOverflowError %s", e)
-				lastItem = overflowRecord
-
-				ok = 0
-				if overflowRecord.itemName is None:
-					from .otTables import fixLookupOverFlows
-					ok = fixLookupOverFlows(font, overflowRecord)
-				else:
-					from .otTables import fixSubTableOverFlows
-					ok = fixSubTableOverFlows(font, overflowRecord)
-				if not ok:
-					raise
+			writer = OTTableWriter(tableTag=self.tableTag)
+			writer.subTableWriters = subTableWriters
+			self.table.compile(writer, font)
+			tables, extTables = writer._layoutTables()
+			overflowRecords = writer._getOverflowErrorRecords(tables + extTables)
+			if not overflowRecords:
+				break
+
+			log.info("Attempting to fix %d OTLOffsetOverflowErrors, first: %s",
+				len(overflowRecords), overflowRecords[0])
+			if not hasLookups:
+				raise OTLOffsetOverflowError(overflowRecords[0])
+
+			def getSubTableLength(subTable):
+				return subTableWriters[id(subTable)][1]._getSubtreeLength({})
+
+			from .otTables import fixOverFlows
+			numFixes, modified = fixOverFlows(font, self.tableTag,
+				overflowRecords, getSubTableLength)
+			if not numFixes:
+				raise OTLOffsetOverflowError(overflowRecords[0])
+			for subTable in modified:
+				subTableWriters.pop(id(subTable), None)
+			passes += 1
+			fixes += numFixes
+
+		if passes:
+			# Fixing one overflow per compile, as done before, needs one pass per fix.
+			log.info("Fixed %s offset overflows with %d fixes in %d passes "
+				"(%d passes saved)", self.tableTag, fixes, passes, fixes - passes)
+		return writer._assembleTables(tables, extTables)
 
 	def toXML(self, writer, font):
 		self.table.toXML2(writer, font)
@@ -224,6 +240,7 @@ class OTTableWriter(object):
 		self.tableTag = tableTag
 		self.longOffset = False
 		self.parent = None
+		self.subTableWriters = None
 
 	def __setitem__(self, name, value):
 		state = self.localState.copy() if self.localState else dict()
@@ -303,11 +320,20 @@ class OTTableWriter(object):
 			internedTables = {}
 
 		items = self.items
+		if isinstance(items, tuple):
+			# This writer is reused from an earlier compile pass; start over
+			# from the items as written, before duplicates were collapsed.
+			items = self.writtenItems
+		else:
+			for i in range(len(items)):
+				item = items[i]
+				if hasattr(item, "getCountData"):
+					items[i] = item.getCountData()
+			self.writtenItems = items
+		items = list(items)
 		for i in range(len(items)):
 			item = items[i]
-			if hasattr(item, "getCountData"):
-				items[i] = item.getCountData()
-			elif hasattr(item, "getData"):
+			if hasattr(item, "getData"):
 				item._doneWriting(internedTables)
 				if not dontShare:
 					items[i] = item = internedTables.setdefault(item, item)
@@ -371,6 +397,10 @@ class OTTableWriter(object):
 
 	def getAllData(self):
 		"""Assemble all data, including all subtables."""
+		tables, extTables = self._layoutTables()
+		return self._assembleTables(tables, extTables)
+
+	def _layoutTables(self):
 		internedTables = {}
 		self._doneWriting(internedTables)
 		tables = []
@@ -390,6 +420,9 @@ class OTTableWriter(object):
 			table.pos = pos
 			pos = pos + table.getDataLength()
 
+		return tables, extTables
+
+	def _assembleTables(self, tables, extTables):
 		data = []
 		for table in tables:
 			tableData = table.getData()
@@ -401,10 +434,32 @@ class OTTableWriter(object):
 
 		return bytesjoin(data)
 
+	def _getOverflowErrorRecords(self, tables):
+		# Return records for all the short offsets that overflow in the
+		# current layout, in the order getData would run into them.
+		records = []
+		for table in tables:
+			pos = table.pos
+			for item in table.items:
+				if (hasattr(item, "getData") and not item.longOffset and
+						not 0 <= item.pos - pos < 0x10000):
+					records.append(table.getOverflowErrorRecord(item))
+		return records
+
+	def _getSubtreeLength(self, done):
+		# Return the length of this table and all the (unique) tables below it.
+		done[id(self)] = True
+		l = self.getDataLength()
+		for item in self.items:
+			if hasattr(item, "getData") and id(item) not in done:
+				l = l + item._getSubtreeLength(done)
+		return l
+
 	# interface for gathering data, as used by table.compile()
 
 	def getSubWriter(self):
 		subwriter = self.__class__(self.localState, self.tableTag)
+		subwriter.subTableWriters = self.subTableWriters
 		subwriter.parent = self # because some subtables have idential values, we discard
 					# the duplicates under the getAllData method. Hence some
 					# subtable writers can have more than one parent writer.
@@ -489,7 +544,8 @@ class OTTableWriter(object):
 						LookupListIndex = p1.parent.repeatIndex
 						SubTableIndex = p1.repeatIndex
 
-		return OverflowErrorRecord( (self.tableTag, LookupListIndex, SubTableIndex, itemName, itemIndex) )
+		offset = item.pos - self.pos
+		return OverflowErrorRecord( (self.tableTag, LookupListIndex, SubTableIndex, itemName, itemIndex, offset) )
 
 
 class CountReference(object):
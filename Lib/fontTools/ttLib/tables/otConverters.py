@@ -465,12 +465,33 @@ class SubTable(Table):
 	def xmlWrite(self, xmlWriter, font, value, name, attrs):
 		Table.xmlWrite(self, xmlWriter, font, value, None, attrs)
 
+	def write(self, writer, font, tableDict, value, repeatIndex=None):
+		# While fixing offset overflows, the lookup subtables are compiled
+		# over and over again; reuse the writers of those left unchanged.
+		cache = writer.subTableWriters
+		if cache is None or value is None:
+			Table.write(self, writer, font, tableDict, value, repeatIndex)
+			return
+		cached = cache.get(id(value))
+		if cached is None or cached[0] is not value:
+			Table.write(self, writer, font, tableDict, value, repeatIndex)
+			cache[id(value)] = (value, writer.items[-1])
+			return
+		subWriter = cached[1]
+		subWriter.parent = writer
+		subWriter.longOffset = self.longOffset
+		subWriter.name = self.name
+		if repeatIndex is not None:
+			subWriter.repeatIndex = repeatIndex
+		writer.writeSubTable(subWriter)
+		writer['LookupType'].setValue(value.__class__.LookupType)
+
 
 class ExtSubTable(LTable, SubTable):
 
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
 		writer.Extension = True # actually, mere presence of the field flags it as an Ext Subtable writer.
-		Table.write(self, writer, font, tableDict, value, repeatIndex)
+		SubTable.write(self, writer, font, tableDict, value, repeatIndex)
 
 class FeatureParams(Table):
 	def getConverter(self, featureTag):
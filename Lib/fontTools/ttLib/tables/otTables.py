@@ -7,7 +7,7 @@ converter objects from otConverters.py.
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.textTools import safeEval
-from .otBase import BaseTable, FormatSwitchingBaseTable
+from .otBase import BaseTable, FormatSwitchingBaseTable, OverflowErrorRecord
 import operator
 import logging
 
@@ -732,16 +732,22 @@ def fixLookupOverFlows(ttf, overflowRecord):
 			return ok
 		lookup = lookups[lookupIndex]
 
+	promoteLookup(overflowRecord.tableType, lookup, extType)
+	ok = 1
+	return ok
+
+def promoteLookup(tableType, lookup, extType):
+	""" Turn lookup into an Extension lookup, wrapping each of its subtables
+	in an Extension subtable of type extType.
+	"""
 	lookup.LookupType = extType
+	extSubTableClass = lookupTypes[tableType][extType]
 	for si in range(len(lookup.SubTable)):
 		subTable = lookup.SubTable[si]
-		extSubTableClass = lookupTypes[overflowRecord.tableType][extType]
 		extSubTable = extSubTableClass()
 		extSubTable.Format = 1
 		extSubTable.ExtSubTable = subTable
 		lookup.SubTable[si] = extSubTable
-	ok = 1
-	return ok
 
 def splitAlternateSubst(oldSubTable, newSubTable, overflowRecord):
 	ok = 1
@@ -895,7 +901,6 @@ def fixSubTableOverFlows(ttf, overflowRecord):
 	"""
 	An offset has overflowed within a sub-table. We need to divide this subtable into smaller parts.
 	"""
-	ok = 0
 	table = ttf[overflowRecord.tableType].table
 	lookup = table.LookupList.Lookup[overflowRecord.LookupListIndex]
 	subIndex = overflowRecord.SubTableIndex
@@ -906,38 +911,168 @@ def fixSubTableOverFlows(ttf, overflowRecord):
 		subtable.DontShare = True
 		return True
 
-	if hasattr(subtable, 'ExtSubTable'):
+	return splitSubTable(overflowRecord.tableType, lookup, subIndex, overflowRecord)
+
+def splitSubTable(tableType, lookup, subIndex, overflowRecord):
+	""" Split lookup.SubTable[subIndex] in two, inserting the new part right
+	after it.  Returns true if the subtable could be split.
+	"""
+	ok = 0
+	subtable = lookup.SubTable[subIndex]
+	isExtension = hasattr(subtable, 'ExtSubTable')
+	if isExtension:
 		# We split the subtable of the Extension table, and add a new Extension table
 		# to contain the new subtable.
 
 		subTableType = subtable.ExtSubTable.__class__.LookupType
 		extSubTable = subtable
 		subtable = extSubTable.ExtSubTable
-		newExtSubTableClass = lookupTypes[overflowRecord.tableType][extSubTable.__class__.LookupType]
-		newExtSubTable = newExtSubTableClass()
-		newExtSubTable.Format = extSubTable.Format
-		lookup.SubTable.insert(subIndex + 1, newExtSubTable)
-
-		newSubTableClass = lookupTypes[overflowRecord.tableType][subTableType]
-		newSubTable = newSubTableClass()
-		newExtSubTable.ExtSubTable = newSubTable
 	else:
 		subTableType = subtable.__class__.LookupType
-		newSubTableClass = lookupTypes[overflowRecord.tableType][subTableType]
-		newSubTable = newSubTableClass()
-		lookup.SubTable.insert(subIndex + 1, newSubTable)
-
-	if hasattr(lookup, 'SubTableCount'): # may not be defined yet.
-		lookup.SubTableCount = lookup.SubTableCount + 1
 
 	try:
-		splitFunc = splitTable[overflowRecord.tableType][subTableType]
+		splitFunc = splitTable[tableType][subTableType]
 	except KeyError:
 		return ok
 
+	newSubTableClass = lookupTypes[tableType][subTableType]
+	newSubTable = newSubTableClass()
 	ok = splitFunc(subtable, newSubTable, overflowRecord)
+	if not ok:
+		return ok
+
+	if isExtension:
+		newExtSubTableClass = lookupTypes[tableType][extSubTable.__class__.LookupType]
+		newExtSubTable = newExtSubTableClass()
+		newExtSubTable.Format = extSubTable.Format
+		newExtSubTable.ExtSubTable = newSubTable
+		newSubTable = newExtSubTable
+	lookup.SubTable.insert(subIndex + 1, newSubTable)
+
+	if hasattr(lookup, 'SubTableCount'): # may not be defined yet.
+		lookup.SubTableCount = lookup.SubTableCount + 1
+
 	return ok
 
+def fixOverFlows(ttf, tableType, overflowRecords, getSubTableLength):
+	""" Fix all the overflows found while compiling the GSUB/GPOS table at once,
+	instead of fixing one and compiling the whole table again to find the next.
+
+	getSubTableLength(subTable) returns the compiled length of a lookup
+	subtable (not an Extension subtable) with all the tables below it, as
+	laid out by the compile that found the overflows.  It is used to:
+		- split an overflowing subtable into as many parts as needed for
+		each of them to fit in 64K, instead of halving it once per compile;
+		- promote just enough lookups to Extension lookups to bring
+		the offsets from the LookupList to the following lookups back
+		under 64K, picking the largest lookups first.
+
+	Returns the number of fixes applied, and the list of subtables that were
+	modified (and need to be compiled again).
+	"""
+	lookups = ttf[tableType].table.LookupList.Lookup
+	extType = 7 if tableType == 'GSUB' else 9
+	extClass = lookupTypes[tableType][extType]
+
+	def isExtension(lookup):
+		return (lookup is not None and bool(lookup.SubTable) and
+			isinstance(lookup.SubTable[0], extClass))
+
+	subTableRecords = {}
+	lookupOffsets = {}
+	promote = set()
+	for record in overflowRecords:
+		lookupIndex = record.LookupListIndex
+		if lookupIndex is None:
+			continue
+		if record.itemName is not None:
+			subTableRecords.setdefault((lookupIndex, record.SubTableIndex), record)
+		elif record.SubTableIndex is not None:
+			# The offset from a lookup to its subtable overflowed.
+			if not isExtension(lookups[lookupIndex]):
+				promote.add(lookupIndex)
+		else:
+			# The offset from the LookupList to a lookup overflowed.
+			lookupOffsets[lookupIndex] = max(record.offset, lookupOffsets.get(lookupIndex, 0))
+
+	fixes = 0
+	modified = []
+
+	# Bytes moved out of the way by promoting each lookup. Measured before
+	# any subtable is split, as the lengths are those of the last compile.
+	savings = {}
+	if lookupOffsets:
+		for lookupIndex, lookup in enumerate(lookups):
+			# The subsetter leaves None in place of the lookups it drops.
+			if lookup is None or isExtension(lookup):
+				continue
+			savings[lookupIndex] = sum(getSubTableLength(subTable) - 8
+			                           for subTable in lookup.SubTable)
+
+	# Promote lookups until the offsets to all the lookups following
+	# them in the LookupList fit.
+	for lookupIndex in sorted(lookupOffsets):
+		excess = lookupOffsets[lookupIndex] - 0xFFFF
+		excess -= sum(savings[i] for i in promote if i < lookupIndex and i in savings)
+		while excess > 0:
+			candidates = [i for i in savings if i < lookupIndex and i not in promote]
+			if not candidates:
+				break
+			i = max(candidates, key=lambda i: (savings[i], i))
+			promote.add(i)
+			excess -= savings[i]
+
+	for lookupIndex in sorted(promote):
+		promoteLookup(tableType, lookups[lookupIndex], extType)
+		fixes += 1
+
+	deferSmall = fixes > 0
+
+	# Split the subtables, last ones first, so that the inserted subtables
+	# don't shift the indices of those not fixed yet.
+	for lookupIndex, subIndex in sorted(subTableRecords, reverse=True):
+		record = subTableRecords[lookupIndex, subIndex]
+		lookup = lookups[lookupIndex]
+		subTable = lookup.SubTable[subIndex]
+		modified.append(subTable)
+		if hasattr(subTable, 'ExtSubTable'):
+			modified.append(subTable.ExtSubTable)
+			length = getSubTableLength(subTable.ExtSubTable)
+		else:
+			length = getSubTableLength(subTable)
+
+		# Overflows within a small subtable may just be due to where
+		# the tables it shares with others land; wait until the
+		# lookups are promoted and see.
+		if deferSmall and length <= 0xFFFF:
+			continue
+
+		# First, try not sharing anything for this subtable, which may
+		# be enough if the subtable itself is small enough.
+		if not hasattr(subTable, "DontShare"):
+			subTable.DontShare = True
+			fixes += 1
+			if length <= 0xFFFF:
+				continue
+
+		# Halve all the parts again until each should fit.
+		depth = 1
+		while (length >> depth) > 0xFFFF:
+			depth += 1
+		count = 1
+		for _ in range(depth):
+			for i in reversed(range(subIndex, subIndex + count)):
+				modified.append(lookup.SubTable[i])
+				if hasattr(lookup.SubTable[i], 'ExtSubTable'):
+					modified.append(lookup.SubTable[i].ExtSubTable)
+				if splitSubTable(tableType, lookup, i, record):
+					fixes += 1
+					count += 1
+			# Past the first split, cut the parts in the middle.
+			record = OverflowErrorRecord((tableType, lookupIndex, None, 'Coverage', None))
+
+	return fixes, modified
+
 # End of OverFlow logic
 
 
@@ -13,6 +13,10 @@ from fontTools.ttLib.sfnt import (SFNTReader, SFNTWriter, DirectoryEntry,
 	WOFFFlavorData, sfntDirectoryFormat, sfntDirectorySize, SFNTDirectoryEntry,
 	sfntDirectoryEntrySize, calcChecksum)
 from fontTools.ttLib.tables import ttProgram
+from fontTools.ttLib.tables._g_l_y_f import (flagOnCurve, flagXShort,
+	flagYShort, flagRepeat, flagXsame, flagYsame, ARG_1_AND_2_ARE_WORDS,
+	WE_HAVE_A_SCALE, WE_HAVE_AN_X_AND_Y_SCALE, WE_HAVE_A_TWO_BY_TWO,
+	WE_HAVE_INSTRUCTIONS, MORE_COMPONENTS)
 import logging
 
 
@@ -62,12 +66,10 @@ class WOFF2Reader(SFNTReader):
 
 		totalUncompressedSize = offset
 		compressedData = self.file.read(self.totalCompressedSize)
-		decompressedData = brotli.decompress(compressedData)
-		if len(decompressedData) != totalUncompressedSize:
-			raise TTLibError(
-				'unexpected size for decompressed font data: expected %d, found %d'
-				% (totalUncompressedSize, len(decompressedData)))
-		self.transformBuffer = BytesIO(decompressedData)
+		# the font data is only decompressed as far as needed to read the
+		# requested tables
+		self.transformBuffer = WOFF2TransformBuffer(
+			compressedData, totalUncompressedSize)
 
 		self.file.seek(0, 2)
 		if self.length != self.file.tell():
@@ -75,8 +77,9 @@ class WOFF2Reader(SFNTReader):
 
 		self.flavorData = WOFF2FlavorData(self)
 
-		# make empty TTFont to store data while reconstructing tables
-		self.ttFont = TTFont(recalcBBoxes=False, recalcTimestamp=False)
+	def mapFile(self):
+		# the compressed font data was read in __init__
+		return False
 
 	def __getitem__(self, tag):
 		"""Fetch the raw table data. Reconstruct transformed tables."""
@@ -108,21 +111,34 @@ class WOFF2Reader(SFNTReader):
 		""" Return recostructed glyf table data, and set the corresponding loca's
 		locations. Optionally pad glyph offsets to the specified number of bytes.
 		"""
-		self.ttFont['loca'] = WOFF2LocaTable()
-		glyfTable = self.ttFont['glyf'] = WOFF2GlyfTable()
-		glyfTable.reconstruct(data, self.ttFont)
-		if padding:
-			glyfTable.padding = padding
-		data = glyfTable.compile(self.ttFont)
-		return data
+		glyphs, self.indexFormat = reconstructGlyphs(data)
+		padding = padding or getTableClass('glyf').padding
+		# same padding rules as table__g_l_y_f.compile
+		if padding > 1:
+			glyphs = [pad(glyphData, size=padding) for glyphData in glyphs]
+		locations = [0]
+		for glyphData in glyphs:
+			locations.append(locations[-1] + len(glyphData))
+		currentLocation = locations[-1]
+		if padding == 1 and currentLocation < 0x20000:
+			# See if we can pad any odd-lengthed glyphs to allow loca
+			# table to use the short offsets.
+			indices = [i for i, glyphData in enumerate(glyphs) if len(glyphData) % 2 == 1]
+			if indices and currentLocation + len(indices) < 0x20000:
+				for i in indices:
+					glyphs[i] += b'\0'
+				locations = [0]
+				for glyphData in glyphs:
+					locations.append(locations[-1] + len(glyphData))
+		self.locations = locations
+		return bytesjoin(glyphs)
 
 	def _reconstructLoca(self):
 		""" Return reconstructed loca table data. """
-		if 'loca' not in self.ttFont:
+		if not hasattr(self, 'locations'):
 			# make sure glyf is reconstructed first
 			self.tables['glyf'].data = self.reconstructTable('glyf')
-		locaTable = self.ttFont['loca']
-		data = locaTable.compile(self.ttFont)
+		data = packLocations(self.locations, self.indexFormat)
 		if len(data) != self.tables['loca'].origLength:
 			raise TTLibError(
 				"reconstructed 'loca' table doesn't match original size: "
@@ -131,6 +147,74 @@ class WOFF2Reader(SFNTReader):
 		return data
 
 
+class WOFF2TransformBuffer(object):
+	"""Read-only file-like object for the Brotli-compressed font data of a
+	WOFF2 file. The data is decompressed incrementally, and only as far as
+	the furthest byte read so far.
+	"""
+
+	# number of compressed bytes fed to the decompressor at a time
+	chunkSize = 0x10000
+
+	def __init__(self, compressedData, size):
+		self.compressedData = compressedData
+		self.size = size
+		self.data = bytearray()
+		self.pos = 0
+		self.inputPos = 0
+		decompressor = getattr(brotli, 'Decompressor', None)
+		if decompressor is not None and hasattr(decompressor, 'process'):
+			self.decompressor = decompressor()
+		else:
+			# no streaming API: decompress everything at once
+			self.decompressor = None
+			self.data += brotli.decompress(compressedData)
+			self._checkSize()
+
+	def _checkSize(self):
+		if len(self.data) != self.size:
+			raise TTLibError(
+				'unexpected size for decompressed font data: expected %d, found %d'
+				% (self.size, len(self.data)))
+
+	def _decompress(self, end):
+		"""Decompress the font data up to offset 'end'."""
+		decompressor = self.decompressor
+		while decompressor is not None and len(self.data) < end:
+			chunk = self.compressedData[self.inputPos:self.inputPos + self.chunkSize]
+			self.inputPos += len(chunk)
+			if chunk:
+				self.data += decompressor.process(chunk)
+			if len(self.data) > self.size:
+				self._checkSize()
+			if self.inputPos >= len(self.compressedData):
+				if not decompressor.is_finished():
+					raise TTLibError("incomplete compressed font data")
+				self.decompressor = decompressor = None
+				self._checkSize()
+
+	def seek(self, pos, whence=0):
+		if whence == 1:
+			pos += self.pos
+		elif whence == 2:
+			pos += self.size
+		self.pos = max(0, pos)
+
+	def tell(self):
+		return self.pos
+
+	def read(self, n=-1):
+		end = self.size if n is None or n < 0 else min(self.pos + n, self.size)
+		self._decompress(end)
+		data = bytes(self.data[self.pos:end])
+		self.pos = max(self.pos, end)
+		return data
+
+	def getvalue(self):
+		self._decompress(self.size)
+		return bytes(self.data)
+
+
 class WOFF2Writer(SFNTWriter):
 
 	flavor = "woff2"
@@ -175,7 +259,9 @@ class WOFF2Writer(SFNTWriter):
 		entry.tag = Tag(tag)
 		entry.flags = getKnownTagIndex(entry.tag)
 		# WOFF2 table data are written to disk only on close(), after all tags
-		# have been specified
+		# have been specified; the data may be a view on a mapped input file
+		if isinstance(data, memoryview):
+			data = data.tobytes()
 		entry.data = data
 
 		self.tables[tag] = entry
@@ -564,33 +650,34 @@ class WOFF2LocaTable(getTableClass('loca')):
 		self.tableTag = Tag(tag or 'loca')
 
 	def compile(self, ttFont):
-		try:
-			max_location = max(self.locations)
-		except AttributeError:
+		if not hasattr(self, 'locations'):
 			self.set([])
-			max_location = 0
 		if 'glyf' in ttFont and hasattr(ttFont['glyf'], 'indexFormat'):
 			# copile loca using the indexFormat specified in the WOFF2 glyf table
-			indexFormat = ttFont['glyf'].indexFormat
-			if indexFormat == 0:
-				if max_location >= 0x20000:
-					raise TTLibError("indexFormat is 0 but local offsets > 0x20000")
-				if not all(l % 2 == 0 for l in self.locations):
-					raise TTLibError("indexFormat is 0 but local offsets not multiples of 2")
-				locations = array.array("H")
-				for i in range(len(self.locations)):
-					locations.append(self.locations[i] // 2)
-			else:
-				locations = array.array("I", self.locations)
-			if sys.byteorder != "big":
-				locations.byteswap()
-			data = locations.tostring()
+			data = packLocations(self.locations, ttFont['glyf'].indexFormat)
 		else:
 			# use the most compact indexFormat given the current glyph offsets
 			data = super(WOFF2LocaTable, self).compile(ttFont)
 		return data
 
 
+def packLocations(locations, indexFormat):
+	""" Return 'loca' table data for the glyph 'locations', using the given
+	'indexFormat'.
+	"""
+	if indexFormat == 0:
+		if locations and max(locations) >= 0x20000:
+			raise TTLibError("indexFormat is 0 but local offsets > 0x20000")
+		if not all(l % 2 == 0 for l in locations):
+			raise TTLibError("indexFormat is 0 but local offsets not multiples of 2")
+		locations = array.array("H", [l // 2 for l in locations])
+	else:
+		locations = array.array("I", locations)
+	if sys.byteorder != "big":
+		locations.byteswap()
+	return locations.tostring()
+
+
 class WOFF2GlyfTable(getTableClass('glyf')):
 	"""Decoder/Encoder for WOFF2 'glyf' table transform."""
 
@@ -911,6 +998,230 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 		self.glyphStream += triplets.tostring()
 
 
+def reconstructGlyphs(data):
+	""" Decode transformed 'glyf' data, and return a tuple containing the list
+	of unpadded glyph data strings, and the indexFormat of the 'loca' table.
+
+	Unlike WOFF2GlyfTable.reconstruct, this writes the glyph data straight from
+	the transformed streams, without building Glyph objects. Simple glyphs are
+	encoded like Glyph.compileDeltasGreedy does; composite glyph records are
+	copied from the composite stream as is.
+	"""
+	inputDataSize = len(data)
+	if inputDataSize < woff2GlyfTableFormatSize:
+		raise TTLibError("not enough 'glyf' data")
+	header = sstruct.unpack(woff2GlyfTableFormat, data[:woff2GlyfTableFormatSize])
+	numGlyphs = header['numGlyphs']
+
+	# absolute start and end offsets of each stream
+	starts = {}
+	ends = {}
+	offset = woff2GlyfTableFormatSize
+	for stream in WOFF2GlyfTable.subStreams:
+		starts[stream] = offset
+		offset += header[stream + 'Size']
+		ends[stream] = offset
+	if offset != inputDataSize:
+		raise TTLibError(
+			"incorrect size of transformed 'glyf' table: expected %d, received %d bytes"
+			% (offset, inputDataSize))
+
+	data = bytearray(data)
+	start = starts['nContourStream']
+	if ends['nContourStream'] - start != 2 * numGlyphs:
+		raise TTLibError("incorrect size of 'nContourStream'")
+	nContours = array.array("h", bytes(data[start:start + 2 * numGlyphs]))
+	if sys.byteorder != "big":
+		nContours.byteswap()
+
+	bboxBitmapPos = starts['bboxStream']
+	bboxPos = bboxBitmapPos + (((numGlyphs + 31) >> 5) << 2)
+	nPointsPos = starts['nPointsStream']
+	flagPos = starts['flagStream']
+	glyphPos = starts['glyphStream']
+	compositePos = starts['compositeStream']
+	instructionPos = starts['instructionStream']
+	flagEnd = ends['flagStream']
+	glyphEnd = ends['glyphStream']
+	compositeEnd = ends['compositeStream']
+	instructionEnd = ends['instructionStream']
+
+	glyphs = []
+	for glyphID in range(numGlyphs):
+		numberOfContours = nContours[glyphID]
+		if numberOfContours == 0:
+			glyphs.append(b"")
+			continue
+		glyphData = []
+		if numberOfContours > 0:
+			endPtsOfContours = []
+			endPoint = -1
+			for i in range(numberOfContours):
+				ptsOfContour, nPointsPos = _read255UShort(data, nPointsPos)
+				endPoint += ptsOfContour
+				endPtsOfContours.append(endPoint)
+			nPoints = endPoint + 1
+			if flagPos + nPoints > flagEnd:
+				raise TTLibError("not enough 'flagStream' data")
+			flags = bytearray()
+			xData = bytearray()
+			yData = bytearray()
+			x = y = 0
+			xMin = yMin = 0x7fffffff
+			xMax = yMax = -0x7fffffff
+			lastFlag = None
+			repeat = 0
+			for i in range(nPoints):
+				flag = data[flagPos + i]
+				outFlag = 0 if flag & 0x80 else flagOnCurve
+				flag &= 0x7f
+				if flag < 84:
+					nBytes = 1
+				elif flag < 120:
+					nBytes = 2
+				elif flag < 124:
+					nBytes = 3
+				else:
+					nBytes = 4
+				if glyphPos + nBytes > glyphEnd:
+					raise TTLibError("not enough 'glyphStream' data")
+				if flag < 10:
+					dx = 0
+					dy = ((flag & 14) << 7) + data[glyphPos]
+					if not flag & 1:
+						dy = -dy
+				elif flag < 20:
+					dx = (((flag - 10) & 14) << 7) + data[glyphPos]
+					if not flag & 1:
+						dx = -dx
+					dy = 0
+				else:
+					if flag < 84:
+						b0 = flag - 20
+						b1 = data[glyphPos]
+						dx = 1 + (b0 & 0x30) + (b1 >> 4)
+						dy = 1 + ((b0 & 0x0c) << 2) + (b1 & 0x0f)
+					elif flag < 120:
+						b0 = flag - 84
+						dx = 1 + ((b0 // 12) << 8) + data[glyphPos]
+						dy = 1 + (((b0 % 12) >> 2) << 8) + data[glyphPos + 1]
+					elif flag < 124:
+						b2 = data[glyphPos + 1]
+						dx = (data[glyphPos] << 4) + (b2 >> 4)
+						dy = ((b2 & 0x0f) << 8) + data[glyphPos + 2]
+					else:
+						dx = (data[glyphPos] << 8) + data[glyphPos + 1]
+						dy = (data[glyphPos + 2] << 8) + data[glyphPos + 3]
+					if not flag & 1:
+						dx = -dx
+					if not flag & 2:
+						dy = -dy
+				glyphPos += nBytes
+				x += dx
+				y += dy
+				if x < xMin:
+					xMin = x
+				if x > xMax:
+					xMax = x
+				if y < yMin:
+					yMin = y
+				if y > yMax:
+					yMax = y
+				if dx == 0:
+					outFlag |= flagXsame
+				elif -255 <= dx <= 255:
+					outFlag |= flagXShort
+					if dx > 0:
+						outFlag |= flagXsame
+					else:
+						dx = -dx
+					xData.append(dx)
+				else:
+					xData += struct.pack(">h", dx)
+				if dy == 0:
+					outFlag |= flagYsame
+				elif -255 <= dy <= 255:
+					outFlag |= flagYShort
+					if dy > 0:
+						outFlag |= flagYsame
+					else:
+						dy = -dy
+					yData.append(dy)
+				else:
+					yData += struct.pack(">h", dy)
+				if outFlag == lastFlag and repeat != 255:
+					repeat += 1
+					if repeat == 1:
+						flags.append(outFlag)
+					else:
+						flags[-2] = outFlag | flagRepeat
+						flags[-1] = repeat
+				else:
+					repeat = 0
+					flags.append(outFlag)
+				lastFlag = outFlag
+			flagPos += nPoints
+			if nPoints == 0:
+				xMin = yMin = xMax = yMax = 0
+			glyphData.append(struct.pack(">%dh" % numberOfContours, *endPtsOfContours))
+			haveInstructions = True
+		else:
+			start = compositePos
+			more = True
+			haveInstructions = False
+			while more:
+				if compositePos + 4 > compositeEnd:
+					raise TTLibError("not enough 'compositeStream' data")
+				flags = (data[compositePos] << 8) | data[compositePos + 1]
+				compositePos += 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+				if flags & WE_HAVE_A_SCALE:
+					compositePos += 2
+				elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+					compositePos += 4
+				elif flags & WE_HAVE_A_TWO_BY_TWO:
+					compositePos += 8
+				haveInstructions = haveInstructions or bool(flags & WE_HAVE_INSTRUCTIONS)
+				more = flags & MORE_COMPONENTS
+			if compositePos > compositeEnd:
+				raise TTLibError("not enough 'compositeStream' data")
+			glyphData.append(bytes(data[start:compositePos]))
+		if haveInstructions:
+			instructionLength, glyphPos = _read255UShort(data, glyphPos)
+			if instructionPos + instructionLength > instructionEnd:
+				raise TTLibError("not enough 'instructionStream' data")
+			glyphData.append(struct.pack(">h", instructionLength))
+			glyphData.append(bytes(data[instructionPos:instructionPos + instructionLength]))
+			instructionPos += instructionLength
+		if numberOfContours > 0:
+			glyphData.extend((bytes(flags), bytes(xData), bytes(yData)))
+		if data[bboxBitmapPos + (glyphID >> 3)] & (0x80 >> (glyphID & 7)):
+			bbox = bytes(data[bboxPos:bboxPos + 8])
+			bboxPos += 8
+		elif numberOfContours < 0:
+			raise TTLibError('no bbox values for composite glyph %d' % glyphID)
+		else:
+			bbox = struct.pack(">hhhh", xMin, yMin, xMax, yMax)
+		glyphs.append(struct.pack(">h", numberOfContours) + bbox + bytesjoin(glyphData))
+	return glyphs, header['indexFormat']
+
+
+def _read255UShort(data, pos):
+	""" Read a 255UInt16-encoded integer at offset 'pos' of bytearray 'data',
+	and return a tuple containing the decoded integer plus the new offset.
+	"""
+	try:
+		code = data[pos]
+		if code == 253:
+			return (data[pos + 1] << 8) | data[pos + 2], pos + 3
+		elif code == 254:
+			return data[pos + 1] + 506, pos + 2
+		elif code == 255:
+			return data[pos + 1] + 253, pos + 2
+		return code, pos + 1
+	except IndexError:
+		raise TTLibError('not enough data to unpack 255UInt16')
+
+
 class WOFF2FlavorData(WOFFFlavorData):
 
 	Flavor = 'woff2'
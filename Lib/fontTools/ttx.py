@@ -24,6 +24,11 @@ usage: ttx [options] inputfile1 [... inputfileN]
     -q Quiet: No messages will be written to stdout about what
        is being done.
     -a allow virtual glyphs ID's on compile or decompile.
+    -j <number>, --jobs=<number> Process the input files in parallel, using
+       the specified number of processes; 0 means one per CPU. The messages
+       about each file are still written in the order of the input files.
+       Ignored with the -l and -o options. When compiling a single TTX
+       file, its tables are parsed in parallel instead.
 
     Dump options:
     -l List table info: instead of dumping to a TTX file, list some
@@ -92,6 +97,7 @@ from fontTools.misc.cliTools import makeOutputFileName
 import os
 import sys
 import getopt
+import copy
 import re
 import logging
 
@@ -121,6 +127,7 @@ class Options(object):
 	recalcTimestamp = False
 	flavor = None
 	useZopfli = False
+	jobs = 1
 
 	def __init__(self, rawOptions, numFiles):
 		self.onlyTables = []
@@ -177,6 +184,17 @@ class Options(object):
 				self.recalcBBoxes = False
 			elif option == "-a":
 				self.allowVID = True
+			elif option in ("-j", "--jobs"):
+				try:
+					self.jobs = int(value)
+				except ValueError:
+					self.jobs = -1
+				if self.jobs < 0:
+					raise getopt.GetoptError(
+						"The %s option value must be a non-negative integer" % option)
+				if self.jobs == 0:
+					import multiprocessing
+					self.jobs = multiprocessing.cpu_count()
 			elif option == "-e":
 				self.ignoreDecompileErrors = False
 			elif option == "--unicodedata":
@@ -271,7 +289,7 @@ def ttCompile(input, output, options):
 			recalcBBoxes=options.recalcBBoxes,
 			recalcTimestamp=options.recalcTimestamp,
 			allowVID=options.allowVID)
-	ttf.importXML(input)
+	ttf.importXML(input, jobs=options.jobs)
 
 	if not options.recalcTimestamp and 'head' in ttf:
 		# use TTX file modification time for head "modified" timestamp
@@ -318,9 +336,9 @@ def guessFileType(fileName):
 
 
 def parseOptions(args):
-	rawOptions, files = getopt.getopt(args, "ld:o:fvqht:x:sim:z:baey:",
+	rawOptions, files = getopt.getopt(args, "ld:o:fvqht:x:sim:z:baey:j:",
 			['unicodedata=', "recalc-timestamp", 'flavor=', 'version',
-			 'with-zopfli', 'newline='])
+			 'with-zopfli', 'newline=', 'jobs='])
 
 	options = Options(rawOptions, len(files))
 	jobs = []
@@ -359,10 +377,105 @@ def parseOptions(args):
 
 
 def process(jobs, options):
+	if (options.jobs > 1 and len(jobs) > 1 and
+			not options.listTables and not options.outputFile):
+		processParallel(jobs, options)
+		return
 	for action, input, output in jobs:
 		action(input, output, options)
 
 
+# Worker processes are replaced after this many jobs, so that the memory
+# they hold on to after processing a large font doesn't add up.
+MAX_JOBS_PER_PROCESS = 10
+
+
+def processParallel(jobs, options):
+	"""Run the jobs in a pool of options.jobs worker processes.
+
+	The log records of each job are collected in its worker and emitted
+	by this process once the job is done, in the order of the jobs. Unlike
+	process(), a failed job doesn't stop the others: the error is logged,
+	and a TTLibError is raised once all jobs are done.
+	"""
+	import multiprocessing
+	numProcesses = min(options.jobs, len(jobs))
+	log.debug("Processing %d files in %d processes", len(jobs), numProcesses)
+	# the workers log what would be logged here
+	level = logging.getLogger("fontTools").getEffectiveLevel()
+	pool = multiprocessing.Pool(numProcesses, _initWorker, (level,),
+			MAX_JOBS_PER_PROCESS)
+	# the files themselves are processed one process each
+	workerOptions = copy.copy(options)
+	workerOptions.jobs = 1
+	failed = 0
+	try:
+		with Timer(log, "Done processing %d files in %%(time).3f seconds" % len(jobs)):
+			results = pool.imap(_runJob,
+					[(action, input, output, workerOptions) for action, input, output in jobs])
+			for ok, records in results:
+				for record in records:
+					logging.getLogger(record.name).handle(record)
+				if not ok:
+					failed += 1
+		pool.close()
+	except:
+		pool.terminate()
+		raise
+	finally:
+		pool.join()
+	if failed:
+		raise TTLibError("%d out of %d files failed" % (failed, len(jobs)))
+
+
+class _RecordCollector(logging.Handler):
+	"""Log handler of the worker processes, which keeps the records of the
+	current job, ready to be pickled and sent to the parent process."""
+
+	def __init__(self):
+		logging.Handler.__init__(self)
+		self.records = []
+
+	def emit(self, record):
+		# like logging.handlers.QueueHandler, format the message and the
+		# traceback, which may not be picklable
+		record.msg = record.getMessage()
+		record.args = None
+		if record.exc_info:
+			record.exc_text = self.formatter.formatException(record.exc_info)
+			record.exc_info = None
+		self.records.append(record)
+
+
+_collector = None
+
+
+def _initWorker(level):
+	global _collector
+	_collector = _RecordCollector()
+	_collector.setFormatter(logging.Formatter())
+	logger = logging.getLogger("fontTools")
+	logger.handlers = [_collector]
+	logger.setLevel(level)
+	logger.propagate = False
+
+
+def _runJob(job):
+	action, input, output, options = job
+	ok = True
+	try:
+		action(input, output, options)
+	except TTLibError as e:
+		log.error('Processing "%s" failed: %s', input, e)
+		ok = False
+	except Exception:
+		log.exception('Unhandled exception has occurred while processing "%s"', input)
+		ok = False
+	records = _collector.records
+	_collector.records = []
+	return ok, records
+
+
 def waitForKeyPress():
 	"""Force the DOS Prompt window to stay open so the user gets
 	a chance to see what's wrong."""
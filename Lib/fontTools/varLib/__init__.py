@@ -34,6 +34,11 @@ import os.path
 import logging
 from pprint import pformat
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 log = logging.getLogger("fontTools.varLib")
 
 
@@ -202,7 +207,134 @@ def _SetCoordinates(font, glyphName, coord):
 	font["hmtx"].metrics[glyphName] = horizontalAdvanceWidth, leftSideBearing
 
 
+def _can_iup_in_between(delta, coords, i, j, tolerance):
+	"""Return whether the deltas of the points strictly between i and j
+	(i < j - 1; i can be -1 for the last point) are reproduced within
+	tolerance by interpolating those of points i and j."""
+	from fontTools.varLib.mutator import _iup_segment
+	interp = _iup_segment(coords[i+1:j], coords[i], delta[i], coords[j], delta[j])
+	deltas = delta[i+1:j]
+	return all(abs(x - p) <= tolerance >= abs(y - q)
+	           for (x,y),(p,q) in zip(deltas, interp))
+
+def _can_iup_in_between_np(delta, coords, js, i, tolerance):
+	"""Vectorized _can_iup_in_between() for all candidate start points
+	'js' of the span ending at i, with 'delta' and 'coords' as (n, 2)
+	float arrays.  Returns a boolean array.  The arithmetic matches
+	mutator._iup_segment() exactly."""
+	ks = np.arange(js.min() + 1, i)
+	between = ks[None,:] > js[:,None]
+	ok = np.ones(len(js), dtype=bool)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		for a in 0,1:
+			x, d = coords[:,a], delta[:,a]
+			x1, d1 = x[js][:,None], d[js][:,None]
+			x2, d2 = x[i], d[i]
+			swap = x1 > x2
+			lo, hi = np.where(swap, x2, x1), np.where(swap, x1, x2)
+			dlo, dhi = np.where(swap, d2, d1), np.where(swap, d1, d2)
+			scale = (dhi - dlo) / (hi - lo)
+			xk = x[ks][None,:]
+			interp = np.where(xk <= lo, dlo, np.where(xk >= hi, dhi, dlo + (xk - lo) * scale))
+			interp = np.where(x1 == x2, np.where(d1 == d2, d1, 0.), interp)
+			bad = np.abs(d[ks][None,:] - interp) > tolerance
+			ok &= ~(bad & between).any(axis=1)
+	return ok
+
+def _iup_contour_bound_forced_set(delta, coords, tolerance=0.):
+	"""Return the indices of points whose deltas can't be interpolated.
+
+	An interpolated point and its two neighbours (either the reference
+	points or interpolated from the same ones) follow the same monotonic
+	function of the coordinate.  So a point lying strictly between its
+	neighbours on an axis needs a delta between theirs, give or take the
+	tolerance of both.  The exception is a span whose references share
+	the coordinate, which interpolates everything to a constant; the
+	neighbours are then either interpolated too, or both references with
+	equal coordinates, which the strict test leaves out.  Forcing a point
+	wrongly would cost optimality, not correctness, since every
+	interpolated span is checked anyway."""
+	n = len(delta)
+	forced = set()
+	for i in range(n):
+		lc, ld = coords[i-1], delta[i-1]
+		nc, nd = coords[(i+1) % n], delta[(i+1) % n]
+		c, d = coords[i], delta[i]
+		for j in 0,1:
+			if min(lc[j], nc[j]) < c[j] < max(lc[j], nc[j]):
+				if not (min(ld[j], nd[j]) - 2*tolerance <= d[j] <=
+				        max(ld[j], nd[j]) + 2*tolerance):
+					forced.add(i)
+					break
+	return forced
+
+# Below this many point/candidate pairs, checking the spans one by one
+# beats setting up the NumPy arrays.
+_NP_MIN_CHECK = 256
+
+def _iup_contour_optimize_dp(delta, coords, forced, tolerance=0., lookback=None):
+	"""For each point i, find the fewest explicit points among 0..i, with
+	point i explicit and every point in between interpolated within
+	tolerance.  Point -1, the last one, is taken as explicit for free.
+	Spans reach back at most lookback points; a span of a whole contour
+	starts and ends at the same point, its only explicit one.
+
+	Returns (chain, costs): costs[i] is that number of points, and
+	chain[i] the previous explicit point in the solution."""
+	n = len(delta)
+	if lookback is None:
+		lookback = n + 1
+	if np is not None:
+		npDelta = np.array(delta, dtype=np.float64).reshape(-1, 2)
+		npCoords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+	costs = {-1: 0}
+	chain = {-1: None}
+	for i in range(n):
+		best_cost = costs[i-1] + 1
+		costs[i] = best_cost
+		chain[i] = i-1
+		if i-1 in forced:
+			continue
+		# Candidate start points, from nearest to farthest; a span can't
+		# go past a forced point.
+		js = []
+		for j in range(i-2, max(i-lookback, -2), -1):
+			if costs[j] + 1 < best_cost:
+				js.append(j)
+			if j in forced:
+				break
+		if not js:
+			continue
+		if np is not None and len(js) * (i - js[-1]) >= _NP_MIN_CHECK:
+			ok = _can_iup_in_between_np(npDelta, npCoords, np.array(js), i, tolerance)
+			for j,jOk in zip(js, ok):
+				cost = costs[j] + 1
+				if jOk and cost < best_cost:
+					costs[i] = best_cost = cost
+					chain[i] = j
+		else:
+			for j in js:
+				cost = costs[j] + 1
+				if cost < best_cost and _can_iup_in_between(delta, coords, j, i, tolerance):
+					costs[i] = best_cost = cost
+					chain[i] = j
+	return chain, costs
+
+def _rot_list(l, k):
+	"""Rotate list by k items forward.  Ie. item at position 0 will be
+	at position k in returned list.  Negative k is allowed."""
+	n = len(l)
+	k %= n
+	if not k: return l
+	return l[n-k:] + l[:n-k]
+
 def _optimize_contour(delta, coords, tolerance=0.):
+	"""Return the contour's deltas with some replaced by None, such that
+	mutator._iup_contour() still reproduces all of them within tolerance.
+
+	When some point has to be explicit, the fewest possible points are
+	left explicit.  Otherwise the contour is solved as a cycle, which
+	can leave a point or two more than necessary."""
 	n = len(delta)
 	if all(abs(x) <= tolerance >= abs(y) for x,y in delta):
 		return [None] * n
@@ -212,9 +344,48 @@ def _optimize_contour(delta, coords, tolerance=0.):
 	if all(d0 == d for d in delta):
 		return [d0] + [None] * (n-1)
 
-	# TODO
+	delta = list(delta)
+	coords = list(coords)
+	forced = _iup_contour_bound_forced_set(delta, coords, tolerance)
+	if len(forced) == n:
+		return delta
 
-	return delta
+	if forced:
+		# Rotate the contour so that its last point is forced: it is
+		# explicit in any solution, which breaks the cycle.
+		k = (n-1) - max(forced)
+		delta = _rot_list(delta, k)
+		coords = _rot_list(coords, k)
+		forced = {(i + k) % n for i in forced}
+		chain, costs = _iup_contour_optimize_dp(delta, coords, forced, tolerance)
+		solution = set()
+		i = n - 1
+		while i != -1:
+			solution.add(i)
+			i = chain[i]
+		assert forced <= solution
+		delta = [delta[i] if i in solution else None for i in range(n)]
+		return _rot_list(delta, -k)
+
+	# No point has to be explicit.  Solve the contour repeated twice, and
+	# among the chains that come around to their start point after one
+	# turn, pick the cheapest.
+	chain, costs = _iup_contour_optimize_dp(delta + delta, coords + coords,
+	                                        forced, tolerance, lookback=n+1)
+	best_solution, best_cost = None, n + 1
+	for start in range(n-1, 2*n-1):
+		solution = set()
+		i = start
+		while i > start - n:
+			solution.add(i % n)
+			i = chain[i]
+		if i == start - n:
+			cost = costs[start] - costs[start - n]
+			if cost <= best_cost:
+				best_solution, best_cost = solution, cost
+	if best_solution is None:
+		return delta
+	return [delta[i] if i in best_solution else None for i in range(n)]
 
 def _optimize_delta(delta, coords, ends, tolerance=0.):
 	assert sorted(ends) == ends and len(coords) == (ends[-1]+1 if ends else 0) + 4
@@ -269,16 +440,11 @@ def _add_gvar(font, model, master_ttfs, tolerance=.5, optimize=True):
 				delta_opt = _optimize_delta(delta, origCoords, endPts, tolerance=tolerance)
 
 				if None in delta_opt:
-					# Use "optimized" version only if smaller...
+					# Use "optimized" version only if smaller; the tuple
+					# headers are the same, only the point numbers and
+					# deltas differ.
 					var_opt = TupleVariation(support, delta_opt)
-
-					axis_tags = sorted(support.keys()) # Shouldn't matter that this is different from fvar...?
-					tupleData, auxData = var.compile(axis_tags, [], None)
-					unoptimized_len = len(tupleData) + len(auxData)
-					tupleData, auxData = var_opt.compile(axis_tags, [], None)
-					optimized_len = len(tupleData) + len(auxData)
-
-					if optimized_len < unoptimized_len:
+					if var_opt.getDataSize() < var.getDataSize():
 						var = var_opt
 
 			gvar.variations[glyph].append(var)
@@ -592,13 +758,16 @@ def load_designspace(designspace_filename):
 	return axes, internal_axis_supports, base_idx, normalized_master_locs, masters, instances
 
 
-def build(designspace_filename, master_finder=lambda s:s):
+def build(designspace_filename, master_finder=lambda s:s, useSharedPoints=True):
 	"""
 	Build variation font from a designspace file.
 
 	If master_finder is set, it should be a callable that takes master
 	filename as found in designspace file and map it to master font
 	binary as to be opened (eg. .ttf or .otf).
+
+	If useSharedPoints is False, the gvar tuples each carry their own
+	point numbers, for the sake of macOS 10.9 to 10.12.
 	"""
 
 	axes, internal_axis_supports, base_idx, normalized_master_locs, masters, instances = load_designspace(designspace_filename)
@@ -629,6 +798,7 @@ def build(designspace_filename, master_finder=lambda s:s):
 	_add_MVAR(vf, model, master_fonts, axisTags)
 	if 'glyf' in vf:
 		_add_gvar(vf, model, master_fonts)
+		vf['gvar'].useSharedPoints = useSharedPoints
 	_add_HVAR(vf, model, master_fonts, axisTags)
 	_merge_OTL(vf, model, master_fonts, axisTags)
 
@@ -641,6 +811,9 @@ def main(args=None):
 
 	parser = ArgumentParser(prog='varLib')
 	parser.add_argument('designspace')
+	parser.add_argument('--no-shared-points', dest='useSharedPoints',
+	                    action='store_false',
+	                    help="don't share point numbers between gvar tuples")
 	options = parser.parse_args(args)
 
 	# TODO: allow user to configure logging via command-line options
@@ -650,7 +823,8 @@ def main(args=None):
 	finder = lambda s: s.replace('master_ufo', 'master_ttf_interpolatable').replace('.ufo', '.ttf')
 	outfile = os.path.splitext(designspace_filename)[0] + '-VF.ttf'
 
-	vf, model, master_ttfs = build(designspace_filename, finder)
+	vf, model, master_ttfs = build(designspace_filename, finder,
+	                               useSharedPoints=options.useSharedPoints)
 
 	log.info("Saving variation font %s", outfile)
 	vf.save(outfile)
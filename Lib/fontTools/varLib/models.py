@@ -2,7 +2,8 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 
-__all__ = ['normalizeValue', 'normalizeLocation', 'supportScalar', 'VariationModel']
+__all__ = ['normalizeValue', 'normalizeLocation', 'piecewiseLinearMap',
+           'supportScalar', 'VariationModel']
 
 def normalizeValue(v, triple):
 	"""Normalizes value based on a min/default/max triple.
@@ -68,6 +69,39 @@ def normalizeLocation(location, axes):
 		out[tag] = normalizeValue(v, triple)
 	return out
 
+def piecewiseLinearMap(v, mapping):
+	"""Maps value through the piecewise linear function defined by mapping,
+	a dict of from -> to values, such as the segment maps of an 'avar' table.
+	>>> mapping = {-1.0: -1.0, 0.0: 0.0, 0.5: 0.8, 1.0: 1.0}
+	>>> piecewiseLinearMap(0.5, mapping)
+	0.8
+	>>> piecewiseLinearMap(0.25, mapping)
+	0.4
+	>>> piecewiseLinearMap(0.75, mapping)
+	0.9
+	>>> piecewiseLinearMap(-0.5, mapping)
+	-0.5
+	>>> piecewiseLinearMap(0.5, {})
+	0.5
+	"""
+	keys = mapping.keys()
+	if not keys:
+		return v
+	if v in keys:
+		return mapping[v]
+	k = min(keys)
+	if v < k:
+		return v + mapping[k] - k
+	k = max(keys)
+	if v > k:
+		return v + mapping[k] - k
+	# Interpolate
+	a = max(k for k in keys if k < v)
+	b = min(k for k in keys if k > v)
+	va = mapping[a]
+	vb = mapping[b]
+	return va + (vb - va) * (v - a) / (b - a)
+
 def supportScalar(location, support):
 	"""Returns the scalar multiplier at location, for a master
 	with support.
@@ -5,12 +5,28 @@ $ python mutator.py ./NotoSansArabic-VF.ttf wght=140 wdth=85
 """
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
+from fontTools.cffLib import privateDictOperators2
+from fontTools.misc.psCharStrings import (
+	T2CharString, SimpleT2Decompiler, calcSubrBias)
 from fontTools.ttLib import TTFont
 from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
 from fontTools.varLib import _GetCoordinates, _SetCoordinates
-from fontTools.varLib.models import VariationModel, supportScalar, normalizeLocation
+from fontTools.varLib.models import (
+	VariationModel, supportScalar, normalizeLocation, piecewiseLinearMap)
+from copy import deepcopy
+import array
+import logging
+import math
 import os.path
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+log = logging.getLogger("fontTools.varLib.mutator")
+
 
 def _iup_segment(coords, rc1, rd1, rc2, rd2):
 	# rc1 = reference coord 1
@@ -99,6 +115,657 @@ def _iup_delta(delta, coords, ends):
 	return out
 
 
+def _iup_delta_np(delta, explicit, coords, ends):
+	"""NumPy version of _iup_delta().
+
+	'delta' and 'coords' are (n, 2) float arrays, 'explicit' is a boolean
+	array marking the points whose delta is given; the other rows of
+	'delta' are ignored.  Returns a new (n, 2) array of inferred deltas.
+	The arithmetic matches _iup_segment() exactly.
+	"""
+	n = len(coords)
+	assert sorted(ends) == ends and n == (ends[-1]+1 if ends else 0) + 4
+	if explicit.all():
+		return delta.copy()
+	out = np.zeros((n, 2))
+	indices = np.flatnonzero(explicit)
+	if not len(indices):
+		return out
+
+	ends = np.array(ends + [n-4, n-3, n-2, n-1])
+	starts = np.concatenate(([0], ends[:-1] + 1))
+	contour = np.repeat(np.arange(len(ends)), ends - starts + 1)
+	# Positions (into 'indices') of each contour's first and last explicit point
+	first = np.searchsorted(indices, starts, 'left')[contour]
+	last = (np.searchsorted(indices, ends, 'right') - 1)[contour]
+	hasExplicit = first <= last
+	points = np.arange(n)
+	# Nearest explicit point before and after each point, wrapping around
+	# within the point's contour.
+	prev = np.searchsorted(indices, points, 'right') - 1
+	prev = np.where(prev < first, last, prev)
+	next = np.searchsorted(indices, points, 'left')
+	next = np.where(next > last, first, next)
+	prev = indices[np.clip(prev, 0, len(indices) - 1)]
+	next = indices[np.clip(next, 0, len(indices) - 1)]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		for j in 0,1:
+			x = coords[:,j]
+			x1, x2, d1, d2 = x[prev], x[next], delta[prev,j], delta[next,j]
+			swap = x1 > x2
+			x1, x2 = np.where(swap, x2, x1), np.where(swap, x1, x2)
+			d1, d2 = np.where(swap, d2, d1), np.where(swap, d1, d2)
+			scale = (d2 - d1) / (x2 - x1)
+			d = np.where(x <= x1, d1, np.where(x >= x2, d2, d1 + (x - x1) * scale))
+			d = np.where(x1 == x2, np.where(d1 == d2, d1, 0), d)
+			out[:,j] = np.where(hasExplicit, d, 0)
+	out[explicit] = delta[explicit]
+	return out
+
+
+class GvarInstancer(object):
+	"""Batched engine to apply 'gvar' deltas at arbitrary locations.
+
+	For each glyph, the deltas of a tuple variation are inferred (IUP) the
+	first time its region applies at a location, and stored as one
+	contiguous row.  Since IUP is linear, instancing at a location then
+	only needs one scalar per distinct region, and a weighted sum of those
+	rows per glyph.  Regions are shared by most glyphs, so their scalars
+	are computed only once per location.
+
+	Uses NumPy if available, and falls back to 'array' otherwise.
+	"""
+
+	def __init__(self, varfont):
+		self.font = varfont
+		self.gvar = varfont['gvar']
+		self.regions = []
+		self._regionIndices = {}
+		self._glyphDeltas = {}
+		self._scalars = {}
+
+	def _getRegionIndex(self, axes):
+		key = tuple(sorted(axes.items()))
+		index = self._regionIndices.get(key)
+		if index is None:
+			index = self._regionIndices[key] = len(self.regions)
+			self.regions.append(axes)
+		return index
+
+	def getRegionScalars(self, location):
+		"""Return the list of scalars for all regions seen so far, at the
+		given normalized location."""
+		key = tuple(sorted(location.items()))
+		scalars = self._scalars.get(key)
+		if scalars is None:
+			scalars = self._scalars[key] = []
+		for region in self.regions[len(scalars):]:
+			scalars.append(supportScalar(location, region))
+		return scalars
+
+	def _getGlyphRows(self, glyphName):
+		"""Return (regionIndices, rows) for the glyph, with None for the
+		rows not inferred yet."""
+		try:
+			return self._glyphDeltas[glyphName]
+		except KeyError:
+			pass
+		variations = self.gvar.variations.get(glyphName, [])
+		regionIndices = [self._getRegionIndex(var.axes) for var in variations]
+		result = self._glyphDeltas[glyphName] = (regionIndices, [None] * len(variations))
+		return result
+
+	def _inferRows(self, glyphName, indices):
+		_, rows = self._getGlyphRows(glyphName)
+		indices = [k for k in indices if rows[k] is None]
+		if not indices:
+			return
+		variations = self.gvar.variations[glyphName]
+		origCoords, endPts = None, None
+		for k in indices:
+			delta = variations[k].coordinates
+			hasNone = None in delta
+			if hasNone and origCoords is None:
+				origCoords,control = _GetCoordinates(self.font, glyphName)
+				endPts = control[1] if control[0] >= 1 else list(range(len(control[1])))
+			if np is not None:
+				explicit = np.array([d is not None for d in delta], dtype=bool)
+				delta = np.array([d if d is not None else (0,0) for d in delta],
+				                 dtype=np.float64)
+				if hasNone:
+					coords = np.array(origCoords.array, dtype=np.float64).reshape(-1, 2)
+					delta = _iup_delta_np(delta, explicit, coords, endPts)
+				rows[k] = delta.reshape(-1)
+			else:
+				if hasNone:
+					delta = _iup_delta(delta, origCoords, endPts)
+				row = array.array("d")
+				for x,y in delta:
+					row.append(x)
+					row.append(y)
+				rows[k] = row
+
+	def getGlyphDeltas(self, glyphName):
+		"""Return (regionIndices, rows) for the glyph, where each row holds
+		the interpolated deltas of one tuple variation, flattened as
+		x0, y0, x1, y1, etc.  Computed on first access and cached."""
+		regionIndices, rows = self._getGlyphRows(glyphName)
+		self._inferRows(glyphName, range(len(rows)))
+		return regionIndices, rows
+
+	def getGlyphCoordinates(self, glyphName, location, coordinates=None):
+		"""Return the glyph's coordinates (including the four phantom
+		points) at the given normalized location, as GlyphCoordinates.
+
+		If 'coordinates' is given, deltas are applied on top of those
+		rather than the glyph's default outline."""
+		if coordinates is None:
+			coordinates,_ = _GetCoordinates(self.font, glyphName)
+		regionIndices, rows = self._getGlyphRows(glyphName)
+		scalars = self.getRegionScalars(location)
+		active = [k for k,i in enumerate(regionIndices) if scalars[i]]
+		if not active:
+			return coordinates
+		self._inferRows(glyphName, active)
+		active = [(scalars[regionIndices[k]], rows[k]) for k in active]
+		if np is not None:
+			out = np.array(coordinates.array, dtype=np.float64)
+			for scalar,row in active:
+				out += row * scalar
+			out = out.tolist()
+		else:
+			out = array.array("d", coordinates.array)
+			for scalar,row in active:
+				for i in range(len(out)):
+					out[i] += row[i] * scalar
+		result = GlyphCoordinates(typecode="d")
+		result.array.extend(out)
+		return result
+
+
+class VarStoreInstancer(object):
+	"""Computes the deltas of an ItemVariationStore, such as the one of the
+	'HVAR' table, at a normalized location.
+
+	The region scalars are computed once per location and cached, like
+	those of GvarInstancer.
+	"""
+
+	def __init__(self, varstore, fvarAxes):
+		self.varstore = varstore
+		self.axisTags = [axis.axisTag for axis in fvarAxes]
+		self._scalars = {}
+
+	def getRegionScalars(self, location):
+		"""Return the list of scalars for all regions of the store, at the
+		given normalized location."""
+		key = tuple(sorted(location.items()))
+		scalars = self._scalars.get(key)
+		if scalars is None:
+			scalars = self._scalars[key] = []
+			for region in self.varstore.VarRegionList.Region:
+				support = {}
+				for tag, axis in zip(self.axisTags, region.VarRegionAxis):
+					if axis.PeakCoord != 0:
+						support[tag] = (axis.StartCoord, axis.PeakCoord, axis.EndCoord)
+				scalars.append(supportScalar(location, support))
+		return scalars
+
+	def getDelta(self, varIdx, location):
+		"""Return the delta of the item with the given (outer << 16) | inner
+		index at the given normalized location."""
+		scalars = self.getRegionScalars(location)
+		varData = self.varstore.VarData[varIdx >> 16]
+		deltas = varData.Item[varIdx & 0xFFFF]
+		delta = 0
+		for regionIndex, d in zip(varData.VarRegionIndex, deltas):
+			scalar = scalars[regionIndex]
+			if scalar:
+				delta += d * scalar
+		return delta
+
+
+class _InlineCalls(ValueError):
+	"""Raised when the operands of a charstring 'blend' span a subroutine
+	call, so that the calls must be inlined to instantiate it."""
+
+
+class CFF2Instancer(object):
+	"""Instantiates the charstrings and Private dicts of a 'CFF2' table at
+	a normalized location, without drawing the glyphs.
+
+	Every charstring and subroutine program is rewritten in place: the
+	operands of each 'blend' operator are replaced by their values at the
+	location, rounded to integers unless some are fractional, and the
+	'vsindex' operators are dropped.  Subroutine calls are left as they are,
+	so a subroutinized font stays subroutinized, with two exceptions: a
+	subroutine with blends called with several vsindex values gets a copy
+	per value, and calls are inlined where the operands of a blend span
+	them.  The region scalars are computed once per vsindex, and only the
+	regions with a non-zero scalar are summed.
+
+	Programs are decoded one at a time, rather than by executing each
+	charstring with all the subroutines it calls, which is only needed when
+	the size of a hint mask depends on stems outside of the program.
+	"""
+
+	def __init__(self, cff, fvarAxes):
+		self.cff = cff
+		self.topDict = cff.topDictIndex[0]
+		self.varStore = self.topDict.VarStore.otVarStore
+		self.varStoreInstancer = VarStoreInstancer(self.varStore, fvarAxes)
+		self._scalars = {}
+
+	def getScalars(self, vsIndex, location):
+		"""Return (numRegions, scalars) for the ItemVariationData 'vsIndex',
+		where 'scalars' lists the (regionPosition, scalar) pairs of the
+		regions whose scalar is not zero at the location."""
+		key = (vsIndex, tuple(sorted(location.items())))
+		result = self._scalars.get(key)
+		if result is None:
+			regionScalars = self.varStoreInstancer.getRegionScalars(location)
+			regionIndices = self.varStore.VarData[vsIndex].VarRegionIndex
+			scalars = [(i, regionScalars[regionIndex])
+			           for i, regionIndex in enumerate(regionIndices)
+			           if regionScalars[regionIndex]]
+			result = self._scalars[key] = (len(regionIndices), scalars)
+		return result
+
+	def instantiate(self, location):
+		"""Instantiate the table at the given normalized location, and
+		remove its VarStore."""
+		topDict = self.topDict
+		self._location = location
+		self._subrBiases = {}
+		self._subrPrograms = {}
+		self._subrTargets = {}
+		self._subrDepends = {}
+		self._inlinedSubrs = set()
+		self._callSites = []
+		self._grownSubrs = {}
+		for charString in topDict.CharStrings.values():
+			private = charString.private
+			vsIndex = getattr(private, 'vsindex', 0)
+			program = self._decompileProgram(charString, vsIndex)
+			if program is None:
+				charString.decompile()
+				program = charString.program
+			newProgram, _ = self._instantiateCallTree(
+				program, vsIndex, private, program)
+			charString.setProgram(newProgram)
+
+		# Copies of subroutines were appended to their INDEX, which can
+		# change its bias; renumber the calls into it.
+		for program, pos, subrs, index in self._callSites:
+			if id(subrs) in self._grownSubrs:
+				program[pos] = index - calcSubrBias(subrs)
+		self._subrBiases = self._subrPrograms = None
+		self._subrTargets = self._subrDepends = None
+		self._inlinedSubrs = self._callSites = self._grownSubrs = None
+
+		for fontDict in topDict.FDArray:
+			self._instantiatePrivate(fontDict.Private, location)
+			fontDict.Private.vstore = None
+		topDict.FDArray.vstore = None
+		topDict.rawDict.pop('VarStore', None)
+		if 'VarStore' in topDict.__dict__:
+			del topDict.VarStore
+
+	def _getSubrs(self, op, private):
+		"""Return the subroutines called by 'op', and their bias as it was
+		before any copies were appended."""
+		subrs = self.cff.GlobalSubrs if op == 'callgsubr' else private.Subrs
+		bias = self._subrBiases.get(id(subrs))
+		if bias is None:
+			bias = self._subrBiases[id(subrs)] = calcSubrBias(subrs)
+		return subrs, bias
+
+	def _instantiateCallTree(self, program, vsIndex, private, rootProgram):
+		"""Instantiate a charstring or subroutine program along with the
+		subroutines it calls, and return (program, dependsOnVsIndex).  If
+		the operands of a blend span a call, the calls are inlined first."""
+		try:
+			out, calls, dependsOnVsIndex = self._instantiateProgram(
+				program, vsIndex, self._location)
+			callSites = []
+			for op, pos, callVsIndex in calls:
+				subrs, bias = self._getSubrs(op, private)
+				index, subrDepends = self._instantiateSubr(
+					subrs, out[pos] + bias, callVsIndex,
+					private, rootProgram)
+				dependsOnVsIndex = dependsOnVsIndex or subrDepends
+				callSites.append((out, pos, subrs, index))
+		except _InlineCalls:
+			flatProgram = self._inlineCalls(
+				program, vsIndex, private, rootProgram)
+			if flatProgram is program:
+				raise
+			out, _, dependsOnVsIndex = self._instantiateProgram(
+				flatProgram, vsIndex, self._location)
+			return out, dependsOnVsIndex
+		self._callSites.extend(callSites)
+		return out, dependsOnVsIndex
+
+	def _instantiateSubr(self, subrs, index, vsIndex, private, rootProgram):
+		"""Instantiate the subroutine at 'index' in 'subrs', called with
+		'vsIndex', and return (index, dependsOnVsIndex) of the subroutine
+		to call instead.
+
+		The subroutine is rewritten in place for its first vsindex.  If it
+		has blends, itself or in the subroutines it calls, each other
+		vsindex gets a copy appended to 'subrs'."""
+		subr = subrs[index]
+		if id(subr) in self._inlinedSubrs:
+			raise _InlineCalls("blend operands span a subroutine call")
+		key = (id(subr), vsIndex)
+		result = self._subrTargets.get(key)
+		if result is not None:
+			return result
+		program = self._getSubrProgram(subr, vsIndex, private, rootProgram)
+		if id(subr) not in self._subrDepends:
+			try:
+				newProgram, dependsOnVsIndex = self._instantiateCallTree(
+					program, vsIndex, private, rootProgram)
+			except _InlineCalls:
+				self._inlinedSubrs.add(id(subr))
+				raise
+			subr.setProgram(newProgram)
+			self._subrDepends[id(subr)] = dependsOnVsIndex
+			result = (index, dependsOnVsIndex)
+		elif not self._subrDepends[id(subr)]:
+			result = (index, False)
+		else:
+			newProgram, dependsOnVsIndex = self._instantiateCallTree(
+				program, vsIndex, private, rootProgram)
+			subrs.append(T2CharString(
+				program=newProgram, private=subr.private,
+				globalSubrs=subr.globalSubrs))
+			self._grownSubrs[id(subrs)] = subrs
+			result = (len(subrs) - 1, dependsOnVsIndex)
+		self._subrTargets[key] = result
+		return result
+
+	def _getSubrProgram(self, subr, vsIndex, private, rootProgram):
+		"""Return the program of a subroutine as it was before it was
+		instanced."""
+		program = self._subrPrograms.get(id(subr))
+		if program is None:
+			program = self._decompileProgram(subr, vsIndex, isSubr=True)
+			if program is None:
+				# decompile the subroutine in the context of a charstring
+				# that calls it
+				root = T2CharString(program=rootProgram, private=private,
+				                    globalSubrs=self.cff.GlobalSubrs)
+				SimpleT2Decompiler(getattr(private, 'Subrs', []),
+				                   self.cff.GlobalSubrs, private).execute(root)
+				program = subr.program
+			self._subrPrograms[id(subr)] = program
+		return program
+
+	def _inlineCalls(self, program, vsIndex, private, rootProgram):
+		"""Return the program with its subroutine calls replaced by the
+		programs of the subroutines, recursively, or the program itself if
+		it makes no calls."""
+		out = []
+		inlined = False
+		i = 0
+		end = len(program)
+		while i < end:
+			token = program[i]
+			i += 1
+			if isinstance(token, basestring) and token in ('callsubr', 'callgsubr'):
+				inlined = True
+				index = out.pop() if out else None
+				if type(index) is not int:
+					raise ValueError("subroutine called with a computed index")
+				subrs, bias = self._getSubrs(token, private)
+				subr = subrs[index + bias]
+				out.extend(self._inlineCalls(
+					self._getSubrProgram(subr, vsIndex, private, rootProgram),
+					vsIndex, private, rootProgram))
+				continue
+			out.append(token)
+			if token in ('hintmask', 'cntrmask'):
+				out.append(program[i])
+				i += 1
+		return out if inlined else program
+
+	def _decompileProgram(self, charString, vsIndex, isSubr=False):
+		"""Return the program of a charstring, decoding its bytecode without
+		executing the subroutines it calls, unlike T2CharString.decompile().
+		Return None if the size of its hint masks depends on the stems of
+		another charstring or subroutine."""
+		if not charString.needsDecompilation():
+			return charString.program
+		program = []
+		numOperands = 0  # None once unknown, after a subroutine call
+		hintCount = 0
+		hintMaskBytes = 0
+		getToken = charString.getToken
+		index = 0
+		while True:
+			token, isOperator, index = getToken(index)
+			if token is None:
+				break
+			program.append(token)
+			if not isOperator:
+				if numOperands is not None:
+					numOperands += 1
+				continue
+			if token == 'blend':
+				numBlends = program[-2] if numOperands else None
+				if type(numBlends) is int:
+					numRegions = len(self.varStore.VarData[vsIndex].VarRegionIndex)
+					numOperands -= 1 + numBlends * numRegions
+				else:
+					numOperands = None
+				continue
+			if token == 'vsindex':
+				vsIndex = program[-2]
+			elif token in _stemOperators:
+				if numOperands is not None:
+					hintCount += numOperands // 2
+			elif token in ('hintmask', 'cntrmask'):
+				if not hintMaskBytes:
+					if isSubr or numOperands is None:
+						return None
+					hintCount += numOperands // 2
+					hintMaskBytes = (hintCount + 7) // 8
+				mask, index = charString.getBytes(index, hintMaskBytes)
+				program.append(mask)
+			elif token in ('callsubr', 'callgsubr'):
+				numOperands = None
+				continue
+			if numOperands is not None:
+				numOperands = 0
+		return program
+
+	def _instantiateProgram(self, program, vsIndex, location):
+		"""Return (program, calls, hasBlend) for a charstring program, where
+		'calls' lists the (operator, position, vsIndex) of its subroutine
+		calls, 'position' being that of the subroutine number in 'program'.
+		Raise _InlineCalls if the operands of a blend span a call."""
+		out = []
+		calls = []
+		hasBlend = False
+		numOperands = 0  # number of operands at the end of 'out'
+		i = 0
+		end = len(program)
+		while i < end:
+			token = program[i]
+			i += 1
+			if not isinstance(token, basestring):
+				out.append(token)
+				numOperands += 1
+				continue
+			if token == 'blend':
+				hasBlend = True
+				numRegions, scalars = self.getScalars(vsIndex, location)
+				if not numOperands:
+					raise _InlineCalls("blend operands span a subroutine call")
+				numBlends = out.pop()
+				numOperands -= 1
+				if type(numBlends) is not int:
+					raise ValueError("blend with a computed number of values")
+				numArgs = numBlends * (numRegions + 1)
+				if numArgs > numOperands:
+					raise _InlineCalls("blend operands span a subroutine call")
+				args = out[-numArgs:] if numArgs else []
+				del out[len(out) - numArgs:]
+				out.extend(_blendValues(args, numBlends, numRegions, scalars))
+				numOperands -= numArgs - numBlends
+				continue
+			if token == 'vsindex':
+				vsIndex = out.pop()
+				numOperands = 0
+				continue
+			if token in ('callsubr', 'callgsubr'):
+				index = out[-1] if numOperands else None
+				if type(index) is not int:
+					raise ValueError("subroutine called with a computed index")
+				calls.append((token, len(out) - 1, vsIndex))
+			out.append(token)
+			numOperands = 0
+			if token in ('hintmask', 'cntrmask'):
+				out.append(program[i])
+				i += 1
+		return out, calls, hasBlend
+
+	def _instantiatePrivate(self, private, location):
+		numRegions, scalars = self.getScalars(
+			getattr(private, 'vsindex', 0), location)
+		for _, name, argType, _, _ in privateDictOperators2:
+			if argType not in ('number', 'delta') or name == 'Subrs':
+				continue
+			value = getattr(private, name, None)
+			if not isinstance(value, list):
+				continue
+			if argType == 'number':
+				value = _blendMasterValues(value, scalars)
+			elif value and isinstance(value[0], list):
+				value = [_blendMasterValues(v, scalars) for v in value]
+			else:
+				continue
+			setattr(private, name, value)
+		private.rawDict.pop('vsindex', None)
+		if 'vsindex' in private.__dict__:
+			del private.vsindex
+
+
+_stemOperators = frozenset(['hstem', 'vstem', 'hstemhm', 'vstemhm'])
+
+
+def _roundValue(value):
+	# Rounds halves up, the same way in Python 2 and 3.
+	return int(math.floor(value + .5))
+
+
+def _blendValues(args, numBlends, numRegions, scalars):
+	"""Evaluate the operands of a charstring 'blend': 'numBlends' default
+	values followed by 'numRegions' deltas for each of them."""
+	defaults = args[:numBlends]
+	if not scalars:
+		return defaults
+	result = []
+	deltaIndex = numBlends
+	for value in defaults:
+		isFloat = isinstance(value, float)
+		for i, scalar in scalars:
+			delta = args[deltaIndex + i]
+			isFloat = isFloat or isinstance(delta, float)
+			value += delta * scalar
+		result.append(value if isFloat else _roundValue(value))
+		deltaIndex += numRegions
+	return result
+
+
+def _blendMasterValues(values, scalars):
+	"""Evaluate the blend list of a Private dict value: the default value,
+	followed by the value of each region."""
+	value = default = values[0]
+	if not scalars:
+		return value
+	for i, scalar in scalars:
+		value += (values[i + 1] - default) * scalar
+	if any(isinstance(v, float) for v in values):
+		return value
+	return _roundValue(value)
+
+
+def normalizeVariableFontLocation(varfont, location):
+	"""Normalize a user-space location, such as {'wght': 400}, using the
+	axes of the font's 'fvar' table, and map it through the 'avar' table
+	if the font has one. Axes missing from the location are set to their
+	default."""
+	axes = {a.axisTag:(a.minValue,a.defaultValue,a.maxValue) for a in varfont['fvar'].axes}
+	loc = normalizeLocation(location, axes)
+	if 'avar' in varfont:
+		segments = varfont['avar'].segments
+		loc = {tag:piecewiseLinearMap(v, segments.get(tag, {})) for tag,v in loc.items()}
+	return loc
+
+
+_variationTables = ('avar','cvar','fvar','gvar','HVAR','MVAR','VVAR','STAT')
+
+
+def instantiateVariableFont(varfont, location, inplace=False):
+	""" Generate a static instance from a variable TTFont and a dictionary
+	defining the desired location along the variable font's axes.
+	The location values must be specified as user-space coordinates, e.g.:
+
+		{'wght': 400, 'wdth': 100}
+
+	By default, a new TTFont object is returned. If ``inplace`` is True, the
+	input varfont is modified and reduced to a static font.
+	"""
+	# TODO Round to F2Dot14?
+	loc = normalizeVariableFontLocation(varfont, location)
+	# Location is normalized now
+	log.info("Normalized location: %s", loc)
+	axes = varfont['fvar'].axes
+
+	# The 'gvar' instancer cached on the font reads the glyphs of the
+	# font as it was, so it can be reused by the next call too.
+	instancer = varfont._getVarInstancers()[0] if 'gvar' in varfont else None
+
+	if not inplace:
+		# The copy needs neither the cached instancers nor the variation
+		# tables, which are dropped below.
+		memo = {id(varfont._varInstancers): None}
+		for tag in _variationTables:
+			if varfont.isLoaded(tag):
+				memo[id(varfont[tag])] = None
+		varfont = deepcopy(varfont, memo)
+
+	if instancer is not None:
+		log.info("Mutating glyf/gvar tables")
+		glyf = varfont['glyf']
+		# get list of glyph names in gvar sorted by component depth
+		glyphnames = sorted(
+			instancer.gvar.variations.keys(),
+			key=lambda name: (
+				glyf[name].getCompositeMaxpValues(glyf).maxComponentDepth
+				if glyf[name].isComposite() else 0,
+				name))
+		for glyphname in glyphnames:
+			coordinates = instancer.getGlyphCoordinates(glyphname, loc)
+			_SetCoordinates(varfont, glyphname, coordinates)
+
+	if 'CFF2' in varfont:
+		log.info("Mutating CFF2 table")
+		cff = varfont['CFF2'].cff
+		if hasattr(cff.topDictIndex[0], 'VarStore'):
+			CFF2Instancer(cff, axes).instantiate(loc)
+
+	log.info("Removing variable tables")
+	for tag in _variationTables:
+		if tag in varfont:
+			del varfont[tag]
+
+	return varfont
+
+
 def main(args=None):
 
 	if args is None:
@@ -119,43 +786,7 @@ def main(args=None):
 	print("Loading variable font")
 	varfont = TTFont(varfilename)
 
-	fvar = varfont['fvar']
-	axes = {a.axisTag:(a.minValue,a.defaultValue,a.maxValue) for a in fvar.axes}
-	# TODO Apply avar
-	# TODO Round to F2Dot14?
-	loc = normalizeLocation(loc, axes)
-	# Location is normalized now
-	print("Normalized location:", loc)
-
-	gvar = varfont['gvar']
-	glyf = varfont['glyf']
-	# get list of glyph names in gvar sorted by component depth
-	glyphnames = sorted(
-		gvar.variations.keys(),
-		key=lambda name: (
-			glyf[name].getCompositeMaxpValues(glyf).maxComponentDepth
-			if glyf[name].isComposite() else 0,
-			name))
-	for glyphname in glyphnames:
-		variations = gvar.variations[glyphname]
-		coordinates,_ = _GetCoordinates(varfont, glyphname)
-		origCoords, endPts = None, None
-		for var in variations:
-			scalar = supportScalar(loc, var.axes)
-			if not scalar: continue
-			delta = var.coordinates
-			if None in delta:
-				if origCoords is None:
-					origCoords,control = _GetCoordinates(varfont, glyphname)
-					endPts = control[1] if control[0] >= 1 else list(range(len(control[1])))
-				delta = _iup_delta(delta, origCoords, endPts)
-			coordinates += GlyphCoordinates(delta) * scalar
-		_SetCoordinates(varfont, glyphname, coordinates)
-
-	print("Removing variable tables")
-	for tag in ('avar','cvar','fvar','gvar','HVAR','MVAR','VVAR','STAT'):
-		if tag in varfont:
-			del varfont[tag]
+	instantiateVariableFont(varfont, loc, inplace=True)
 
 	print("Saving instance font", outfile)
 	varfont.save(outfile)
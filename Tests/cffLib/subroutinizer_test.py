@@ -0,0 +1,231 @@
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.cffLib import subroutinizer
+from fontTools.cffLib.subroutinizer import (
+    subroutinize, _suffixArray, _lcpArray, _inline)
+from fontTools.misc.psCharStrings import T2CharString, calcSubrBias
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.ttLib import TTFont
+import os
+import unittest
+
+
+CURR_DIR = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+DATA_DIR = os.path.join(CURR_DIR, 'data')
+OTF_PATH = os.path.join(
+    CURR_DIR, os.pardir, 'ttLib', 'data', 'TestOTF-Regular.otx')
+CID_PATH = os.path.join(
+    CURR_DIR, os.pardir, 'subset', 'data', 'TestCID-Regular.ttx')
+CFF2_PATH = os.path.join(DATA_DIR, 'TestCFF2.ttx')
+
+
+SHAPES = [
+    [50, 50, 'rmoveto', 400, 0, 'rlineto', 0, 400, 'rlineto',
+     -400, 0, 'rlineto'],
+    [100, 0, 'rmoveto', 20, 30, 40, 50, 60, 70, 'rrcurveto',
+     -20, -30, -40, -50, -60, -70, 'rrcurveto'],
+    [0, 200, 'rmoveto', 150, 'hlineto', 150, 'vlineto', -150, 'hlineto'],
+]
+
+
+def makeProgram(i):
+    program = [500]
+    for j in range(3):
+        program.extend(SHAPES[(i + j) % len(SHAPES)])
+        program.extend([10 * i, 10 * j, 'rmoveto'])
+    program.append('endchar')
+    return program
+
+
+def loadFont(path, numGlyphs=0, fdIndices=None):
+    font = TTFont(sfntVersion='OTTO')
+    font.importXML(path)
+    tag = 'CFF2' if 'CFF2' in font else 'CFF '
+    cff = font[tag].cff
+    topDict = cff.topDictIndex[0]
+    glyphOrder = font.getGlyphOrder()[:]
+    for i in range(numGlyphs):
+        if fdIndices is not None:
+            name = 'cid%05d' % (100 + i)
+            fdIndex = fdIndices[i % len(fdIndices)]
+            private = topDict.FDArray[fdIndex].Private
+        else:
+            name = 'glyph%d' % i
+            if tag == 'CFF2':
+                private = topDict.FDArray[0].Private
+            else:
+                private = topDict.Private
+        program = makeProgram(i)
+        if tag == 'CFF2':
+            program = program[1:-1]
+        charString = T2CharString(program=program, private=private,
+                                  globalSubrs=cff.GlobalSubrs)
+        if fdIndices is not None:
+            charString.fdSelectIndex = fdIndex
+        topDict.CharStrings[name] = charString
+        for metricsTag in ('hmtx', 'vmtx'):
+            if metricsTag in font:
+                font[metricsTag][name] = (500, 0)
+        glyphOrder.append(name)
+    font.setGlyphOrder(glyphOrder)
+    return font
+
+
+def reload(font):
+    buf = BytesIO()
+    font.save(buf)
+    buf.seek(0)
+    return TTFont(buf)
+
+
+def getTable(font):
+    return font['CFF2' if 'CFF2' in font else 'CFF ']
+
+
+def getPrograms(font):
+    """Return the charstring programs of the font, with subroutines
+    inlined."""
+    cff = getTable(font).cff
+    charStrings = cff.topDictIndex[0].CharStrings
+    result = {}
+    for glyphName in font.getGlyphOrder():
+        charString = charStrings[glyphName]
+        charString.decompile()
+        program = []
+        _inline(charString.program,
+                getattr(charString.private, 'Subrs', []),
+                cff.GlobalSubrs, program)
+        result[glyphName] = program
+    return result
+
+
+def getDrawings(font):
+    charStrings = getTable(font).cff.topDictIndex[0].CharStrings
+    result = {}
+    for glyphName in font.getGlyphOrder():
+        pen = RecordingPen()
+        charStrings[glyphName].draw(pen)
+        result[glyphName] = pen.value
+    return result
+
+
+def getCallDepth(program, localSubrs, globalSubrs):
+    depth = 0
+    for i, token in enumerate(program):
+        if token in ('callsubr', 'callgsubr'):
+            subrs = localSubrs if token == 'callsubr' else globalSubrs
+            subr = subrs[program[i - 1] + calcSubrBias(subrs)]
+            subr.decompile()
+            depth = max(depth, 1 + getCallDepth(
+                subr.program, localSubrs, globalSubrs))
+    return depth
+
+
+class SuffixArrayTest(unittest.TestCase):
+
+    def test_suffixArray(self):
+        text = [2, 0, 1, 2, 0, 1, 2, 3, 1, 2, 0]
+        sa, rank = _suffixArray(text)
+        self.assertEqual(
+            sa, sorted(range(len(text)), key=lambda i: text[i:]))
+        self.assertEqual([rank[i] for i in sa], list(range(len(text))))
+        lcp = _lcpArray(text, sa, rank)
+        for i in range(1, len(text)):
+            a, b = text[sa[i - 1]:], text[sa[i]:]
+            common = 0
+            while common < min(len(a), len(b)) and a[common] == b[common]:
+                common += 1
+            self.assertEqual(lcp[i], common)
+
+    def test_suffixArray_empty(self):
+        self.assertEqual(_suffixArray([]), ([], []))
+
+
+class SubroutinizeTest(unittest.TestCase):
+
+    def test_subroutinize(self):
+        font = reload(loadFont(OTF_PATH, 24))
+        size = len(font.getTableData('CFF '))
+        drawings = getDrawings(font)
+        font['CFF '].subroutinize = True
+        font = reload(font)
+        cff = font['CFF '].cff
+        self.assertLess(len(font.getTableData('CFF ')), size)
+        self.assertEqual(getDrawings(font), drawings)
+        self.assertTrue(len(cff.GlobalSubrs))
+        self.assertTrue(len(cff.topDictIndex[0].Private.Subrs))
+
+    def test_subroutinize_deterministic(self):
+        font = loadFont(OTF_PATH, 24)
+        font['CFF '].subroutinize = True
+        data = font.getTableData('CFF ')
+        font = reload(loadFont(OTF_PATH, 24))
+        font['CFF '].subroutinize = True
+        self.assertEqual(font.getTableData('CFF '), data)
+        # subroutinizing a subroutinized font gives the same result
+        font = reload(font)
+        font['CFF '].subroutinize = True
+        self.assertEqual(font.getTableData('CFF '), data)
+
+    def test_subroutinize_CID(self):
+        font = reload(loadFont(CID_PATH, 24, fdIndices=[0, 1]))
+        drawings = getDrawings(font)
+        font['CFF '].subroutinize = True
+        font = reload(font)
+        self.assertEqual(getDrawings(font), drawings)
+        # the shapes are used by both font dicts
+        globalSubrs = font['CFF '].cff.GlobalSubrs
+        self.assertTrue(len(globalSubrs))
+        for subr in globalSubrs:
+            subr.decompile()
+            self.assertNotIn('callsubr', subr.program)
+
+    def test_subroutinize_CFF2(self):
+        font = reload(loadFont(CFF2_PATH, 24))
+        size = len(font.getTableData('CFF2'))
+        programs = getPrograms(font)
+        font['CFF2'].subroutinize = True
+        font = reload(font)
+        cff = font['CFF2'].cff
+        self.assertLess(len(font.getTableData('CFF2')), size)
+        self.assertEqual(getPrograms(font), programs)
+        for subr in cff.GlobalSubrs:
+            subr.decompile()
+            self.assertNotIn('return', subr.program)
+
+    def test_maxCallDepth(self):
+        font = reload(loadFont(OTF_PATH, 24))
+        drawings = getDrawings(font)
+        font['CFF '].subroutinize = True
+        maxCallDepth = subroutinizer.maxCallDepth
+        subroutinizer.maxCallDepth = 1
+        try:
+            font = reload(font)
+        finally:
+            subroutinizer.maxCallDepth = maxCallDepth
+        self.assertEqual(getDrawings(font), drawings)
+        cff = font['CFF '].cff
+        topDict = cff.topDictIndex[0]
+        localSubrs = getattr(topDict.Private, 'Subrs', [])
+        for glyphName in font.getGlyphOrder():
+            charString = topDict.CharStrings[glyphName]
+            self.assertLessEqual(getCallDepth(
+                charString.program, localSubrs, cff.GlobalSubrs), 1)
+
+    def test_computed_subr_index(self):
+        font = loadFont(OTF_PATH, 24)
+        charStrings = font['CFF '].cff.topDictIndex[0].CharStrings
+        charStrings['glyph0'].program[-1:] = [
+            -108, 1, 'add', 'callsubr', 'endchar']
+        programs = {glyphName: list(charStrings[glyphName].program)
+                    for glyphName in font.getGlyphOrder()}
+        self.assertFalse(subroutinize(font['CFF '].cff))
+        self.assertEqual(
+            {glyphName: charStrings[glyphName].program
+             for glyphName in font.getGlyphOrder()},
+            programs)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(unittest.main())
@@ -1,12 +1,92 @@
 from fontTools.misc.py23 import *
 from fontTools import ttLib
 from fontTools.merge import *
+import os
 import unittest
 
 
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'ttx', 'data')
+TTF_PATH = os.path.join(DATA_DIR, 'TestTTF.ttf')
+OTF_PATH = os.path.join(DATA_DIR, 'TestOTF.otf')
+
+
+def suffixed(glyphOrder, suffix):
+	return [glyphName + suffix for glyphName in glyphOrder]
+
+
+def getTablesData(font):
+	buf = BytesIO()
+	font.save(buf)
+	buf.seek(0)
+	reader = ttLib.TTFont(buf).reader
+	return {tag: reader[tag] for tag in reader.keys() if tag != 'head'}
+
+
 class MergeIntegrationTest(unittest.TestCase):
-	# TODO
-	pass
+
+	def test_merge(self):
+		glyphOrder = ttLib.TTFont(TTF_PATH).getGlyphOrder()
+		mega = Merger().merge([TTF_PATH, TTF_PATH])
+		self.assertEqual(mega.getGlyphOrder(),
+				 suffixed(glyphOrder, '#0') + suffixed(glyphOrder, '#1'))
+		self.assertEqual(mega['cmap'].tables[0].cmap[0x2026], 'ellipsis#0')
+		self.assertEqual(sorted(mega['glyf'].keys()), sorted(mega.getGlyphOrder()))
+		self.assertEqual(mega['maxp'].numGlyphs, 2 * len(glyphOrder))
+
+	def test_merge_glyf(self):
+		tables = []
+		for suffix in ('#0', '#1'):
+			font = ttLib.TTFont(TTF_PATH)
+			glyphOrder = font.getGlyphOrder()
+			Merger()._renameGlyphs(font, suffixed(glyphOrder, suffix))
+			glyf = font['glyf']
+			glyf['ellipsis' + suffix].recalcBounds(glyf)
+			tables.append(glyf)
+		table = ttLib.getTableClass('glyf')('glyf').merge(Merger(), tables)
+		self.assertEqual(table.glyphOrder,
+				 suffixed(glyphOrder, '#0') + suffixed(glyphOrder, '#1'))
+
+	def test_merge_jobs(self):
+		mega = Merger().merge([TTF_PATH, TTF_PATH])
+		megaJobs = Merger(Options(jobs=2)).merge([TTF_PATH, TTF_PATH])
+		self.assertEqual(getTablesData(megaJobs), getTablesData(mega))
+
+	def test_merge_invalid_jobs(self):
+		merger = Merger(Options(jobs=-1))
+		self.assertRaises(ValueError, merger.merge, [TTF_PATH, TTF_PATH])
+
+
+class RenameGlyphsTest(unittest.TestCase):
+
+	def test_renameGlyphs_TTF(self):
+		font = ttLib.TTFont(TTF_PATH)
+		glyphOrder = font.getGlyphOrder()
+		font['cmap']
+		Merger()._renameGlyphs(font, suffixed(glyphOrder, '#0'))
+		self.assertEqual(font.getGlyphOrder(), suffixed(glyphOrder, '#0'))
+		self.assertEqual(font['cmap'].tables[0].cmap[0x2026], 'ellipsis#0')
+		self.assertEqual(sorted(font['glyf'].keys()),
+				 sorted(suffixed(glyphOrder, '#0')))
+
+	def test_renameGlyphs_CFF(self):
+		font = ttLib.TTFont(OTF_PATH)
+		glyphOrder = font.getGlyphOrder()
+		Merger()._renameGlyphs(font, suffixed(glyphOrder, '#1'))
+		topDict = font['CFF '].cff.topDictIndex[0]
+		self.assertEqual(topDict.charset, suffixed(glyphOrder, '#1'))
+		self.assertEqual(sorted(topDict.CharStrings.keys()),
+				 sorted(suffixed(glyphOrder, '#1')))
+		self.assertEqual(sorted(font['hmtx'].metrics.keys()),
+				 sorted(suffixed(glyphOrder, '#1')))
+
+	def test_renameGlyphs_unknown_table(self):
+		font = ttLib.TTFont()
+		font.setGlyphOrder(['.notdef', 'a'])
+		font['TEST'] = ttLib.newTable('TEST')
+		font['TEST'].data = b'\0'
+		with self.assertRaises(ValueError):
+			Merger()._renameGlyphs(font, ['.notdef#0', 'a#0'])
+
 
 class gaspMergeUnitTest(unittest.TestCase):
 	def setUp(self):
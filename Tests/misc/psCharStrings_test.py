@@ -0,0 +1,135 @@
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.misc.psCharStrings import (
+    T2CharString, T2OutlineExtractor, CharStringPathCache)
+from fontTools.pens.recordingPen import RecordingPen
+from fontTools.ttLib import TTFont
+import os
+import unittest
+
+
+OTF_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'ttx', 'data', 'TestOTF.otf')
+
+
+class _Private(object):
+    nominalWidthX = 100
+    defaultWidthX = 500
+    _isCFF2 = False
+
+
+def makeCharString(program):
+    return T2CharString(program=program, private=_Private())
+
+
+def record(draw):
+    pen = RecordingPen()
+    draw(pen)
+    return pen.value
+
+
+class OperatorHandlersTest(unittest.TestCase):
+
+    def test_getOperatorHandlers(self):
+        handlers = T2OutlineExtractor.getOperatorHandlers()
+        self.assertEqual(handlers['rlineto'], T2OutlineExtractor.op_rlineto)
+        self.assertIs(T2OutlineExtractor.getOperatorHandlers(), handlers)
+
+
+class T2CharStringTest(unittest.TestCase):
+
+    def test_program_lazy(self):
+        charString = makeCharString([10, 20, 'rmoveto', 'endchar'])
+        charString.compile()
+        bytecode = charString.bytecode
+        self.assertIsNone(charString._program)
+        charString = T2CharString(bytecode=bytecode, private=_Private())
+        self.assertTrue(charString.needsDecompilation())
+        self.assertEqual(charString.program, [10, 20, 'rmoveto', 'endchar'])
+        self.assertFalse(charString.needsDecompilation())
+        charString.compile()
+        self.assertEqual(charString.bytecode, bytecode)
+
+    def test_program_setter(self):
+        charString = makeCharString([10, 20, 'rmoveto', 'endchar'])
+        charString.compile()
+        charString.program = ['endchar']
+        self.assertIsNone(charString.bytecode)
+        charString.compile()
+        self.assertEqual(charString.bytecode, b'\x0e')
+
+
+class CharStringPathCacheTest(unittest.TestCase):
+
+    def test_draw(self):
+        font = TTFont(OTF_PATH)
+        charStrings = font['CFF '].cff.topDictIndex[0].CharStrings
+        cache = charStrings.enableDrawCache()
+        glyphSet = font.getGlyphSet()
+        for glyphName in font.getGlyphOrder():
+            expected = record(charStrings[glyphName].draw)
+            width = charStrings[glyphName].width
+            for _ in range(2):
+                self.assertEqual(record(glyphSet[glyphName].draw), expected)
+                self.assertEqual(charStrings[glyphName].width, width)
+        self.assertEqual(cache.misses, len(font.getGlyphOrder()))
+        self.assertEqual(cache.hits, len(font.getGlyphOrder()))
+
+    def test_keep_types(self):
+        cache = CharStringPathCache()
+        charString = makeCharString(
+            [150, 10, 20, 'rmoveto', 0.5, 30, 'rlineto', 'endchar'])
+        for _ in range(2):
+            self.assertEqual(record(lambda pen: cache.draw(charString, pen)), [
+                ('moveTo', ((10, 20),)),
+                ('lineTo', ((10.5, 50.0),)),
+                ('closePath', ())])
+            self.assertEqual(charString.width, 250)
+        charString = makeCharString([10, 20, 'rmoveto', 'endchar'])
+        value = record(lambda pen: cache.draw(charString, pen))
+        self.assertEqual(repr(value), repr([
+            ('moveTo', ((10, 20),)), ('closePath', ())]))
+
+    def test_seac(self):
+        cache = CharStringPathCache()
+        charString = makeCharString([0, 0, 65, 194, 'endchar'])
+        expected = record(charString.draw)
+        self.assertEqual(record(lambda pen: cache.draw(charString, pen)),
+                         expected)
+        self.assertEqual(record(lambda pen: cache.draw(charString, pen)),
+                         expected)
+
+    def test_new_program(self):
+        cache = CharStringPathCache()
+        charString = makeCharString([10, 20, 'rmoveto', 'endchar'])
+        cache.draw(charString, RecordingPen())
+        charString.setProgram([30, 40, 'rmoveto', 'endchar'])
+        self.assertEqual(record(lambda pen: cache.draw(charString, pen)), [
+            ('moveTo', ((30, 40),)), ('closePath', ())])
+        self.assertEqual(cache.misses, 2)
+
+    def test_eviction(self):
+        charStrings = [makeCharString([i, i, 'rmoveto', 'endchar'])
+                       for i in range(10)]
+        cache = CharStringPathCache(
+            maxSize=3 * (CharStringPathCache.entryOverhead + 10))
+        for charString in charStrings:
+            cache.draw(charString, RecordingPen())
+        self.assertEqual(len(cache), 3)
+        self.assertLessEqual(cache.size, cache.maxSize)
+        # the least recently drawn are evicted
+        cache.draw(charStrings[7], RecordingPen())
+        cache.draw(charStrings[0], RecordingPen())
+        self.assertEqual(cache.misses, 11)
+        cache.draw(charStrings[7], RecordingPen())
+        self.assertEqual(cache.hits, 2)
+        cache.draw(charStrings[8], RecordingPen())
+        self.assertEqual(cache.misses, 12)
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(unittest.main())
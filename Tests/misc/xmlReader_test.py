@@ -3,12 +3,37 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 from fontTools.misc.py23 import *
 import os
+import shutil
 import unittest
 from fontTools.ttLib import TTFont
 from fontTools.misc.xmlReader import XMLReader, ProgressPrinter, BUFSIZE
+import copy
 import tempfile
 
 
+TTX_PATH = os.path.join(
+	os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+	'ttx', 'data', 'TestTTF.ttx')
+
+
+def importXML(fileOrPath, lazy=None, jobs=1):
+	font = TTFont(lazy=lazy, recalcTimestamp=False)
+	font.importXML(fileOrPath, jobs=jobs)
+	return font
+
+
+def compile(font):
+	buf = BytesIO()
+	font.save(buf)
+	return buf.getvalue()
+
+
+def dumpXML(font):
+	buf = BytesIO()
+	font.saveXML(buf)
+	return buf.getvalue()
+
+
 class TestXMLReader(unittest.TestCase):
 
 	def test_decode_utf8(self):
@@ -143,6 +168,76 @@ class TestXMLReader(unittest.TestCase):
 		os.remove(tmp.name)
 
 
+	def test_index(self):
+		font = importXML(TTX_PATH, lazy=True)
+		self.assertTrue(font.isLoaded('GlyphOrder'))
+		self.assertFalse(font.isLoaded('glyf'))
+		expected = importXML(TTX_PATH)
+		self.assertEqual(font.keys(), expected.keys())
+		self.assertTrue('glyf' in font)
+		self.assertEqual(font['name'].getName(1, 3, 1).toUnicode(),
+		                 expected['name'].getName(1, 3, 1).toUnicode())
+		self.assertTrue(font.isLoaded('name'))
+		self.assertFalse(font.isLoaded('glyf'))
+		self.assertEqual(compile(font), compile(expected))
+
+	def test_index_file_obj(self):
+		with open(TTX_PATH, 'rb') as f:
+			font = importXML(f, lazy=True)
+		# the pending tables can be copied with the font
+		font = copy.deepcopy(font)
+		self.assertFalse(font.isLoaded('glyf'))
+		self.assertEqual(compile(font), compile(importXML(TTX_PATH)))
+
+	def test_index_copyXML(self):
+		expected = importXML(TTX_PATH)
+		data = dumpXML(expected)
+		font = importXML(BytesIO(data), lazy=True)
+		self.assertEqual(dumpXML(font), data)
+		self.assertFalse(font.isLoaded('glyf'))
+		# modified tables get dumped again
+		font['OS/2'].usWeightClass = expected['OS/2'].usWeightClass = 700
+		del font['DSIG'], expected['DSIG']
+		self.assertEqual(dumpXML(font), dumpXML(expected))
+
+	def test_index_split(self):
+		tempdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tempdir, 'TestTTF.ttx')
+			importXML(TTX_PATH).saveXML(path, splitTables=True)
+			font = importXML(path, lazy=True)
+			self.assertTrue(font.isLoaded('GlyphOrder'))
+			self.assertFalse(font.isLoaded('glyf'))
+			self.assertEqual(compile(font), compile(importXML(TTX_PATH)))
+		finally:
+			shutil.rmtree(tempdir)
+
+	def test_importXML_jobs_split(self):
+		tempdir = tempfile.mkdtemp()
+		try:
+			path = os.path.join(tempdir, 'TestTTF.ttx')
+			importXML(TTX_PATH).saveXML(path, splitTables=True)
+			font = importXML(path, jobs=2)
+			self.assertFalse(font._pendingTables)
+			self.assertTrue(font.isLoaded('glyf'))
+			self.assertEqual(compile(font), compile(importXML(TTX_PATH)))
+		finally:
+			shutil.rmtree(tempdir)
+
+	def test_importXML_jobs_references(self):
+		path = os.path.join(
+			os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+			'ttLib', 'data', 'TestOTF-Regular.otx')
+		font = importXML(path, jobs=2)
+		self.assertFalse(font._pendingTables)
+		# the tables parsed in the worker processes refer to this font
+		self.assertIs(font['CFF '].cff.otFont, font)
+		self.assertEqual(compile(font), compile(importXML(path)))
+
+	def test_importXML_invalid_jobs(self):
+		self.assertRaises(ValueError, importXML, TTX_PATH, jobs=-2)
+		self.assertRaises(TypeError, importXML, TTX_PATH, jobs=2.0)
+
 
 if __name__ == '__main__':
 	import sys
@@ -2,13 +2,20 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools import subset
 from fontTools.ttLib import TTFont, newTable
+from fontTools.ttLib.tables import otBase, otTables
+from fontTools.ttLib.tables.DefaultTable import DefaultTable
+from fontTools.ttLib.tables._g_l_y_f import Glyph
+from fontTools.otlLib import builder
 from fontTools.misc.loggingTools import CapturingLogHandler
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
 import difflib
 import logging
 import os
 import shutil
+import struct
 import sys
 import tempfile
+import threading
 import unittest
 
 
@@ -304,5 +311,247 @@ class SubsetTest(unittest.TestCase):
         self.assertLess(modified, TTFont(subsetpath)['head'].modified)
 
 
+    def test_prepared_font_matches_subsetter(self):
+        options = subset.Options()
+        for ttx, suffix in [("TestTTF-Regular.ttx", ".ttf"),
+                            ("TestOTF-Regular.ttx", ".otf"),
+                            ("TestCID-Regular.ttx", ".otf"),
+                            ("TestGVAR.ttx", ".ttf"),
+                            ("TestCLR-Regular.ttx", ".ttf"),
+                            ("TestMATH-Regular.ttx", ".otf")]:
+            font, fontpath = self.compile_font(self.getpath(ttx), suffix)
+            unicodes = sorted(set(u for t in font["cmap"].tables
+                                    if t.isUnicode() for u in t.cmap))
+            prepared = subset.PreparedFont(fontpath, options)
+            for request in (unicodes[:len(unicodes)//2], unicodes[::3], []):
+                expected = subset.load_font(fontpath, options)
+                subsetter = subset.Subsetter(options)
+                subsetter.populate(unicodes=request)
+                subsetter.subset(expected)
+                actual = prepared.subset(unicodes=request)
+                self.assertEqual(actual.getGlyphOrder(),
+                                 expected.getGlyphOrder())
+                expectedpath = self.temp_path(suffix)
+                actualpath = self.temp_path(suffix)
+                subset.save_font(expected, expectedpath, options)
+                subset.save_font(actual, actualpath, options)
+                with open(expectedpath, "rb") as f1, open(actualpath, "rb") as f2:
+                    self.assertEqual(f1.read(), f2.read(), ttx)
+
+    def test_prepared_font_not_modified(self):
+        _, fontpath = self.compile_font(self.getpath("TestOTF-Regular.ttx"), ".otf")
+        prepared = subset.PreparedFont(fontpath)
+        before = self.temp_path(".ttx")
+        prepared.font.saveXML(before)
+        subsetpath = self.temp_path(".otf")
+        for text in ("A", "BC", ""):
+            subset.save_font(prepared.subset(text=text), subsetpath,
+                             prepared.options)
+        after = self.temp_path(".ttx")
+        prepared.font.saveXML(after)
+        self.assertEqual(self.read_ttx(before), self.read_ttx(after))
+
+
+    def test_prepared_font_concurrent_requests(self):
+        for ttx, suffix in [("TestCID-Regular.ttx", ".otf"),
+                            ("TestMATH-Regular.ttx", ".otf"),
+                            ("TestTTF-Regular.ttx", ".ttf")]:
+            font, fontpath = self.compile_font(self.getpath(ttx), suffix)
+            unicodes = sorted(set(u for t in font["cmap"].tables
+                                    if t.isUnicode() for u in t.cmap))
+            prepared = subset.PreparedFont(fontpath)
+            if suffix == ".otf":
+                self.assertTrue(any(prepared._cff_subrs_used.values()), ttx)
+            requests = [unicodes[i::4] for i in range(4)] + [unicodes, []]
+
+            def subsetData(request):
+                buf = BytesIO()
+                subset.save_font(prepared.subset(unicodes=request), buf,
+                                 prepared.options)
+                return buf.getvalue()
+
+            expected = [subsetData(request) for request in requests]
+            results = [None] * len(requests) * 3
+            errors = []
+            def work(i):
+                try:
+                    results[i] = subsetData(requests[i % len(requests)])
+                except Exception as e:
+                    errors.append(e)
+            threads = [threading.Thread(target=work, args=(i,))
+                       for i in range(len(results))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(results, expected * 3, ttx)
+
+    def compile_overflowing_font(self):
+        # Adds 130 glyphs, and a GPOS with four class kerning lookups of
+        # about 50K, 1K (unused, which the subsetter prunes to None),
+        # 20K and 20K.  Its data puts all the lookups first, then their
+        # subtables in reverse order, so that it fits.  Laid out the way
+        # fontTools does, each lookup followed by its subtables, the
+        # offset to the last lookup overflows.
+        font = TTFont(recalcBBoxes=False, recalcTimestamp=False)
+        font.importXML(self.getpath("TestTTF-Regular.ttx"))
+        glyphs = ["g%d" % i for i in range(130)]
+        glyphOrder = font.getGlyphOrder() + glyphs
+        font.setGlyphOrder(glyphOrder)
+        font["glyf"].glyphOrder = glyphOrder
+        for i, glyph in enumerate(glyphs):
+            font["glyf"][glyph] = Glyph()
+            font["hmtx"][glyph] = (500, 0)
+            for table in font["cmap"].tables:
+                if table.format == 4:
+                    table.cmap[0xE000 + i] = glyph
+        glyphMap = font.getReverseGlyphMap()
+
+        def compileTable(table):
+            writer = otBase.OTTableWriter(tableTag="GPOS")
+            table.compile(writer, font)
+            return writer.getAllData()
+
+        subtables = []
+        for i, count in enumerate([100, 2, 40, 40]):
+            pairs = {}
+            for a in glyphs[:count]:
+                for b in glyphs[:125]:
+                    value = (glyphMap[a] * glyphMap[b] + i) % 1000 + 1
+                    pairs[((a,), (b,))] = (builder.buildValue(
+                        {"XAdvance": value, "XPlacement": i}), None)
+            lookup = compileTable(builder.buildLookup(
+                [builder.buildPairPosClassesSubtable(pairs, glyphMap)]))
+            # The subtable, with the tables below it, follows the lookup.
+            offset, = struct.unpack(">H", lookup[6:8])
+            subtables.append(lookup[offset:])
+        feature = otTables.FeatureRecord()
+        feature.FeatureTag = "kern"
+        feature.Feature = otTables.Feature()
+        feature.Feature.FeatureParams = None
+        feature.Feature.LookupListIndex = [0, 2, 3]
+        langSys = otTables.DefaultLangSys()
+        langSys.LookupOrder = None
+        langSys.ReqFeatureIndex = 0xFFFF
+        langSys.FeatureIndex = [0]
+        script = otTables.ScriptRecord()
+        script.ScriptTag = "DFLT"
+        script.Script = otTables.Script()
+        script.Script.DefaultLangSys = langSys
+        script.Script.LangSysRecord = []
+        scriptList = otTables.ScriptList()
+        scriptList.ScriptRecord = [script]
+        featureList = otTables.FeatureList()
+        featureList.FeatureRecord = [feature]
+        scriptList = compileTable(scriptList)
+        featureList = compileTable(featureList)
+
+        numLookups = len(subtables)
+        lookupList = struct.pack(">H", numLookups)
+        lookups = b""
+        pos = 2 + 2 * numLookups + 8 * numLookups
+        subtablePos = {}
+        for i in reversed(range(numLookups)):
+            subtablePos[i] = pos
+            pos += len(subtables[i])
+        for i in range(numLookups):
+            lookupPos = 2 + 2 * numLookups + 8 * i
+            lookupList += struct.pack(">H", lookupPos)
+            lookups += struct.pack(">HHHH", 2, 0, 1,
+                                   subtablePos[i] - lookupPos)
+        data = bytesjoin([
+            struct.pack(">LHHH", 0x00010000, 10, 10 + len(scriptList),
+                        10 + len(scriptList) + len(featureList)),
+            scriptList, featureList, lookupList, lookups] +
+            subtables[::-1])
+        font["GPOS"] = DefaultTable("GPOS")
+        font["GPOS"].data = data
+        savepath = self.temp_path(suffix=".ttf")
+        font.save(savepath, reorderTables=None)
+        return font, savepath
+
+    @staticmethod
+    def kerning(font):
+        gpos = font["GPOS"].table
+        features = [gpos.FeatureList.FeatureRecord[i]
+                    for i in gpos.ScriptList.ScriptRecord[0].Script.
+                    DefaultLangSys.FeatureIndex]
+        result = []
+        for feature in features:
+            for lookupIndex in feature.Feature.LookupListIndex:
+                lookup = gpos.LookupList.Lookup[lookupIndex]
+                pairs = {}
+                for subtable in lookup.SubTable:
+                    if lookup.LookupType == 9:
+                        subtable = subtable.ExtSubTable
+                    classDef1 = subtable.ClassDef1.classDefs
+                    classDef2 = subtable.ClassDef2.classDefs
+                    for a in subtable.Coverage.glyphs:
+                        record = subtable.Class1Record[classDef1.get(a, 0)]
+                        for b in font.getGlyphOrder():
+                            value = record.Class2Record[classDef2.get(b, 0)].Value1
+                            if value.XAdvance:
+                                pairs[(a, b)] = (value.XAdvance, value.XPlacement)
+                result.append(pairs)
+        return result
+
+    def test_prepared_font_overflowing_lookups(self):
+        font, fontpath = self.compile_overflowing_font()
+        options = subset.Options()
+        pruned = subset.load_font(fontpath, options)
+        subset.Subsetter(options)._prune_pre_subset(pruned)
+        with CapturingLogHandler(otBase.log, "INFO") as captor:
+            pruned["GPOS"].compile(pruned)
+        self.assertTrue(any(r.msg.startswith("Attempting to fix")
+                            for r in captor.records))
+
+        def reload(font):
+            buf = BytesIO()
+            subset.save_font(font, buf, options)
+            return TTFont(BytesIO(buf.getvalue()))
+
+        prepared = subset.PreparedFont(fontpath, options)
+        unicodes = sorted(set(u for t in font["cmap"].tables
+                                if t.isUnicode() for u in t.cmap))
+        for request in (unicodes[:10], unicodes):
+            expected = subset.load_font(fontpath, options)
+            subsetter = subset.Subsetter(options)
+            subsetter.populate(unicodes=request)
+            subsetter.subset(expected)
+            actual = prepared.subset(unicodes=request)
+            self.assertEqual(actual.getGlyphOrder(),
+                             expected.getGlyphOrder())
+            # The lookups promoted to Extension lookups when the prepared
+            # font was compiled stay so: compare the kerning only.
+            kerning = self.kerning(reload(expected))
+            self.assertEqual(len(kerning), 3)
+            self.assertEqual(self.kerning(reload(actual)), kerning)
+
+    def test_gsub_closure_graph(self):
+        font = TTFont()
+        font.setGlyphOrder([".notdef", "a", "b", "c", "f", "i", "f_i",
+                            "a.sc", "b.sc", "c.alt", "x"])
+        addOpenTypeFeaturesFromString(font, """
+            lookup SMCP { sub [a b] by [a.sc b.sc]; } SMCP;
+            feature smcp { lookup SMCP; } smcp;
+            feature liga { sub f i by f_i; } liga;
+            feature calt { sub x [a b]' lookup SMCP; } calt;
+            feature ss01 { sub a.sc c' by c.alt; } ss01;
+        """)
+        gsub = newTable("GSUB")
+        gsub.decompile(font["GSUB"].compile(font), font)
+        graph = subset.GSUBClosureGraph(gsub)
+        self.assertEqual(graph.produces("a"), {"a.sc"})
+        self.assertEqual(graph.produces("f"), set())
+        self.assertEqual(graph.closure(["f", "i"]), {"f", "i", "f_i"})
+        self.assertEqual(graph.closure(["x", "b", "c"]),
+                         {"x", "b", "b.sc", "c"})
+        self.assertEqual(graph.closure(["x", "a", "c"]),
+                         {"x", "a", "a.sc", "c", "c.alt"})
+        graph = subset.GSUBClosureGraph(gsub, features=["liga"])
+        self.assertEqual(graph.produces("a"), set())
+        self.assertEqual(graph.closure(["f", "i"]), {"f", "i", "f_i"})
+
 if __name__ == "__main__":
     sys.exit(unittest.main())
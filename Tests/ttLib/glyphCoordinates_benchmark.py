@@ -0,0 +1,71 @@
+"""Microbenchmark of the GlyphCoordinates arithmetic, with and without the
+NumPy views.
+
+Run it with 'python Tests/ttLib/glyphCoordinates_benchmark.py [numPoints]'.
+"""
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.ttLib.tables import _g_l_y_f
+from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
+import sys
+import timeit
+
+
+def makeCoordinates(numPoints, isFloat=False):
+    points = [((i * 37) % 2001 - 1000, (i * 53) % 3001 - 1500)
+              for i in range(numPoints)]
+    if isFloat:
+        points = [(x + .25, y - .5) for x, y in points]
+    return GlyphCoordinates(points)
+
+
+OPERATIONS = [
+    ("translate", lambda g, other: g.translate((3, -2))),
+    ("scale", lambda g, other: g.scale((.5, 1.5))),
+    ("transform", lambda g, other: g.transform(((.5, .2), (.3, .8)))),
+    ("iadd", lambda g, other: g.__iadd__(other)),
+    ("imul", lambda g, other: g.__imul__(.75)),
+    ("relativeToAbsolute", lambda g, other: g.relativeToAbsolute()),
+    ("absoluteToRelative", lambda g, other: g.absoluteToRelative()),
+    ("toInt", lambda g, other: g.toInt()),
+]
+
+
+def timeOperation(operation, numPoints, repeat=5):
+    coordinates = [(makeCoordinates(numPoints, isFloat=True),
+                    makeCoordinates(numPoints)) for _ in range(repeat)]
+    best = None
+    for g, other in coordinates:
+        start = timeit.default_timer()
+        operation(g, other)
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    numPoints = int(args[0]) if args else 10000
+    np = _g_l_y_f.np
+    if np is None:
+        print("NumPy is not installed; only timing the loops")
+    print("%d points" % numPoints)
+    print("%-20s %12s %12s %8s" % ("operation", "loops (ms)", "NumPy (ms)",
+                                   "speedup"))
+    for name, operation in OPERATIONS:
+        _g_l_y_f.np = None
+        try:
+            loops = timeOperation(operation, numPoints)
+        finally:
+            _g_l_y_f.np = np
+        if np is None:
+            print("%-20s %12.3f" % (name, loops * 1000))
+            continue
+        vectorized = timeOperation(operation, numPoints)
+        print("%-20s %12.3f %12.3f %7.1fx" % (
+            name, loops * 1000, vectorized * 1000, loops / vectorized))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,217 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
-from fontTools.ttLib.sfnt import calcChecksum
+from fontTools.ttLib import TTFont, TTLibError, reorderFontTables
+from fontTools.ttLib.sfnt import (
+    SFNTReader, SFNTWriter, SFNTStreamWriter, calcChecksum)
+import io
+import os
+import pytest
+import shutil
+import sys
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, "ttx", "data")
+TTF = os.path.join(DATA_DIR, "TestTTF.ttf")
+TTC = os.path.join(DATA_DIR, "TestTTC.ttc")
 
 
 def test_calcChecksum():
     assert calcChecksum(b"abcd") == 1633837924
     assert calcChecksum(b"abcdxyz") == 3655064932
+    assert calcChecksum(memoryview(b"abcdxyz")) == 3655064932
+
+
+class MappedFontTest(object):
+
+    def test_mapped_tables(self, tmpdir):
+        path = os.path.join(str(tmpdir), "TestTTF.ttf")
+        shutil.copy(TTF, path)
+        font = TTFont(path, mmap=True)
+        assert font.reader.mappedFile is not None
+        if sys.version_info >= (3,):
+            assert isinstance(font.reader["glyf"], memoryview)
+            # glyph data are views on the file, other tables get a copy
+            assert isinstance(font["glyf"].glyphs["period"].data, memoryview)
+        assert isinstance(font["head"].unitsPerEm, int)
+        buf = BytesIO()
+        font.save(buf)
+        buf.seek(0)
+        assert TTFont(buf).getTableData("glyf") == \
+            TTFont(TTF).getTableData("glyf")
+        font.close()
+
+    def test_save_to_mapped_file(self, tmpdir):
+        path = os.path.join(str(tmpdir), "TestTTF.ttf")
+        shutil.copy(TTF, path)
+        font = TTFont(path, mmap=True, recalcBBoxes=False)
+        font["name"].getName(1, 3, 1).string = "Mapped"
+        font.save(path)
+        # the font still reads from the data of the old file
+        original = TTFont(TTF)
+        gid = font.getGlyphID("period")
+        assert font["glyf"].glyphs["period"].data == \
+            original.reader["glyf"][original["loca"][gid]:original["loca"][gid+1]]
+        assert font["post"].compile(font) == original["post"].compile(original)
+        font.close()
+        saved = TTFont(path)
+        assert saved["name"].getName(1, 3, 1).toUnicode() == "Mapped"
+        assert saved.getTableData("glyf") == TTFont(TTF).getTableData("glyf")
+
+    def test_collection(self):
+        for fontNumber in range(2):
+            font = TTFont(TTC, fontNumber=fontNumber)
+            mapped = TTFont(TTC, fontNumber=fontNumber, mmap=True)
+            for tag in font.keys():
+                if tag == "GlyphOrder":
+                    continue
+                assert bytes(mapped.reader[tag]) == font.reader[tag]
+                assert mapped[tag].compile(mapped) == font[tag].compile(font)
+            mapped.close()
+
+    def test_unmappable_file(self):
+        with open(TTF, "rb") as f:
+            font = TTFont(BytesIO(f.read()), mmap=True)
+        assert font.reader.mappedFile is None
+        assert font["maxp"].numGlyphs == 6
+
+
+class UnseekableStream(io.RawIOBase):
+
+    def __init__(self):
+        self.stream = BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.stream.write(data)
+
+
+def saveInMemory(font, reorderTables=True):
+    """Save the font like TTFont.save did before streaming the tables."""
+    tags = [tag for tag in font.keys() if tag != "GlyphOrder"]
+    tmp = BytesIO()
+    writer = SFNTWriter(tmp, len(tags), font.sfntVersion)
+    done = []
+    for tag in tags:
+        font._writeTable(tag, writer, done)
+    writer.close()
+    if reorderTables is None:
+        return tmp.getvalue()
+    tableOrder = list(font.reader.keys()) if reorderTables is False else None
+    tmp.seek(0)
+    out = BytesIO()
+    reorderFontTables(tmp, out, tableOrder)
+    return out.getvalue()
+
+
+class StreamWriterTest(object):
+
+    @pytest.mark.parametrize("reorderTables", [None, False, True])
+    @pytest.mark.parametrize("lazy", [None, True])
+    def test_save(self, reorderTables, lazy):
+        font = TTFont(TTF, lazy=lazy, recalcTimestamp=False)
+        font["name"].getName(1, 3, 1).string = "Streamed"
+        expected = saveInMemory(font, reorderTables)
+        buf = BytesIO()
+        buf.write(b"prefix")
+        font.save(buf, reorderTables=reorderTables)
+        assert buf.getvalue() == b"prefix" + expected
+        unseekable = UnseekableStream()
+        font.save(unseekable, reorderTables=reorderTables)
+        assert unseekable.stream.getvalue() == expected
+
+    def test_table_order(self):
+        font = TTFont(TTF)
+        buf = BytesIO()
+        font.save(buf)
+        buf.seek(0)
+        reader = SFNTReader(buf)
+        tags = list(reader.keys())
+        assert tags[:4] == ["head", "hhea", "maxp", "OS/2"]
+        assert tags.index("loca") < tags.index("glyf")
+        buf = BytesIO()
+        font.save(buf, reorderTables=None)
+        buf.seek(0)
+        reader = SFNTReader(buf)
+        # tables are written as they are compiled
+        tags = list(reader.keys())
+        assert tags.index("glyf") < tags.index("loca") < tags.index("head")
+
+    def test_copy_tables(self, monkeypatch):
+        font = TTFont(TTF, recalcTimestamp=False)
+        expected = saveInMemory(font)
+        monkeypatch.setattr(SFNTStreamWriter, "copyBlockSize", 8)
+        for stream in (BytesIO(), UnseekableStream()):
+            font.save(stream)
+            if isinstance(stream, UnseekableStream):
+                stream = stream.stream
+            assert stream.getvalue() == expected
+        # the tables were copied without being decompiled
+        assert not any(font.isLoaded(tag) for tag in font.reader.keys())
+        saved = TTFont(BytesIO(expected), checkChecksums=2)
+        for tag in font.reader.keys():
+            assert saved.getTableData(tag) == font.getTableData(tag)
+
+    def test_wrong_number_of_tables(self):
+        font = TTFont(TTF)
+        writer = SFNTStreamWriter(BytesIO(), 2)
+        writer["head"] = font.getTableData("head")
+        with pytest.raises(TTLibError):
+            writer["head"] = font.getTableData("head")
+        with pytest.raises(TTLibError):
+            writer.close()
+
+
+class ParallelSaveTest(object):
+
+    @pytest.mark.parametrize("flavor", [None, "woff"])
+    @pytest.mark.parametrize("reorderTables", [None, True])
+    def test_save(self, flavor, reorderTables):
+        font = TTFont(TTF, recalcTimestamp=False)
+        font.flavor = flavor
+        for tag in font.keys():
+            font[tag]
+        buf = BytesIO()
+        font.save(buf, reorderTables=reorderTables)
+        expected = buf.getvalue()
+        font = TTFont(TTF, recalcTimestamp=False)
+        font.flavor = flavor
+        for tag in font.keys():
+            font[tag]
+        buf = BytesIO()
+        font.save(buf, reorderTables=reorderTables, jobs=2)
+        assert buf.getvalue() == expected
+
+    def test_independent_tables(self):
+        font = TTFont(TTF)
+        font["cmap"]
+        font["hmtx"]
+        font["head"]
+        pool, compiled = font._compileTablesInPool(
+            [tag for tag in font.keys() if tag != "GlyphOrder"], 2)
+        try:
+            assert "cmap" in compiled
+            # hhea depends on hmtx, and OS/2 on head
+            assert "hmtx" not in compiled and "head" not in compiled
+            # cmap is not sent back, as compiling it doesn't change it
+            assert compiled["cmap"].get() == (font.getTableData("cmap"), None)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def test_invalid_jobs(self):
+        # checked even when all the tables are copied from the file
+        font = TTFont(TTF)
+        with pytest.raises(ValueError):
+            font.save(BytesIO(), jobs=-1)
+        for jobs in (1.5, "2", None):
+            with pytest.raises(TypeError):
+                font.save(BytesIO(), jobs=jobs)
+
+    def test_error(self):
+        font = TTFont(TTF)
+        font["post"].formatType = 42
+        with pytest.raises(Exception):
+            font.save(BytesIO(), jobs=2)
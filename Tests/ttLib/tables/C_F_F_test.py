@@ -4,6 +4,8 @@ from __future__ import print_function, division, absolute_import
 from __future__ import unicode_literals
 from fontTools.misc.py23 import *
 from fontTools.ttLib import TTFont, newTable
+from fontTools.misc.loggingTools import CapturingLogHandler
+from fontTools import cffLib
 import re
 import os
 import unittest
@@ -45,6 +47,58 @@ class CFFTableTest(unittest.TestCase):
         cffData = cffTable.compile(font)
         self.assertEqual(cffData, self.cffData)
 
+    def test_fromXML_bytecode(self):
+        font = TTFont(sfntVersion='OTTO')
+        font.importXML(CFF_TTX)
+        charStrings = font['CFF '].cff.topDictIndex[0].CharStrings
+        for charString in charStrings.values():
+            self.assertTrue(charString.needsDecompilation())
+        self.assertEqual(charStrings['A'].program[-1], 'endchar')
+        self.assertFalse(charStrings['A'].needsDecompilation())
+        out = UnicodeIO()
+        font.saveXML(out)
+        cffXML = strip_ttLibVersion(out.getvalue()).splitlines()
+        self.assertEqual(cffXML, self.cffXML)
+
+    def test_compile_unloaded(self):
+        font = TTFont(sfntVersion='OTTO')
+        cffTable = font['CFF '] = newTable('CFF ')
+        cffTable.decompile(self.cffData, font)
+        cff = cffTable.cff
+        charStringsIndex = cff.topDictIndex[0].CharStrings.charStringsIndex
+        self.assertEqual(cffTable.compile(font), self.cffData)
+        # the charstrings were copied without producing them
+        self.assertEqual(set(charStringsIndex.items), {None})
+
+    def test_compile_passes(self):
+        font = TTFont(sfntVersion='OTTO')
+        cffTable = font['CFF '] = newTable('CFF ')
+        cffTable.decompile(self.cffData, font)
+        level = cffLib.log.level
+        with CapturingLogHandler(cffLib.log, cffLib.DEBUG) as captor:
+            # setLevel() also clears the logger's cache of enabled levels
+            cffLib.log.setLevel(cffLib.DEBUG)
+            try:
+                self.assertEqual(cffTable.compile(font), self.cffData)
+            finally:
+                cffLib.log.setLevel(level)
+        messages = [record.getMessage() for record in captor.records]
+        self.assertTrue(any(re.search(r"found the positions in [1-3] passes",
+                                      message) for message in messages))
+
+    def test_compile_positions_dont_converge(self):
+        class GrowingItem(object):
+            length = 0
+            def getDataLength(self):
+                self.length += 1
+                return self.length
+        writer = cffLib.CFFWriter(isCFF2=False)
+        writer.add(b"\x01\x00\x04")
+        writer.add(b"\x01")
+        writer.add(GrowingItem())
+        with self.assertRaises(ValueError):
+            writer.toFile(BytesIO())
+
 
 if __name__ == "__main__":
     import sys
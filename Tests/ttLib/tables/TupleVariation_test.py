@@ -472,6 +472,24 @@ class TupleVariationTest(unittest.TestCase):
 		# delta for cvts: [1, 2, 4]
 		self.assertEqual("02 01 02 04", hexencode(var.compileDeltas(cvts)))
 
+	def test_getDataSize(self):
+		var = TupleVariation({}, [(0,0), (1, 0), (2, 0), None, (4, 0), (300, 0)])
+		self.assertEqual(var.getDataSize(), len(var.compile(["wght"], {}, None)[1]))
+		var = TupleVariation({}, [(1, -200)] * 5)
+		self.assertEqual(var.getDataSize(), len(var.compile(["wght"], {}, None)[1]))
+		getPointsSize = lambda p: TupleVariation.getPointsSize_(set(p), numPointsInGlyph=999)
+		for points in ([], range(999), [7], [65535], [7, 8, 255, 257, 258, 500],
+		               [7, 8, 0xBEEF, 0xCAFE], range(300), range(0, 2000, 7)):
+			self.assertEqual(getPointsSize(points),
+			                 len(TupleVariation.compilePoints(set(points), 999)))
+
+	def test_getDeltaValuesSize(self):
+		for values in ([], [0], [0] * 65, [1, 2, 3, 127, -128, -1, -2], [127] * 65,
+		               [15, 15, 0, 15, 15], [15, 15, 0, 0, 15, 15], [0x6666, 0, 0x7777],
+		               [0x6666, 2, 0x7777], [0x6666, 2, 2, 0x7777], [-129] * 100):
+			self.assertEqual(TupleVariation.getDeltaValuesSize_(values),
+			                 len(TupleVariation.compileDeltaValues_(values)))
+
 	def test_compileDeltaValues(self):
 		compileDeltaValues = lambda values: hexencode(TupleVariation.compileDeltaValues_(values))
 		# zeroes
@@ -546,7 +564,7 @@ class TupleVariationTest(unittest.TestCase):
 		# three times; {"wght": 1.0, "wdth": 0.8} appears twice.
 		# Because the start and end of variation ranges is not encoded
 		# into the shared pool, they should get ignored.
-		deltas = [None] * 4
+		deltas = [(1, 0)] + [None] * 3
 		variations = [
 			TupleVariation({
 				"wght": (1.0, 1.0, 1.0),
@@ -576,6 +594,10 @@ class TupleVariationTest(unittest.TestCase):
 		result = compileSharedTuples(["wght", "wdth"], variations)
 		self.assertEqual([hexencode(c) for c in result],
 		                 ["40 00 2C CD", "40 00 33 33"])
+		# variations without impact get dropped, and don't count
+		variations[2].coordinates = [None] * 4
+		result = compileSharedTuples(["wght", "wdth"], variations)
+		self.assertEqual([hexencode(c) for c in result], ["40 00 2C CD"])
 
 	def test_decompileSharedTuples_Skia(self):
 		sharedTuples = decompileSharedTuples(
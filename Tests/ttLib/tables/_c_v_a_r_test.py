@@ -21,6 +21,19 @@ CVAR_DATA = deHexStr(
     "00 02 03 01 04 " # 24: all values; deltas=[3, 1, 4]
     "00 02 09 07 08") # 29: all values; deltas=[9, 7, 8]
 
+CVAR_DATA_SHARED_POINTS = deHexStr(
+    "0001 0000 "      #  0: majorVersion=1 minorVersion=0
+    "8002 0018 "      #  4: tupleVariationCount=2|SHARED_POINTS offsetToData=24
+    "0004 "           #  8: tvHeader[0].variationDataSize=4
+    "8000 "           # 10: tvHeader[0].tupleIndex=EMBEDDED_PEAK
+    "4000 0000 "      # 12: tvHeader[0].peakTuple=[1.0, 0.0]
+    "0004 "           # 16: tvHeader[1].variationDataSize=4
+    "8000 "           # 18: tvHeader[1].tupleIndex=EMBEDDED_PEAK
+    "C000 3333 "      # 20: tvHeader[1].peakTuple=[-1.0, 0.8]
+    "00 "             # 24: shared points: all values
+    "02 03 01 04 "    # 25: deltas=[3, 1, 4]
+    "02 09 07 08")    # 29: deltas=[9, 7, 8]
+
 CVAR_XML = [
     '<version major="1" minor="0"/>',
     '<tuple>',
@@ -58,6 +71,13 @@ class CVARTableTest(unittest.TestCase):
     def test_compile(self):
         font, cvar = self.makeFont()
         cvar.variations = CVAR_VARIATIONS
+        self.assertEqual(hexStr(cvar.compile(font)),
+                         hexStr(CVAR_DATA_SHARED_POINTS))
+
+    def test_compile_no_shared_points(self):
+        font, cvar = self.makeFont()
+        cvar.variations = CVAR_VARIATIONS
+        cvar.useSharedPoints = False
         self.assertEqual(hexStr(cvar.compile(font)), hexStr(CVAR_DATA))
 
     def test_decompile(self):
@@ -67,6 +87,11 @@ class CVARTableTest(unittest.TestCase):
         self.assertEqual(cvar.minorVersion, 0)
         self.assertEqual(cvar.variations, CVAR_VARIATIONS)
 
+    def test_decompile_shared_points(self):
+        font, cvar = self.makeFont()
+        cvar.decompile(CVAR_DATA_SHARED_POINTS, font)
+        self.assertEqual(cvar.variations, CVAR_VARIATIONS)
+
     def test_fromXML(self):
         font, cvar = self.makeFont()
         for name, attrs, content in parseXML(CVAR_XML):
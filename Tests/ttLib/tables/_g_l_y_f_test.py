@@ -1,10 +1,20 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
-from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.tables import _g_l_y_f
+from fontTools.ttLib.tables._g_l_y_f import (
+    Glyph, GlyphComponent, GlyphCoordinates, GlyphColumns)
+import copy
+import gc
+import os
 import sys
 import pytest
 
 
+CURR_DIR = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
+TTX = os.path.join(CURR_DIR, os.pardir, 'data', 'TestTTF-Regular.ttx')
+
+
 class GlyphCoordinatesTest(object):
 
     def test_translate(self):
@@ -150,3 +160,262 @@ class GlyphCoordinatesTest(object):
         # since the Python float is truncated to a C float.
         # when using typecode 'd' it should return the correct value 243
         assert g[0][0] == round(afloat)
+
+
+def makeCoordinates(isFloat):
+    points = [((i * 37) % 201 - 100, (i * 53) % 301 - 150) for i in range(100)]
+    if isFloat:
+        points = [(x + .25, y - .5) for x, y in points]
+    return GlyphCoordinates(points)
+
+
+COORDINATE_OPERATIONS = [
+    lambda g: g.translate((3, -2)),
+    lambda g: g.translate((.5, 0)),
+    lambda g: g.scale((2, 3)),
+    lambda g: g.scale((.5, 1.5)),
+    lambda g: g.transform(((1, 0), (0, 1))),
+    lambda g: g.transform(((2., 0), (0, -1.))),
+    lambda g: g.transform(((.5, .2), (.3, .8))),
+    lambda g: g.relativeToAbsolute(),
+    lambda g: g.absoluteToRelative(),
+    lambda g: g.toInt(),
+    lambda g: g.__iadd__(makeCoordinates(False)),
+    lambda g: g.__isub__(makeCoordinates(True)),
+    lambda g: g.__neg__(),
+    lambda g: g.translate((32700, 0)),
+]
+
+
+@pytest.mark.skipif(_g_l_y_f.np is None, reason="requires NumPy")
+class GlyphCoordinatesNumPyTest(object):
+
+    @pytest.mark.parametrize("isFloat", [False, True])
+    @pytest.mark.parametrize("operation", COORDINATE_OPERATIONS)
+    def test_same_as_loops(self, operation, isFloat, monkeypatch):
+        results = []
+        for np in (_g_l_y_f.np, None):
+            monkeypatch.setattr(_g_l_y_f, "np", np)
+            g = makeCoordinates(isFloat)
+            try:
+                result = operation(g)
+            except OverflowError:
+                results.append(OverflowError)
+                continue
+            if result is None:
+                result = g
+            results.append((result.array.typecode, result.array.tostring()))
+        assert results[0] == results[1]
+
+
+@pytest.fixture(scope="module")
+def fontData():
+    font = TTFont()
+    font.importXML(TTX)
+    buf = BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def loadFonts(fontData):
+    font = TTFont(BytesIO(fontData))
+    font["glyf"]
+    columnar = TTFont(BytesIO(fontData), columnarGlyf=True)
+    columnar["glyf"]
+    return font, columnar
+
+
+class GlyphColumnsTest(object):
+
+    def test_decompile(self, fontData):
+        font, columnar = loadFonts(fontData)
+        glyf, columnarGlyf = font["glyf"], columnar["glyf"]
+        period = columnarGlyf.glyphs["period"]
+        assert isinstance(period.columns, GlyphColumns)
+        assert period.getMaxpValues() == (4, 1)
+        assert not period.isComposite()
+        # Composite glyphs are not stored in the columns.
+        assert not hasattr(columnarGlyf.glyphs["ellipsis"], "columns")
+
+        for glyphName in font.getGlyphOrder():
+            assert glyf[glyphName] == columnarGlyf[glyphName]
+            assert not hasattr(columnarGlyf.glyphs[glyphName], "columns")
+
+    def test_per_font(self, fontData):
+        columnar = TTFont(BytesIO(fontData), columnarGlyf=True)
+        font = TTFont(BytesIO(fontData))
+        # Decompile the tables interleaved: each font keeps its own setting.
+        columnarGlyf, glyf = columnar["glyf"], font["glyf"]
+        assert hasattr(columnarGlyf.glyphs["period"], "columns")
+        assert not hasattr(glyf.glyphs["period"], "columns")
+        glyf2 = TTFont(BytesIO(fontData))["glyf"]
+        assert not hasattr(glyf2.glyphs["period"], "columns")
+
+    def test_mmap(self, fontData, tmpdir):
+        path = os.path.join(str(tmpdir), "font.ttf")
+        with open(path, "wb") as f:
+            f.write(fontData)
+        font = TTFont(BytesIO(fontData))
+        columnar = TTFont(path, mmap=True, columnarGlyf=True)
+        try:
+            glyf = columnar["glyf"]
+            assert hasattr(glyf.glyphs["period"], "columns")
+            for glyphName in font.getGlyphOrder():
+                assert glyf[glyphName] == font["glyf"][glyphName]
+        finally:
+            columnar.close()
+
+    def test_compile(self, fontData):
+        font, columnar = loadFonts(fontData)
+        assert columnar["glyf"].compile(columnar) == font["glyf"].compile(font)
+        # maxp and hhea get what they need without expanding glyphs.
+        buf = BytesIO()
+        columnar.save(buf)
+        assert hasattr(columnar["glyf"].glyphs["period"], "columns")
+        assert buf.getvalue() == fontData
+
+    def test_expanded_glyph(self, fontData):
+        font, columnar = loadFonts(fontData)
+        glyph = font["glyf"]["period"]
+        columnarGlyph = columnar["glyf"]["period"]
+        # Outline data is made on first use.
+        coordinates = columnarGlyph.coordinates
+        assert not hasattr(columnarGlyph, "columns")
+        assert coordinates == glyph.coordinates
+        if sys.version_info >= (3,):
+            assert isinstance(coordinates.array, memoryview)
+
+        for g in (glyph, columnarGlyph):
+            g.coordinates.translate((10, 0))
+            g.coordinates.append((1, 2))
+            g.endPtsOfContours[-1] += 1
+            g.flags.append(1)
+        assert columnarGlyph == glyph
+        assert (columnar["glyf"].compile(columnar) ==
+                font["glyf"].compile(font))
+
+    def test_trim(self, fontData):
+        font, columnar = loadFonts(fontData)
+        for f in (font, columnar):
+            for glyph in f["glyf"].glyphs.values():
+                glyph.trim(remove_hinting=True)
+        assert hasattr(columnar["glyf"].glyphs["period"], "columns")
+        assert columnar["glyf"]["period"].program.getBytecode() == b""
+        assert (columnar["glyf"].compile(columnar) ==
+                font["glyf"].compile(font))
+
+    def test_copy(self, fontData):
+        font, columnar = loadFonts(fontData)
+        glyphs = columnar["glyf"].glyphs
+        glyphs[".notdef"].coordinates
+        glyphsCopy = copy.deepcopy(glyphs)
+        assert glyphsCopy[".notdef"] == font["glyf"][".notdef"]
+        assert glyphsCopy["period"].columns is not glyphs["period"].columns
+
+
+def addNestedComposite(font):
+    # "nested" uses "ellipsis", which uses "period" three times, and
+    # "period" itself.
+    glyf = font["glyf"]
+    glyph = Glyph()
+    glyph.numberOfContours = -1
+    glyph.components = []
+    for glyphName, x in (("ellipsis", 0), ("period", 1000)):
+        component = GlyphComponent()
+        component.glyphName = glyphName
+        component.x, component.y = x, 10
+        component.flags = 0x4
+        glyph.components.append(component)
+    glyf["nested"] = glyph
+    font["hmtx"].metrics["nested"] = (1200, 55)
+    return glyph
+
+
+class FlattenCacheTest(object):
+
+    def test_getCoordinates(self, fontData):
+        font = TTFont(BytesIO(fontData))
+        glyf = font["glyf"]
+        glyph = addNestedComposite(font)
+        coordinates, endPts, flags = glyph.getCoordinates(glyf)
+        period = list(glyf["period"].coordinates)
+        assert list(coordinates) == [
+            (x + dx, y + 10)
+            for dx in (0, 241, 482, 1000)
+            for x, y in period]
+        assert endPts == [3, 7, 11, 15]
+        assert list(flags) == [1] * 16
+        assert "ellipsis" in glyf.flattenCache.entries
+        assert "nested" in glyf.flattenCache.entries
+        # the results are the caller's own
+        coordinates.translate((1, 1))
+        assert glyph.getCoordinates(glyf)[0][0] == (55, 132)
+
+    def test_recalcBounds_and_maxp(self, fontData):
+        font = TTFont(BytesIO(fontData))
+        glyf = font["glyf"]
+        glyph = addNestedComposite(font)
+        glyph.recalcBounds(glyf)
+        assert (glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax) == (
+            55, 10, 1186, 132)
+        assert glyph.getCompositeMaxpValues(glyf) == (16, 4, 2)
+        assert glyph.getCompositeMaxpValues(glyf, 3) == (16, 4, 4)
+        assert glyf["ellipsis"].getCompositeMaxpValues(glyf) == (12, 3, 1)
+        font["maxp"].recalc(font)
+        assert font["maxp"].maxComponentDepth == 2
+
+    def test_invalidation(self, fontData):
+        font = TTFont(BytesIO(fontData))
+        glyf = font["glyf"]
+        glyph = addNestedComposite(font)
+        glyph.recalcBounds(glyf)
+        assert glyph.xMax == 1186
+
+        # coordinates changed in place
+        glyf["period"].coordinates.translate((10, 0))
+        glyph.recalcBounds(glyf)
+        assert glyph.xMax == 1196
+        glyf["period"].coordinates[0] = (0, 0)
+        glyph.recalcBounds(glyf)
+        assert glyph.xMin == 0
+
+        # coordinates replaced
+        glyf["period"].coordinates = GlyphCoordinates(
+            [(0, 0), (10, 0), (10, 10), (0, 10)])
+        glyph.recalcBounds(glyf)
+        assert (glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax) == (
+            0, 10, 1010, 20)
+
+        # component moved
+        glyf["ellipsis"].components[2].y = 100
+        glyph.recalcBounds(glyf)
+        assert glyph.yMax == 120
+
+        # glyph replaced
+        glyf["period"] = Glyph()
+        assert not glyf.flattenCache.entries
+        glyph.recalcBounds(glyf)
+        assert (glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax) == (0, 0, 0, 0)
+        assert glyph.getCompositeMaxpValues(glyf) == (0, 0, 2)
+
+    def test_table_equality(self, fontData):
+        glyf = TTFont(BytesIO(fontData))["glyf"]
+        other = TTFont(BytesIO(fontData))["glyf"]
+        for glyphName in glyf.keys():
+            glyf[glyphName]
+            other[glyphName]
+        glyf["ellipsis"].recalcBounds(glyf)
+        assert glyf.flattenCache.entries
+        assert "_flattenCache" not in vars(glyf)
+        assert glyf == other
+        assert copy.deepcopy(glyf) == glyf
+        assert not copy.deepcopy(glyf).flattenCache.entries
+
+    def test_cache_released(self, fontData):
+        glyf = TTFont(BytesIO(fontData))["glyf"]
+        glyf["ellipsis"].recalcBounds(glyf)
+        key = id(glyf)
+        assert key in _g_l_y_f._flattenCaches
+        del glyf
+        gc.collect()
+        assert key not in _g_l_y_f._flattenCaches
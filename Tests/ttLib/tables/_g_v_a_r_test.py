@@ -4,7 +4,10 @@ from fontTools.misc.testTools import FakeFont, getXML, parseXML
 from fontTools.misc.textTools import deHexStr, hexStr
 from fontTools.ttLib import TTLibError, getTableClass, getTableModule, newTable
 import unittest
-from fontTools.ttLib.tables.TupleVariation import TupleVariation
+from fontTools.ttLib.tables.TupleVariation import (
+	TupleVariation, TUPLES_SHARE_POINT_NUMBERS)
+from fontTools.ttLib.tables._g_v_a_r import GVAR_HEADER_SIZE
+import struct
 
 
 gvarClass = getTableClass("gvar")
@@ -152,6 +155,31 @@ class GVARTableTest(unittest.TestCase):
 		font, gvar = self.makeFont(GVAR_VARIATIONS)
 		self.assertEqual(hexStr(gvar.compile(font)), hexStr(GVAR_DATA))
 
+	def tupleVariationCounts(self, font, data):
+		gvar = newTable("gvar")
+		gvar.decompile(data, font)
+		offsets = gvarClass.decompileOffsets_(
+			data[GVAR_HEADER_SIZE:], tableFormat=(gvar.flags & 1),
+			glyphCount=gvar.glyphCount)
+		start = gvar.offsetToGlyphVariationData
+		return [struct.unpack(">H", data[start+o:start+o+2])[0]
+		        for o, end in zip(offsets, offsets[1:]) if end > o]
+
+	def test_compile_sharedPoints(self):
+		allPoints = {"I": [
+			TupleVariation({"wght": (0.0, 1.0, 1.0)}, [(1, 1)] * 8),
+			TupleVariation({"wdth": (0.0, 1.0, 1.0)}, [(2, 2)] * 8),
+		]}
+		font, gvar = self.makeFont(allPoints)
+		counts = self.tupleVariationCounts(font, gvar.compile(font))
+		self.assertEqual([TUPLES_SHARE_POINT_NUMBERS | 2], counts)
+
+		font, gvar = self.makeFont(allPoints)
+		gvar.useSharedPoints = False
+		counts = self.tupleVariationCounts(font, gvar.compile(font))
+		self.assertEqual([2], counts)
+		self.assertFalse(any(c & TUPLES_SHARE_POINT_NUMBERS for c in counts))
+
 	def test_compile_noVariations(self):
 		font, gvar = self.makeFont({})
 		self.assertEqual(hexStr(gvar.compile(font)),
@@ -167,6 +195,17 @@ class GVARTableTest(unittest.TestCase):
 		gvar.decompile(GVAR_DATA, font)
 		self.assertEqual(gvar.variations, GVAR_VARIATIONS)
 
+	def test_decompile_lazy(self):
+		font, gvar = self.makeFont({})
+		font.lazy = True
+		gvar.decompile(GVAR_DATA, font)
+		self.assertTrue(callable(gvar.variations.data["I"]))
+		self.assertEqual(gvar.variations["I"], GVAR_VARIATIONS["I"])
+		self.assertEqual(gvar.variations.data["I"], GVAR_VARIATIONS["I"])
+		self.assertTrue(callable(gvar.variations.data["space"]))
+		self.assertEqual(dict(gvar.variations.items()), GVAR_VARIATIONS)
+		self.assertEqual(hexStr(gvar.compile(font)), hexStr(GVAR_DATA))
+
 	def test_decompile_noVariations(self):
 		font, gvar = self.makeFont({})
 		gvar.decompile(GVAR_DATA_EMPTY_VARIATIONS, font)
@@ -62,6 +62,40 @@ class HmtxTableTest(unittest.TestCase):
         self.assertEqual(mtxTable['C'], (632, 54))
         self.assertEqual(mtxTable['D'], (632, -4))
 
+    def test_decompile_compile_arrays(self):
+        font = self.makeFont(numGlyphs=4, numberOfMetrics=2)
+        data = deHexStr("02A2 FFF5 0278 004F 0036 FFFC")
+
+        mtxTable = font[self.tag] = newTable(self.tag)
+        mtxTable.decompile(data, font)
+
+        self.assertEqual(mtxTable.metrics, {
+            'A': (674, -11), 'B': (632, 79), 'C': (632, 54), 'D': (632, -4)})
+        self.assertEqual(mtxTable.compile(font), data)
+
+    def test_decompile_modify_metrics(self):
+        font = self.makeFont(numGlyphs=3, numberOfMetrics=3)
+        data = deHexStr("02A2 FFF5 0278 004F 02C6 0036")
+
+        mtxTable = font[self.tag] = newTable(self.tag)
+        mtxTable.decompile(data, font)
+        metrics = mtxTable.metrics
+        metrics['A'] = (674.4, -11)
+        metrics['C'] = (632, 54)
+        del metrics['B']
+        metrics['X'] = (1, 2)
+
+        self.assertEqual(
+            metrics, {'A': (674.4, -11), 'C': (632, 54), 'X': (1, 2)})
+        self.assertEqual(len(metrics), 3)
+        self.assertFalse('B' in metrics)
+        with self.assertRaises(KeyError):
+            del metrics['B']
+        metrics['B'] = (632, 79)
+        self.assertEqual(
+            mtxTable.compile(font),
+            deHexStr("02A2 FFF5 0278 004F 0036"))
+
     def test_decompile_not_enough_data(self):
         font = self.makeFont(numGlyphs=1, numberOfMetrics=1)
         mtxTable = newTable(self.tag)
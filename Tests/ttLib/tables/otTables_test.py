@@ -2,6 +2,9 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.testTools import parseXML, FakeFont
 from fontTools.misc.xmlWriter import XMLWriter
+from fontTools.misc.loggingTools import CapturingLogHandler
+from fontTools.ttLib import TTFont, newTable
+from fontTools.otlLib import builder
 import fontTools.ttLib.tables.otTables as otTables
 import unittest
 
@@ -367,6 +370,106 @@ class AlternateSubstTest(unittest.TestCase):
         })
 
 
+class OverflowTest(unittest.TestCase):
+    # A small lookup followed by two of ~68K each: both large ones overflow
+    # within their PairPos subtable, and the offset to the last lookup
+    # overflows as well.
+
+    def makeFont(self):
+        glyphs = [".notdef"] + ["g%d" % i for i in range(130)]
+        font = TTFont()
+        font.setGlyphOrder(glyphs)
+        glyphMap = font.getReverseGlyphMap()
+        lookups = []
+        for i, count in enumerate([2, 130, 130]):
+            pairs = {}
+            for a in glyphs[1:count + 1]:
+                for b in glyphs[1:]:
+                    value = (glyphMap[a] * glyphMap[b] + i) % 1000 + 1
+                    pairs[(a, b)] = (builder.buildValue({"XAdvance": value}), None)
+            lookups.append(
+                builder.buildLookup(builder.buildPairPosGlyphs(pairs, glyphMap)))
+        gpos = otTables.GPOS()
+        gpos.Version = 0x00010000
+        gpos.ScriptList = otTables.ScriptList()
+        gpos.ScriptList.ScriptRecord = []
+        gpos.FeatureList = otTables.FeatureList()
+        gpos.FeatureList.FeatureRecord = []
+        gpos.LookupList = otTables.LookupList()
+        gpos.LookupList.Lookup = lookups
+        font["GPOS"] = newTable("GPOS")
+        font["GPOS"].table = gpos
+        return font
+
+    def getPairs(self, gpos):
+        result = []
+        for lookup in gpos.LookupList.Lookup:
+            pairs = {}
+            for subtable in lookup.SubTable:
+                if lookup.LookupType == 9:
+                    subtable = subtable.ExtSubTable
+                for glyph, pairSet in zip(subtable.Coverage.glyphs, subtable.PairSet):
+                    for record in pairSet.PairValueRecord:
+                        pairs[(glyph, record.SecondGlyph)] = record.Value1.XAdvance
+            result.append(pairs)
+        return result
+
+    def test_compile_fixes_all_overflows_at_once(self):
+        font = self.makeFont()
+        expected = self.getPairs(font["GPOS"].table)
+        with CapturingLogHandler("fontTools.ttLib.tables.otBase", "INFO") as captor:
+            data = font["GPOS"].compile(font)
+        attempts = [r for r in captor.records
+                    if r.msg.startswith("Attempting to fix")]
+        # Fixing one overflow per compile took five passes.
+        self.assertEqual(len(attempts), 1)
+        self.assertIn("(4 passes saved)", captor.records[-1].getMessage())
+
+        gpos = newTable("GPOS")
+        gpos.decompile(data, font)
+        lookups = gpos.table.LookupList.Lookup
+        self.assertEqual([l.LookupType for l in lookups], [2, 9, 2])
+        self.assertEqual([len(l.SubTable) for l in lookups], [1, 2, 2])
+        self.assertEqual(self.getPairs(gpos.table), expected)
+        # Compiling the fixed table again gives the same result.
+        self.assertEqual(font["GPOS"].compile(font), data)
+
+    def test_compile_with_None_lookups(self):
+        # The subsetter leaves None in place of the lookups it prunes.
+        font = self.makeFont()
+        lookups = font["GPOS"].table.LookupList.Lookup
+        lookups.insert(1, None)
+        data = font["GPOS"].compile(font)
+        self.assertEqual([l and l.LookupType for l in lookups], [2, None, 9, 2])
+        self.assertEqual(font["GPOS"].compile(font), data)
+
+    def test_save_in_worker_process(self):
+        font = self.makeFont()
+        expected = self.getPairs(font["GPOS"].table)
+        font.save(BytesIO(), jobs=2)
+        # The table fixed in the worker replaced the font's one.
+        lookups = font["GPOS"].table.LookupList.Lookup
+        self.assertEqual([l.LookupType for l in lookups], [2, 9, 2])
+        self.assertEqual([len(l.SubTable) for l in lookups], [1, 2, 2])
+        self.assertEqual(self.getPairs(font["GPOS"].table), expected)
+
+    def test_compile_reuses_unmodified_subtables(self):
+        font = self.makeFont()
+        compiled = []
+        compile = otTables.PairPos.compile
+        def countingCompile(subtable, writer, font):
+            compiled.append(subtable)
+            compile(subtable, writer, font)
+        otTables.PairPos.compile = countingCompile
+        try:
+            font["GPOS"].compile(font)
+        finally:
+            otTables.PairPos.compile = compile
+        # All three subtables in the first pass, then only the halves of
+        # the two that were split.
+        self.assertEqual(len(compiled), 7)
+
+
 if __name__ == "__main__":
     import sys
     sys.exit(unittest.main())
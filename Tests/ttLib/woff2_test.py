@@ -6,7 +6,8 @@ from fontTools.ttLib.woff2 import (
 	woff2FlagsSize, woff2UnknownTagSize, woff2Base128MaxSize, WOFF2DirectoryEntry,
 	getKnownTagIndex, packBase128, base128Size, woff2UnknownTagIndex,
 	WOFF2FlavorData, woff2TransformedTableTags, WOFF2GlyfTable, WOFF2LocaTable,
-	WOFF2Writer, unpackBase128, unpack255UShort, pack255UShort)
+	WOFF2Writer, unpackBase128, unpack255UShort, pack255UShort,
+	WOFF2TransformBuffer, reconstructGlyphs)
 import unittest
 from fontTools.misc import sstruct
 import struct
@@ -81,15 +82,24 @@ class WOFF2ReaderTest(unittest.TestCase):
 		header = sstruct.unpack(woff2DirectoryFormat, data)
 		header['totalCompressedSize'] = 0
 		data = sstruct.pack(woff2DirectoryFormat, header)
+		reader = WOFF2Reader(BytesIO(data + self.file.read()))
 		with self.assertRaises((brotli.error, ttLib.TTLibError)):
-			WOFF2Reader(BytesIO(data + self.file.read()))
+			reader['head']
 
 	def test_incorrect_uncompressed_size(self):
-		decompress_backup = brotli.decompress
-		brotli.decompress = lambda data: b""  # return empty byte string
+		reader = WOFF2Reader(self.file)
+		reader.transformBuffer.size += 1
 		with self.assertRaisesRegex(ttLib.TTLibError, 'unexpected size for decompressed'):
-			WOFF2Reader(self.file)
-		brotli.decompress = decompress_backup
+			for tag in reader.keys():
+				reader[tag]
+
+	def test_decompress_lazily(self):
+		reader = WOFF2Reader(self.file)
+		reader.transformBuffer.chunkSize = 16
+		firstTag = min(reader.tables, key=lambda tag: reader.tables[tag].offset)
+		reader[firstTag]
+		self.assertLess(
+			len(reader.transformBuffer.data), reader.transformBuffer.size)
 
 	def test_incorrect_file_size(self):
 		data = self.file.read(woff2DirectorySize)
@@ -156,6 +166,37 @@ class WOFF2ReaderTTFTest(WOFF2ReaderTest):
 			reader.reconstructTable('loca')
 
 
+
+class WOFF2TransformBufferTest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.data = bytes(bytearray(random.randint(0, 255) for _ in range(0x1000)))
+		cls.compressedData = brotli.compress(cls.data * 10)
+
+	def test_read(self):
+		buf = WOFF2TransformBuffer(self.compressedData, len(self.data) * 10)
+		buf.chunkSize = 64
+		buf.seek(10)
+		self.assertEqual(self.data[10:20], buf.read(10))
+		self.assertEqual(20, buf.tell())
+		self.assertLess(len(buf.data), len(self.data))
+		buf.seek(-5, 2)
+		self.assertEqual(self.data[-5:], buf.read())
+		self.assertEqual(b"", buf.read(1))
+		self.assertEqual(self.data * 10, buf.getvalue())
+
+	def test_unexpected_size(self):
+		for size in (len(self.data) * 10 - 1, len(self.data) * 10 + 1):
+			buf = WOFF2TransformBuffer(self.compressedData, size)
+			with self.assertRaisesRegex(ttLib.TTLibError, 'unexpected size'):
+				buf.read()
+
+	def test_truncated(self):
+		buf = WOFF2TransformBuffer(self.compressedData[:-8], len(self.data) * 10)
+		with self.assertRaises((brotli.error, ttLib.TTLibError)):
+			buf.read()
+
 def normalise_table(font, tag, padding=4):
 	""" Return normalised table data. Keep 'font' instance unmodified. """
 	assert tag in ('glyf', 'loca', 'head')
@@ -692,6 +733,20 @@ class WOFF2GlyfTableTest(unittest.TestCase):
 		data = locaTable.compile(self.font)
 		self.assertEqual(self.tables['loca'], data)
 
+	def test_reconstructGlyphs(self):
+		glyphs, indexFormat = reconstructGlyphs(self.transformedGlyfData)
+		self.assertEqual(self.font['head'].indexToLocFormat, indexFormat)
+		glyfTable = WOFF2GlyfTable()
+		glyfTable.reconstruct(self.transformedGlyfData, self.font)
+		expected = [
+			tobytes(glyfTable[glyphName].compile(glyfTable, recalcBBoxes=False))
+			for glyphName in self.glyphOrder]
+		self.assertEqual(expected, glyphs)
+
+	def test_reconstructGlyphs_not_enough_data(self):
+		with self.assertRaisesRegex(ttLib.TTLibError, "not enough 'glyf' data"):
+			reconstructGlyphs(b"")
+
 	def test_reconstruct_glyf_header_not_enough_data(self):
 		with self.assertRaisesRegex(ttLib.TTLibError, "not enough 'glyf' data"):
 			WOFF2GlyfTable().reconstruct(b"", self.font)
@@ -1,7 +1,9 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools import ttx
+from fontTools.misc.loggingTools import CapturingLogHandler
 import getopt
+import multiprocessing
 import os
 import shutil
 import sys
@@ -123,6 +125,57 @@ class TTXTest(unittest.TestCase):
                 (os.path.join(self.tempdir, file_names[i]),
                  os.path.join(self.tempdir, file_names[i].split('.')[0] + extensions[i])))
 
+    def test_parseOptions_jobs(self):
+        font_path = self.temp_font(self.getpath('TestTTF.ttf'), 'TestTTF.ttf')
+        _, options = ttx.parseOptions(['-j', '3', font_path])
+        self.assertEqual(options.jobs, 3)
+        _, options = ttx.parseOptions(['--jobs=0', font_path])
+        self.assertEqual(options.jobs, multiprocessing.cpu_count())
+        with self.assertRaisesRegex(getopt.GetoptError, 'non-negative integer'):
+            ttx.parseOptions(['-j', 'x', font_path])
+
+    def test_process_parallel(self):
+        file_names = ['TestOTF.otf', 'TestTTF.ttf', 'TestTTF.ttx']
+        temp_paths = [self.temp_font(self.getpath(file_name), file_name)
+                      for file_name in file_names]
+        jobs, options = ttx.parseOptions(['-j', '2'] + temp_paths)
+        with CapturingLogHandler('fontTools', 'DEBUG') as captor:
+            ttx.process(jobs, options)
+        messages = [r.getMessage() for r in captor.records
+                    if r.name == 'fontTools.ttx']
+        # the messages of each file are logged together, in order
+        self.assertEqual(messages[0], 'Processing 3 files in 2 processes')
+        for i, (action, input, output) in enumerate(jobs):
+            verb = 'Dumping' if action is ttx.ttDump else 'Compiling'
+            self.assertEqual(messages[1+2*i],
+                             '%s "%s" to "%s"...' % (verb, input, output))
+            self.assertTrue(messages[2+2*i].startswith('Done'))
+        self.assertTrue(messages[-1].startswith('Done processing 3 files'))
+
+        serialOutputs = []
+        for action, input, output in jobs:
+            with open(output, 'rb') as f:
+                serialOutputs.append(f.read())
+            action(input, output, options)
+            with open(output, 'rb') as f:
+                self.assertEqual(f.read(), serialOutputs[-1])
+
+    def test_process_parallel_errors(self):
+        temp_paths = [self.temp_font(self.getpath('TestTTF.ttf'), 'TestTTF.ttf')]
+        bad_path = os.path.join(self.tempdir, 'Bad.ttx')
+        with open(bad_path, 'wb') as f:
+            f.write(b'<?xml version="1.0"?>\n<ttFont><head>\n')
+        temp_paths.append(bad_path)
+        jobs, options = ttx.parseOptions(['-j', '2'] + temp_paths)
+        with CapturingLogHandler('fontTools', 'INFO') as captor:
+            with self.assertRaisesRegex(ttx.TTLibError, '1 out of 2 files failed'):
+                ttx.process(jobs, options)
+        self.assertTrue(os.path.getsize(jobs[0][2]) > 0)
+        errors = [r for r in captor.records if r.levelname == 'ERROR']
+        self.assertEqual(len(errors), 1)
+        self.assertIn(bad_path, errors[0].getMessage())
+        self.assertIn('Traceback', errors[0].exc_text)
+
     def test_guessFileType_ttf(self):
         file_name = 'TestTTF.ttf'
         font_path = self.getpath(file_name)
@@ -1,8 +1,16 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
-from fontTools.ttLib import TTFont
+from fontTools.misc.psCharStrings import (
+    T2CharString, T2OutlineExtractor, calcSubrBias)
+from fontTools.ttLib import TTFont, TTLibError, newTable
+from fontTools.ttLib.tables._f_v_a_r import Axis
+from fontTools.pens.recordingPen import RecordingPen
 from fontTools.varLib import build
+from fontTools.varLib.builder import buildVarData
 from fontTools.varLib.mutator import main as mutator
+from fontTools.varLib.mutator import (
+    instantiateVariableFont, normalizeVariableFontLocation,
+    VarStoreInstancer, CFF2Instancer, _iup_delta, _iup_delta_np)
 import difflib
 import os
 import shutil
@@ -10,6 +18,57 @@ import sys
 import tempfile
 import unittest
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class BlendingOutlineExtractor(T2OutlineExtractor):
+    """Draws a CFF2 charstring at a location, given the scalars of the
+    regions of its VarStore."""
+
+    def __init__(self, regionScalars, pen, private, localSubrs, globalSubrs):
+        # CFF2 charstrings have no width
+        T2OutlineExtractor.__init__(self, pen, localSubrs, globalSubrs, 0, 0)
+        self.regionScalars = regionScalars
+        self.private = private
+        self.vsIndex = getattr(private, 'vsindex', 0)
+
+    def op_vsindex(self, index):
+        self.vsIndex = self.pop()
+
+    def op_blend(self, index):
+        varData = self.private.vstore.otVarStore.VarData[self.vsIndex]
+        regionIndices = varData.VarRegionIndex
+        numBlends = self.pop()
+        numArgs = numBlends * (len(regionIndices) + 1)
+        args = self.operandStack[-numArgs:]
+        del self.operandStack[-numArgs:]
+        for i in range(numBlends):
+            deltas = args[numBlends + i * len(regionIndices):]
+            self.push(args[i] + sum(
+                delta * self.regionScalars[regionIndex]
+                for delta, regionIndex in zip(deltas, regionIndices)))
+
+
+def getCFF2Drawings(font, regionScalars=None):
+    """Return the drawings of the charstrings of the 'CFF2' table, rounding
+    the coordinates. Blends are evaluated with the given region scalars."""
+    cff = font['CFF2'].cff
+    result = {}
+    for glyphName in font.getGlyphOrder():
+        charString = cff.topDictIndex[0].CharStrings[glyphName]
+        pen = RecordingPen()
+        private = charString.private
+        BlendingOutlineExtractor(
+            regionScalars, pen, private, getattr(private, 'Subrs', []),
+            charString.globalSubrs).execute(charString)
+        result[glyphName] = [
+            (op, tuple((round(x), round(y)) for x, y in args))
+            for op, args in pen.value]
+    return result
+
 
 class MutatorTest(unittest.TestCase):
     def __init__(self, methodName):
@@ -139,6 +198,333 @@ class MutatorTest(unittest.TestCase):
         expected_ttx_path = self.get_test_output(varfont_name + '-instance.ttx')
         self.expect_ttx(instfont, expected_ttx_path, tables)
 
+    def test_varlib_mutator_instantiateVariableFont(self):
+        suffix = '.ttf'
+        ttx_dir = self.get_test_input('master_ttx_varfont_ttf')
+
+        self.temp_dir()
+        ttx_paths = self.get_file_list(ttx_dir, '.ttx', 'Mutator_IUP')
+        for path in ttx_paths:
+            self.compile_font(path, suffix, self.tempdir)
+
+        varfont_path = os.path.join(self.tempdir, 'Mutator_IUP' + suffix)
+        varfont = TTFont(varfont_path)
+        instfont = instantiateVariableFont(
+            varfont, {'wdth': 80, 'ASCN': 628})
+        self.assertIn('gvar', varfont)
+        self.assertNotIn('gvar', instfont)
+
+        instfont_path = self.temp_path(suffix)
+        instfont.save(instfont_path)
+        instfont = TTFont(instfont_path)
+        tables = [table_tag for table_tag in instfont.keys() if table_tag != 'head']
+        expected_ttx_path = self.get_test_output('Mutator_IUP-instance.ttx')
+        self.expect_ttx(instfont, expected_ttx_path, tables)
+
+    def test_instantiateVariableFont_reuses_instancer(self):
+        varfont = TTFont()
+        varfont.importXML(os.path.join(
+            self.get_test_input('master_ttx_varfont_ttf'), 'Mutator_IUP.ttx'))
+        expected = instantiateVariableFont(varfont, {'wdth': 80})
+        instancer = varfont._getVarInstancers()[0]
+        self.assertIsNotNone(instancer)
+        instfont = instantiateVariableFont(varfont, {'wdth': 80})
+        self.assertIs(varfont._getVarInstancers()[0], instancer)
+        self.assertIsNone(instfont._varInstancers)
+        self.assertEqual(self.get_drawings(instfont.getGlyphSet()),
+                         self.get_drawings(expected.getGlyphSet()))
+
+        # only the variations whose region applies were inferred
+        scalars = instancer.getRegionScalars(
+            normalizeVariableFontLocation(varfont, {'wdth': 80}))
+        inferred = inactive = 0
+        for glyphName in varfont['gvar'].variations:
+            regionIndices, rows = instancer._getGlyphRows(glyphName)
+            for regionIndex, row in zip(regionIndices, rows):
+                if scalars[regionIndex]:
+                    self.assertIsNotNone(row)
+                    inferred += 1
+                else:
+                    self.assertIsNone(row)
+                    inactive += 1
+        self.assertTrue(inferred)
+        self.assertTrue(inactive)
+
+    def get_drawings(self, glyphSet):
+        result = {}
+        for glyphName in glyphSet.keys():
+            pen = RecordingPen()
+            glyphSet[glyphName].draw(pen)
+            result[glyphName] = (
+                [(op, [tuple(int(round(v)) for v in arg)
+                       if isinstance(arg, tuple) else arg for arg in args])
+                 for op, args in pen.value],
+                int(round(glyphSet[glyphName].width)))
+        return result
+
+    def test_getGlyphSet_location(self):
+        suffix = '.ttf'
+        ttx_dir = self.get_test_input('master_ttx_varfont_ttf')
+
+        self.temp_dir()
+        ttx_paths = self.get_file_list(ttx_dir, '.ttx', 'Mutator_IUP')
+        for path in ttx_paths:
+            self.compile_font(path, suffix, self.tempdir)
+
+        varfont = TTFont(os.path.join(self.tempdir, 'Mutator_IUP' + suffix))
+        for location in ({'wdth': 80, 'ASCN': 628}, {'wdth': 60}, {}):
+            glyphSet = varfont.getGlyphSet(location=location)
+            instfont = instantiateVariableFont(varfont, location)
+            self.assertEqual(self.get_drawings(glyphSet),
+                             self.get_drawings(instfont.getGlyphSet()))
+        self.assertEqual(glyphSet['a'].lsb, 38)
+
+        glyphSet = varfont.getGlyphSet(location={'wdth': -1}, normalized=True)
+        self.assertEqual(glyphSet.location, {'wdth': -1, 'ASCN': 0})
+        self.assertEqual(
+            self.get_drawings(glyphSet),
+            self.get_drawings(varfont.getGlyphSet(location={'wdth': 60})))
+
+        # without 'HVAR', the advance widths come from the phantom points
+        expected = self.get_drawings(glyphSet)
+        del varfont['HVAR']
+        glyphSet = varfont.getGlyphSet(location={'wdth': 60})
+        self.assertEqual(self.get_drawings(glyphSet), expected)
+
+    def test_getGlyphSet_location_avar(self):
+        varfont = TTFont()
+        varfont.importXML(os.path.join(
+            self.get_test_input('master_ttx_varfont_ttf'), 'Mutator_IUP.ttx'))
+        avar = varfont['avar'] = newTable('avar')
+        avar.segments = {
+            'wdth': {-1.0: -1.0, -0.5: -0.25, 0.0: 0.0, 1.0: 1.0},
+            'ASCN': {}}
+        glyphSet = varfont.getGlyphSet(location={'wdth': 80})
+        self.assertEqual(glyphSet.location, {'wdth': -0.25, 'ASCN': 0})
+        instfont = instantiateVariableFont(varfont, {'wdth': 80})
+        self.assertEqual(self.get_drawings(glyphSet),
+                         self.get_drawings(instfont.getGlyphSet()))
+
+    def test_getGlyphSet_location_errors(self):
+        font = TTFont()
+        font.importXML(os.path.join(
+            self.get_test_input('master_ttx_interpolatable_ttf'),
+            'TestFamily-Master0.ttx'))
+        with self.assertRaisesRegex(TTLibError, "no 'fvar' table"):
+            font.getGlyphSet(location={'wght': 100})
+
+    def get_cff2_varfont(self, subroutinize=False, numHintedGlyphs=0,
+                         subrs=False, numUnusedSubrs=0):
+        font = TTFont(sfntVersion='OTTO')
+        font.importXML(os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            'cffLib', 'data', 'TestCFF2.ttx'))
+        cff = font['CFF2'].cff
+        charStrings = cff.topDictIndex[0].CharStrings
+        private = charStrings['dollar'].private
+        glyphOrder = font.getGlyphOrder()[:]
+        for i in range(numHintedGlyphs):
+            program = [0, 50, 100, 50, 'hstemhm', 30, 40, 'hintmask', b'\xe0']
+            for j in range(3):
+                program.extend([
+                    50 + j, 50, i % 4, 0, 0, 0, 0, 5, 0, 0, 0, 0, 2, 'blend',
+                    'rmoveto', 400, 0, 'rlineto', 0, 400, 'rlineto',
+                    'hintmask', b'\x80', -400, i % 4, 0, 0, 0, 0, 1, 'blend',
+                    'rlineto'])
+            glyphName = 'hinted%d' % i
+            charStrings[glyphName] = T2CharString(
+                program=program, private=private, globalSubrs=cff.GlobalSubrs)
+            glyphOrder.append(glyphName)
+        if subrs:
+            self.add_cff2_subrs(font, glyphOrder, numUnusedSubrs)
+        font.setGlyphOrder(glyphOrder)
+        fvar = font['fvar'] = newTable('fvar')
+        for tag, minValue in (('wght', 200), ('cntr', 0)):
+            axis = Axis()
+            axis.axisTag = tag
+            axis.minValue, axis.defaultValue, axis.maxValue = (
+                minValue, 400 if tag == 'wght' else 0, 400 if tag == 'wght' else 100)
+            fvar.axes.append(axis)
+        font['CFF2'].subroutinize = subroutinize
+        buf = BytesIO()
+        font.save(buf)
+        buf.seek(0)
+        return TTFont(buf)
+
+    def test_instantiateVariableFont_CFF2(self):
+        for subroutinize in (False, True):
+            varfont = self.get_cff2_varfont(subroutinize)
+            if subroutinize:
+                self.assertTrue(len(varfont['CFF2'].cff.GlobalSubrs))
+            varStore = varfont['CFF2'].cff.topDictIndex[0].VarStore
+            varStoreInstancer = VarStoreInstancer(
+                varStore.otVarStore, varfont['fvar'].axes)
+            for location in ({'wght': 200, 'cntr': 100}, {'wght': 200},
+                             {'cntr': 100}, {}):
+                regionScalars = varStoreInstancer.getRegionScalars(
+                    normalizeVariableFontLocation(varfont, location))
+                expected = getCFF2Drawings(varfont, regionScalars)
+                instfont = instantiateVariableFont(varfont, location)
+                self.assertNotIn('fvar', instfont)
+                buf = BytesIO()
+                instfont.save(buf)
+                buf.seek(0)
+                instfont = TTFont(buf)
+                # the master locations have exact values
+                self.assertEqual(getCFF2Drawings(instfont), expected)
+                cff = instfont['CFF2'].cff
+                self.assertFalse(hasattr(cff.topDictIndex[0], 'VarStore'))
+                self.assertEqual(len(cff.GlobalSubrs),
+                                 len(varfont['CFF2'].cff.GlobalSubrs))
+
+        private = instfont['CFF2'].cff.topDictIndex[0].FDArray[0].Private
+        self.assertEqual(private.StdHW, 74)
+        self.assertEqual(private.BlueValues[:2], [-20, 0])
+        instfont = instantiateVariableFont(varfont, {'wght': 200})
+        private = instfont['CFF2'].cff.topDictIndex[0].FDArray[0].Private
+        self.assertEqual(private.StdHW, 26)
+        self.assertEqual(private.BlueValues[:2], [-13, 0])
+
+    def test_CFF2Instancer_hintmask(self):
+        location = {'wght': -0.5, 'cntr': 0.25}
+        for subroutinize in (False, True):
+            # the programs are the same whether they are decoded by the
+            # instancer or decompiled beforehand
+            varfont = self.get_cff2_varfont(subroutinize, numHintedGlyphs=24)
+            cff = varfont['CFF2'].cff
+            CFF2Instancer(cff, varfont['fvar'].axes).instantiate(location)
+            varfont = self.get_cff2_varfont(subroutinize, numHintedGlyphs=24)
+            expectedCFF = varfont['CFF2'].cff
+            for charString in expectedCFF.topDictIndex[0].CharStrings.values():
+                charString.decompile()
+            CFF2Instancer(expectedCFF, varfont['fvar'].axes).instantiate(
+                location)
+            charStrings = cff.topDictIndex[0].CharStrings
+            expectedCharStrings = expectedCFF.topDictIndex[0].CharStrings
+            for glyphName in varfont.getGlyphOrder():
+                self.assertEqual(charStrings[glyphName].program,
+                                 expectedCharStrings[glyphName].program)
+            self.assertEqual([subr.program for subr in cff.GlobalSubrs],
+                             [subr.program for subr in expectedCFF.GlobalSubrs])
+            if subroutinize:
+                self.assertTrue(any('hintmask' in subr.program
+                                    for subr in cff.GlobalSubrs))
+            for charString in charStrings.values():
+                self.assertNotIn('blend', charString.program)
+
+    def add_cff2_subrs(self, font, glyphOrder, numUnusedSubrs):
+        """Add glyphs whose global subroutines are called with two vsindex
+        values, or take blend operands from their callers, after some
+        unused subroutines."""
+        cff = font['CFF2'].cff
+        varStore = cff.topDictIndex[0].VarStore.otVarStore
+        varStore.VarData.append(buildVarData([4, 3, 2, 1, 0], []))
+        varStore.VarDataCount = len(varStore.VarData)
+        charStrings = cff.topDictIndex[0].CharStrings
+        private = charStrings['dollar'].private
+        globalSubrs = cff.GlobalSubrs
+
+        def addSubr(program):
+            globalSubrs.append(T2CharString(
+                program=program, private=private, globalSubrs=globalSubrs))
+            return len(globalSubrs) - 1
+
+        def addGlyph(glyphName, program):
+            charStrings[glyphName] = T2CharString(
+                program=program, private=private, globalSubrs=globalSubrs)
+            glyphOrder.append(glyphName)
+
+        for i in range(numUnusedSubrs):
+            addSubr([])
+        blended = addSubr(
+            [0, 100, 10, 20, 30, 40, 50, 1, 'blend', 'rlineto'])
+        calling = addSubr([])
+        operandsFromCaller = addSubr(
+            [10, 20, 30, 40, 50, 1, 'blend', 'rlineto'])
+        operandsForCaller = addSubr([0, 100, 10, 20, 30])
+        bias = calcSubrBias(globalSubrs)
+        globalSubrs[calling].setProgram(
+            [blended - bias, 'callgsubr', 50, 0, 'rlineto'])
+        moveTo = [100, 100, 'rmoveto']
+        addGlyph('vsindex0', moveTo + [calling - bias, 'callgsubr'])
+        addGlyph('vsindex1',
+                 [1, 'vsindex'] + moveTo + [calling - bias, 'callgsubr'])
+        addGlyph('fromCaller',
+                 moveTo + [0, 100, operandsFromCaller - bias, 'callgsubr'])
+        addGlyph('forCaller',
+                 moveTo + [operandsForCaller - bias, 'callgsubr', 40, 50, 1,
+                           'blend', 'rlineto'])
+
+    def test_instantiateVariableFont_CFF2_subrs(self):
+        # with 1235 unused subroutines, the copies change the bias
+        for numUnusedSubrs in (0, 1235):
+            varfont = self.get_cff2_varfont(
+                subrs=True, numUnusedSubrs=numUnusedSubrs)
+            numGlobalSubrs = len(varfont['CFF2'].cff.GlobalSubrs)
+            varStore = varfont['CFF2'].cff.topDictIndex[0].VarStore
+            location = {'wght': 200, 'cntr': 100}
+            regionScalars = VarStoreInstancer(
+                varStore.otVarStore, varfont['fvar'].axes).getRegionScalars(
+                    normalizeVariableFontLocation(varfont, location))
+            expected = getCFF2Drawings(varfont, regionScalars)
+            self.assertNotEqual(expected['vsindex0'], expected['vsindex1'])
+
+            instfont = instantiateVariableFont(varfont, location)
+            buf = BytesIO()
+            instfont.save(buf)
+            buf.seek(0)
+            instfont = TTFont(buf)
+            self.assertEqual(getCFF2Drawings(instfont), expected)
+            cff = instfont['CFF2'].cff
+            # the subroutine with blends, and the one calling it, got a
+            # copy for vsindex 1
+            self.assertEqual(len(cff.GlobalSubrs), numGlobalSubrs + 2)
+            charStrings = cff.topDictIndex[0].CharStrings
+            for glyphName in ('vsindex0', 'vsindex1'):
+                charStrings[glyphName].decompile()
+                self.assertIn('callgsubr', charStrings[glyphName].program)
+            # the calls whose blend operands span them were inlined
+            for glyphName in ('fromCaller', 'forCaller'):
+                charStrings[glyphName].decompile()
+                self.assertNotIn('callgsubr', charStrings[glyphName].program)
+
+    def test_instantiateVariableFont_CFF2_rounding(self):
+        varfont = self.get_cff2_varfont()
+        varStore = varfont['CFF2'].cff.topDictIndex[0].VarStore
+        location = {'wght': 333, 'cntr': 40}
+        regionScalars = VarStoreInstancer(
+            varStore.otVarStore, varfont['fvar'].axes).getRegionScalars(
+                normalizeVariableFontLocation(varfont, location))
+        expected = getCFF2Drawings(varfont, regionScalars)
+        instfont = instantiateVariableFont(varfont, location)
+        result = getCFF2Drawings(instfont)
+        self.assertEqual(sorted(result), sorted(expected))
+        # each rounded relative coordinate is off by at most a half unit
+        for glyphName in expected:
+            for (op, points), (expectedOp, expectedPoints) in zip(
+                    result[glyphName], expected[glyphName]):
+                self.assertEqual(op, expectedOp)
+                for (x, y), (ex, ey) in zip(points, expectedPoints):
+                    self.assertLessEqual(abs(x - ex), 20)
+                    self.assertLessEqual(abs(y - ey), 20)
+
+    @unittest.skipIf(np is None, "numpy not installed")
+    def test_iup_delta_np(self):
+        coords = [(0, 0), (100, 0), (100, 100), (0, 100), (50, 50), (60, 40),
+                  (0, 0), (500, 0), (0, 0), (0, 0)]
+        ends = [3, 5]
+        delta = [(10, 0), None, (20, -5), None, None, (3, 3),
+                 (0, 0), None, (0, 8), None]
+        expected = _iup_delta(delta, coords, ends)
+
+        explicit = np.array([d is not None for d in delta])
+        npDelta = np.array([d if d is not None else (0, 0) for d in delta],
+                           dtype=float)
+        result = _iup_delta_np(npDelta, explicit,
+                               np.array(coords, dtype=float), ends)
+        self.assertEqual([tuple(p) for p in result.tolist()],
+                         [tuple(p) for p in expected])
+
 
 if __name__ == "__main__":
     sys.exit(unittest.main())
@@ -1,11 +1,19 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.ttLib import TTFont
+from fontTools import varLib
 from fontTools.varLib import build
 from fontTools.varLib import main as varLib_main
+from fontTools.varLib import _optimize_contour, _optimize_delta
+from fontTools.varLib.mutator import _iup_contour, _iup_delta
+from fontTools.ttLib.tables.TupleVariation import TUPLES_SHARE_POINT_NUMBERS
+from fontTools.ttLib.tables._g_v_a_r import GVAR_HEADER_SIZE
 import difflib
+import itertools
 import os
+import random
 import shutil
+import struct
 import sys
 import tempfile
 import unittest
@@ -118,6 +126,35 @@ class BuildTest(unittest.TestCase):
         self.check_ttx_dump(varfont, expected_ttx_path, tables, suffix)
 
 
+    def test_varlib_build_no_shared_points(self):
+        suffix = '.ttf'
+        ds_path = self.get_test_input('Build.designspace')
+        ufo_dir = self.get_test_input('master_ufo')
+        ttx_dir = self.get_test_input('master_ttx_interpolatable_ttf')
+
+        self.temp_dir()
+        ttx_paths = self.get_file_list(ttx_dir, '.ttx', 'TestFamily-')
+        for path in ttx_paths:
+            self.compile_font(path, suffix, self.tempdir)
+
+        finder = lambda s: s.replace(ufo_dir, self.tempdir).replace('.ufo', suffix)
+        varfont, _, _ = build(ds_path, finder, useSharedPoints=False)
+
+        gvar = varfont['gvar']
+        self.assertFalse(gvar.useSharedPoints)
+        data = gvar.compile(varfont)
+        gvar.decompile(data, varfont)
+        offsets = gvar.decompileOffsets_(
+            data[GVAR_HEADER_SIZE:], tableFormat=(gvar.flags & 1),
+            glyphCount=gvar.glyphCount)
+        start = gvar.offsetToGlyphVariationData
+        counts = [struct.unpack(">H", data[start+o:start+o+2])[0]
+                  for o, end in zip(offsets, offsets[1:]) if end > o]
+        self.assertTrue(counts)
+        for count in counts:
+            self.assertFalse(count & TUPLES_SHARE_POINT_NUMBERS)
+
+
     def test_varlib_build3_ttf(self):
         """Designspace file does not contain an <axes> element."""
         suffix = '.ttf'
@@ -165,5 +202,114 @@ class BuildTest(unittest.TestCase):
         self.expect_ttx(varfont, expected_ttx_path, tables)
 
 
+class IUPOptimizeTest(unittest.TestCase):
+
+    # a circle-ish contour, and a square with two points on each side
+    coords = [(100, 0), (200, 50), (250, 150), (200, 250), (100, 300),
+              (0, 250), (-50, 150), (0, 50)]
+    square = [(0, 0), (50, 0), (100, 0), (100, 50), (100, 100),
+              (50, 100), (0, 100), (0, 50)]
+
+    def assertIUP(self, delta, coords, optimized, tolerance):
+        for (x, y), (p, q) in zip(delta, _iup_contour(optimized, coords)):
+            self.assertLessEqual(abs(x - p), tolerance)
+            self.assertLessEqual(abs(y - q), tolerance)
+
+    def check(self, delta, coords, tolerance=0.5):
+        optimized = _optimize_contour(delta, coords, tolerance)
+        self.assertIUP(delta, coords, optimized, tolerance)
+        # the NumPy and pure-Python span checks agree
+        np, varLib.np = varLib.np, None
+        try:
+            self.assertEqual(
+                _optimize_contour(delta, coords, tolerance), optimized)
+        finally:
+            varLib.np = np
+        return optimized
+
+    def test_zero_and_constant(self):
+        n = len(self.coords)
+        self.assertEqual(self.check([(0.4, -0.5)] * n, self.coords), [None] * n)
+        self.assertEqual(self.check([(5, 5)] * n, self.coords),
+                         [(5, 5)] + [None] * (n - 1))
+
+    def test_linear(self):
+        # scaling is reproduced from two opposite corners
+        delta = [(x // 10, y // 10) for x, y in self.square]
+        optimized = self.check(delta, self.square)
+        self.assertEqual(sum(d is not None for d in optimized), 2)
+
+    def test_linear_no_forced_points(self):
+        delta = [(x // 10, 0) for x, y in self.coords]
+        optimized = self.check(delta, self.coords)
+        self.assertEqual(sum(d is not None for d in optimized), 2)
+
+    def test_forced(self):
+        delta = [(x // 10, y // 10) for x, y in self.square]
+        delta[1] = (30, 0)  # can't be interpolated between (0,0) and (10,0)
+        optimized = self.check(delta, self.square)
+        self.assertEqual(optimized[1], (30, 0))
+        self.assertEqual(
+            varLib._iup_contour_bound_forced_set(delta, self.square, 0.5), {1})
+
+    def test_tolerance(self):
+        delta = [(x // 10 + (i % 2), y // 10) for i, (x, y) in enumerate(self.coords)]
+        strict = self.check(delta, self.coords, tolerance=0)
+        loose = self.check(delta, self.coords, tolerance=1)
+        self.assertLess(sum(d is not None for d in loose),
+                        sum(d is not None for d in strict))
+
+    def test_equal_neighbour_coords(self):
+        # point 0 lies "between" its neighbours on x only because all three
+        # share x=4; interpolating it from points 2 and 1 gives 0 on x
+        delta = [(0, 0), (2, 1), (1, 0)]
+        coords = [(4, -5), (4, -3), (4, -4)]
+        self.assertEqual(
+            varLib._iup_contour_bound_forced_set(delta, coords, 0), set())
+        optimized = self.check(delta, coords, tolerance=0)
+        self.assertEqual(optimized, [None, (2, 1), (1, 0)])
+
+    def test_single_explicit_point(self):
+        delta = [(1, 0), (2, -1)]
+        optimized = self.check(delta, [(2, 1), (0, 1)], tolerance=1)
+        self.assertEqual(sum(d is not None for d in optimized), 1)
+
+    def fewestExplicitPoints(self, delta, coords, tolerance):
+        n = len(delta)
+        for k in range(n + 1):
+            for explicit in itertools.combinations(range(n), k):
+                optimized = [d if i in explicit else None
+                             for i, d in enumerate(delta)]
+                if all(abs(x - p) <= tolerance >= abs(y - q)
+                       for (x, y), (p, q) in
+                       zip(delta, _iup_contour(optimized, coords))):
+                    return k
+
+    def test_brute_force(self):
+        rnd = random.Random(0)
+        for _ in range(300):
+            n = rnd.randint(2, 6)
+            coords = [(rnd.randint(0, 3), rnd.randint(0, 3)) for _ in range(n)]
+            delta = [(rnd.randint(-2, 2), rnd.randint(-2, 2)) for _ in range(n)]
+            tolerance = rnd.choice([0, 0.5, 1])
+            optimized = self.check(delta, coords, tolerance)
+            count = sum(d is not None for d in optimized)
+            fewest = self.fewestExplicitPoints(delta, coords, tolerance)
+            if varLib._iup_contour_bound_forced_set(delta, coords, tolerance):
+                self.assertEqual(count, fewest)
+            else:
+                self.assertLessEqual(count, fewest + 2)
+
+    def test_optimize_delta(self):
+        coords = self.square + self.coords + [(0, 0), (300, 0), (0, 0), (0, 0)]
+        ends = [len(self.square) - 1, len(self.square) + len(self.coords) - 1]
+        delta = [(x // 10, y // 7) for x, y in coords]
+        optimized = _optimize_delta(delta, coords, ends)
+        self.assertIn(None, optimized)
+        for (x, y), (p, q) in zip(delta, _iup_delta(optimized, coords, ends)):
+            self.assertLessEqual(abs(x - p), 0.5)
+            self.assertLessEqual(abs(y - q), 0.5)
+
+
 if __name__ == "__main__":
     sys.exit(unittest.main())